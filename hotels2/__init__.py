@@ -1,12 +1,51 @@
-from flask import Flask
-from flask_login import LoginManager
-from hotels2.server.dbOperations import *
-from hotels2.models.logged_user import LoggedUser
+import os
+import time
 
+# Flask and the database layer are imported inside the functions below: every `python -m hotels2.<tool>`
+# imports this package first, and the CLI tools, db_reset scripts and benchmarks do not need Flask
+
+
+def start_background_workers(app):
+    from hotels2.server.dbOperations import get_mongo
+    # threads do not survive a fork: under gunicorn --preload this runs in each worker (see gunicorn_conf.py)
+    mongo = get_mongo() if os.getenv("CHANGE_STREAMS") == "1" else None
+    if mongo is not None:
+        from hotels2.server.changeStreams import start_change_streams
+        # resume tokens are stored per consumer name, which must be unique per process; unset means one per
+        # gunicorn worker slot
+        app.extensions['change_streams'] = start_change_streams(mongo, os.getenv("CHANGE_STREAM_CONSUMER"))
+
+
+def stop_background_workers(app, timeout: float = 5.0):
+    consumer = app.extensions.pop('change_streams', None)
+    if consumer is not None:
+        consumer.stop(timeout)
+
+
+def create_app(start_workers: bool = True):
+    from flask import Flask, session
+    from flask_login import LoginManager
+    from hotels2.server.dbOperations import get_customer
+    from hotels2.server.authTokens import verify_auth_token
+    from hotels2.models.logged_user import LoggedUser
 
-def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = b'!yny\x99{\x88,F\x85\x19y\xd67yL'
+    app.config['AUTH_TOKEN_MAX_AGE'] = int(os.getenv("AUTH_TOKEN_MAX_AGE", 3600))
+    # how long a profile cached in the session is trusted before the customer is read again
+    app.config['PROFILE_RECHECK_SECONDS'] = int(os.getenv("PROFILE_RECHECK_SECONDS", 60))
+
+    # behind a reverse proxy (nginx, a load balancer) remote_addr is the proxy's address and every client would
+    # share one rate limit bucket; TRUSTED_PROXIES is the number of proxies whose X-Forwarded-* are trusted.
+    # Left at 0 when clients connect directly, otherwise anyone could pick their own address
+    trusted_proxies = int(os.getenv("TRUSTED_PROXIES", 0))
+    if trusted_proxies > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+    if os.getenv("SESSION_BACKEND") == "sqlite":
+        from hotels2.server.sessionStore import SqliteSessionInterface
+        app.session_interface = SqliteSessionInterface(os.getenv("SESSION_DB_PATH", "sessions.sqlite3"))
 
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
@@ -14,15 +53,50 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        user_data = mongo.customers.find_one({"_id": ObjectId(user_id)})
+        # profile cached in the session at login, so most browser requests skip the Customers lookup;
+        # it is re-read every PROFILE_RECHECK_SECONDS, so a removed customer is logged out soon after
+        profile = session.get('user_profile')
+        if profile and profile['_id'] == user_id and \
+                profile.get('checked_at', 0) + app.config['PROFILE_RECHECK_SECONDS'] > time.time():
+            return LoggedUser(profile['_id'], profile['name'], profile['surname'], profile['email'], None)
+
+        user_data = get_customer(user_id)
         if user_data:
+            session['user_profile'] = {
+                '_id': str(user_data['_id']),
+                'name': user_data['name'],
+                'surname': user_data['surname'],
+                'email': user_data['email'],
+                'checked_at': time.time()
+            }
             return LoggedUser(str(user_data['_id']), user_data['name'], user_data['surname'],
                               user_data['email'], user_data['password'], user_data['bookings'])
+        session.pop('user_profile', None)
         return None
 
+    @login_manager.request_loader
+    def load_user_from_token(req):
+        header = req.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return None
+        claims = verify_auth_token(app.config['SECRET_KEY'], header[len('Bearer '):])
+        if claims is None:
+            return None
+        return LoggedUser(claims['id'], claims['name'], claims['surname'], claims['email'], None)
+
     from hotels2.routes.views import views
     from hotels2.routes.auth import auth
+    from hotels2.routes.optimizations import init_response_optimizations
+    from hotels2.routes.fragments import init_fragment_cache
+    from hotels2.routes.admission import init_admission_control
+    from hotels2.routes.profiling import init_request_profiling
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
+    init_response_optimizations(app)
+    init_fragment_cache(app)
+    init_admission_control(app)
+    init_request_profiling(app)
 
+    if start_workers:
+        start_background_workers(app)
     return app
@@ -0,0 +1,100 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+from hotels2.server.bulkOperations import BULK_BATCH_SIZE, parse_operation, parse_room_price, run_operation, set_room_prices
+
+# Spec rows (JSON list of objects or CSV with a header), e.g.
+#   {"op": "scale_price", "city": "Gdynia", "room_type": 2, "factor": 1.1}
+#   {"op": "set_availability", "hotel_id": "...", "room_numbers": "1-50", "is_available": false}
+#   {"op": "set_price", "city": "Rzeszów", "price": 199.0}
+#   {"op": "remove_rooms", "hotel_id": "...", "room_numbers": "11,12"}
+#   {"op": "room_price", "room_id": "...", "price": 320.0}   <- collected and sent with bulk_write
+# Hotel removals left unfinished by a failed or killed worker are finished with:
+#   python -m hotels2.admin_cli --resume-cascades      (all of them)
+#   python -m hotels2.admin_cli --remove-hotel <id>    (one hotel, also when it is already gone)
+# Every row must have a filter (city, hotel_id, room_type or room_numbers); the whole file is checked
+# before anything is written, so a bad row never leaves the run half applied.
+
+
+def load_spec(path: str):
+    with open(path, newline='', encoding='utf-8') as spec_file:
+        if path.endswith('.json'):
+            return json.load(spec_file)
+        return [{key: value for key, value in row.items() if value != ''} for row in csv.DictReader(spec_file)]
+
+
+def report(label: str, count, elapsed: float, dry_run: bool):
+    verb = "would touch" if dry_run else "touched"
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"[ADMIN] {label}: {verb} {count} documents in {elapsed:.3f}s ({rate:.0f} docs/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched maintenance of rooms and hotels.")
+    parser.add_argument("spec", nargs="?", help="JSON or CSV file with operations")
+    parser.add_argument("--dry-run", action="store_true", help="only count matching documents")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="bulk_write batch size for room_price rows")
+    parser.add_argument("--resume-cascades", action="store_true", help="finish interrupted hotel removals")
+    parser.add_argument("--remove-hotel", metavar="HOTEL_ID", help="remove a hotel and its rooms, or re-run its removal")
+    args = parser.parse_args(argv)
+
+    if args.resume_cascades or args.remove_hotel:
+        from hotels2.server.dbOperations import get_cascade_job, remove_hotel, resume_cascades
+        if args.remove_hotel:
+            job = get_cascade_job(args.remove_hotel) if remove_hotel(args.remove_hotel, background=False) else None
+            print("[ADMIN] Cascade:", job)
+            if job is None or job['status'] != 'done':
+                return 1
+        if args.resume_cascades:
+            print("[ADMIN] Resumed", resume_cascades(), "hotel removals")
+        return 0
+    if args.spec is None:
+        parser.error("spec is required unless --resume-cascades or --remove-hotel is given")
+
+    operations = load_spec(args.spec)
+    invalid = 0
+    for i, op in enumerate(operations, 1):
+        try:
+            if op.get('op') == 'room_price':
+                parse_room_price(op)
+            else:
+                parse_operation(op)
+        except ValueError as e:
+            invalid += 1
+            print(f"[ADMIN] row {i}: {e}: {op}")
+    if invalid:
+        print(f"[ADMIN] {invalid} invalid rows, nothing was applied")
+        return 1
+
+    room_prices = [(op['room_id'], op['price']) for op in operations if op.get('op') == 'room_price']
+    operations = [op for op in operations if op.get('op') != 'room_price']
+
+    total = 0
+    total_start = time.perf_counter()
+    for i, op in enumerate(operations, 1):
+        result = run_operation(op, args.dry_run)
+        if result is None or result[0] is None:
+            print(f"[ADMIN] ({i}/{len(operations)}) skipped invalid operation: {op}")
+            continue
+        count, elapsed = result
+        total += count
+        report(f"({i}/{len(operations)}) {op['op']}", count, elapsed, args.dry_run)
+
+    if room_prices:
+        def progress(done, all_rows):
+            print(f"[ADMIN] room_price: {done}/{all_rows} rows sent")
+
+        start = time.perf_counter()
+        count = set_room_prices(room_prices, args.dry_run, args.batch_size, progress)
+        total += count
+        report("room_price", count, time.perf_counter() - start, args.dry_run)
+
+    report("total", total, time.perf_counter() - total_start, args.dry_run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
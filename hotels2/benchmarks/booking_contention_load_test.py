@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from threading import Thread
+
+# Guests competing for a few popular rooms on the same dates. Every guest picks a free room, spends
+# --checkout-ms filling in the checkout and then books; a failed booking means the checkout was wasted.
+#   direct: check availability, checkout, add_new_booking (the old flow)
+#   holds:  hold_room first (fails fast), checkout, confirm_hold
+# Runs against a throwaway SQLite file unless HOTELS_BACKEND/HOTELS_SQLITE_PATH say otherwise:
+#   python -m hotels2.benchmarks.booking_contention_load_test --guests 40 --rooms 10
+os.environ.setdefault("HOTELS_BACKEND", "sqlite")
+os.environ.setdefault("HOTELS_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "contention.sqlite3"))
+
+from hotels2.server.dbOperations import *
+
+
+def guest(mode: str, customer_id, city: str, check_in: datetime, check_out: datetime, checkout_s: float,
+          max_attempts: int, stats: dict, rng: random.Random):
+    start = time.perf_counter()
+    for _ in range(max_attempts):
+        free = filter_rooms(check_in, check_out, hotel_city=city)
+        if not free:
+            stats['sold_out'] += 1
+            return
+        room_id = rng.choice(free)['room_id']
+
+        if mode == 'holds':
+            hold = hold_room(customer_id, room_id, check_in, check_out)
+            if hold is None:
+                stats['rejected_holds'] += 1
+                continue
+            time.sleep(checkout_s)
+            booked = confirm_hold(hold['_id'], customer_id)
+        else:
+            time.sleep(checkout_s)
+            booked = add_new_booking(customer_id, room_id, check_in, check_out)
+
+        if booked:
+            stats['booked'] += 1
+            stats['latencies'].append(time.perf_counter() - start)
+            return
+        stats['failed_bookings'] += 1
+    stats['gave_up'] += 1
+
+
+def run(mode: str, customers: list, city: str, check_in: datetime, check_out: datetime, args):
+    stats = {'booked': 0, 'failed_bookings': 0, 'rejected_holds': 0, 'sold_out': 0, 'gave_up': 0, 'latencies': []}
+    threads = [Thread(target=guest, args=(mode, customer_id, city, check_in, check_out, args.checkout_ms / 1000,
+                                          args.max_attempts, stats, random.Random(i)))
+               for i, customer_id in enumerate(customers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(stats['latencies']) or [0.0]
+    print(f"[LOAD] {mode:6} booked {stats['booked']:3}, failed bookings {stats['failed_bookings']:3}, "
+          f"rejected holds {stats['rejected_holds']:3}, sold out {stats['sold_out']:3}, gave up {stats['gave_up']:3}, "
+          f"p95 time to book {latencies[int(len(latencies) * 0.95) - 1] * 1e3:7.1f} ms, total {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=40)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--checkout-ms", type=float, default=200)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    print("[LOAD] Backend:", storage.name)
+    city = f"Contention {ObjectId()}"
+    add_hotel("Contention Hotel", "Testowa 1", city, "12345", "img")
+    hotel = [h for h in get_all_hotels() if h['city'] == city][0]
+    for number in range(args.rooms):
+        add_room(hotel['_id'], 2, number + 1, 100, "room-img")
+
+    customers = []
+    for i in range(args.guests):
+        email = f"guest{i}.{hotel['_id']}@example.com"
+        add_customer("Guest", str(i), email, "hash")
+        customers.append(get_user_email(email)['_id'])
+
+    # each mode books its own dates, so the runs do not see each other's bookings
+    run('direct', customers, city, datetime(2399, 8, 1), datetime(2399, 8, 4), args)
+    run('holds', customers, city, datetime(2399, 9, 1), datetime(2399, 9, 4), args)
+
+    remove_hotel(hotel['_id'], background=False)
+    for customer_id in customers:
+        remove_customer(customer_id)
@@ -0,0 +1,67 @@
+import argparse
+import random
+import sys
+import time
+from bson.objectid import ObjectId
+from hotels2.server.hotelSearch import HotelSearchIndex
+
+# Latency of HotelSearchIndex on synthetic Polish hotel data. Runs offline, exits with 1 when p99 is over budget:
+#   python -m hotels2.benchmarks.hotel_search_benchmark --hotels 100000 --budget-ms 10
+
+NAMES = ["Gołębiewski", "Zamek", "Pod Różą", "Wierzynek", "Bałtyk", "Żubr", "Kasztelan", "Mazurski Raj",
+         "Śnieżka", "Górski", "Łazienki", "Książęcy", "Orzeł", "Polonia", "Wawel", "Źródło"]
+SUFFIXES = ["Hotel", "Resort", "Spa", "Apartamenty", "Pensjonat", "Inn", "Residence", "Boutique"]
+STREETS = ["Świętokrzyska", "Długa", "Piłsudskiego", "Mickiewicza", "Żeromskiego", "Łąkowa", "Ogrodowa",
+           "Kościuszki", "Słoneczna", "Wrocławska", "Jagiellońska", "Grunwaldzka"]
+CITIES = ["Rzeszów", "Kraków", "Gdańsk", "Łódź", "Wrocław", "Poznań", "Białystok", "Zakopane", "Toruń",
+          "Częstochowa", "Sopot", "Bielsko-Biała", "Szczecin", "Lublin", "Kielce", "Olsztyn"]
+QUERIES = ["gołę", "golebiewski", "rzeszow", "rzesz", "krak", "Łódź", "lodz", "zamek krak", "wawel k",
+           "g", "sw", "mickiewicza 1", "spa zakopane", "hotel", "orzel gd", "pod roza", "bielsko",
+           "piłsudskiego lub", "źródło", "xyz"]
+
+
+def make_hotel(i: int, rng: random.Random):
+    return {"_id": ObjectId(),
+            "name": f"{rng.choice(NAMES)} {rng.choice(SUFFIXES)} {i}",
+            "street": f"{rng.choice(STREETS)} {rng.randint(1, 200)}",
+            "city": rng.choice(CITIES)}
+
+
+def percentile(samples: list, p: float):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--budget-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    hotels = [make_hotel(i, rng) for i in range(args.hotels)]
+    start = time.perf_counter()
+    index = HotelSearchIndex(lambda: hotels)
+    index.ensure_built()
+    print(f"[BENCH] Indexed {len(index)} hotels ({len(index.terms)} terms) in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    for i in range(1000):
+        index.add(make_hotel(args.hotels + i, rng))
+    print(f"[BENCH] Incremental add: {(time.perf_counter() - start) * 1e3:.3f} us per hotel")
+
+    samples = []
+    for i in range(args.queries):
+        query = QUERIES[i % len(QUERIES)]
+        # typeahead sends every prefix of the query while the user types
+        query = query[:rng.randint(1, len(query))]
+        start = time.perf_counter()
+        index.search(query)
+        samples.append((time.perf_counter() - start) * 1e3)
+
+    p50, p99 = percentile(samples, 0.50), percentile(samples, 0.99)
+    print(f"[BENCH] {args.queries} queries: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {max(samples):.3f} ms")
+    if p99 > args.budget_ms:
+        print(f"[BENCH] p99 over the {args.budget_ms} ms budget")
+        sys.exit(1)
@@ -0,0 +1,89 @@
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold-start import time of the app and the CLI, measured with `python -X importtime` in fresh processes.
+# Exits with 1 when the median is over budget or a module pulls in a dependency it should load lazily:
+#   python -m hotels2.benchmarks.import_time_benchmark --runs 7 --budget-ms 250 --own-budget-ms 25
+
+# module -> (budget key, packages it must not import at import time)
+TARGETS = {
+    "hotels2.wsgi": ("app", ("pymongo", "dns", "certifi")),
+    "hotels2.admin_cli": ("cli", ("flask", "jinja2", "pymongo", "dns", "certifi")),
+}
+
+
+def import_times(module: str, pycache: str):
+    # {module name: (self us, cumulative us, nesting level)} of everything `import module` loaded in a new
+    # interpreter; modules the interpreter imported before (site, .pth hooks) are not counted
+    env = dict(os.environ, HOTELS_BACKEND=os.getenv("HOTELS_BACKEND", "sqlite"), PYTHONPYCACHEPREFIX=pycache)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    lines = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        lines.append((name.strip(), int(self_us), int(cumulative_us), level))
+
+    # a module is reported after its imports, so the target's subtree is the run of nested lines before it
+    end = max(i for i, line in enumerate(lines) if line[0] == module and line[3] == 0)
+    start = end
+    while start > 0 and lines[start - 1][3] > 0:
+        start -= 1
+    return {name: (self_us, cumulative_us, level) for name, self_us, cumulative_us, level in lines[start:end + 1]}
+
+
+def measure(module: str, runs: int, pycache: str):
+    totals, owns = [], []
+    times = {}
+    for _ in range(runs):
+        times = import_times(module, pycache)
+        totals.append(times[module][1] / 1000)
+        owns.append(sum(self_us for name, (self_us, _, _) in times.items() if name.startswith("hotels2")) / 1000)
+    return statistics.median(totals), statistics.median(owns), times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=250, help="whole import of hotels2.wsgi")
+    parser.add_argument("--cli-budget-ms", type=float, default=60, help="whole import of hotels2.admin_cli")
+    parser.add_argument("--own-budget-ms", type=float, default=25, help="self time of hotels2 modules only")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+    budgets = {"app": args.budget_ms, "cli": args.cli_budget_ms}
+    # deployments ship compiled bytecode; a stale .pyc would add compile time to the first run. The bytecode
+    # goes to a temporary PYTHONPYCACHEPREFIX, which the measured interpreters read, not into the working tree
+    pycache = tempfile.TemporaryDirectory(prefix="hotels2-pycache-")
+    sys.pycache_prefix = pycache.name
+    compileall.compile_dir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), quiet=1)
+
+    failed = False
+    for module, (budget_key, forbidden) in TARGETS.items():
+        total, own, times = measure(module, args.runs, pycache.name)
+        print(f"[BENCH] {module}: {total:.1f} ms cold import, {own:.1f} ms in hotels2 modules "
+              f"(median of {args.runs})")
+        top_level = sorted(((cumulative, name) for name, (_, cumulative, level) in times.items() if level <= 1),
+                           reverse=True)[:args.top]
+        for cumulative, name in top_level:
+            print(f"[BENCH]     {cumulative / 1000:7.1f} ms  {name}")
+
+        loaded = [name for name in times if name.split(".")[0] in forbidden]
+        if loaded:
+            print(f"[BENCH] {module} imports {', '.join(sorted({name.split('.')[0] for name in loaded}))} eagerly")
+            failed = True
+        if total > budgets[budget_key]:
+            print(f"[BENCH] {module} over the {budgets[budget_key]} ms budget")
+            failed = True
+        if own > args.own_budget_ms:
+            print(f"[BENCH] hotels2 modules over the {args.own_budget_ms} ms budget")
+            failed = True
+    pycache.cleanup()
+    if failed:
+        sys.exit(1)
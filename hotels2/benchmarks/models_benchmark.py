@@ -0,0 +1,60 @@
+import argparse
+import time
+import tracemalloc
+import bson
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from hotels2.models.room import Room
+
+# Memory per 100k rooms (plain dicts vs __slots__ models) and decode time per result page
+# (full decode vs RawBSONDocument vs Room.from_bson). Runs offline:
+#   python -m hotels2.benchmarks.models_benchmark --rooms 100000 --page-size 50
+
+
+def make_room(i: int, hotel_id):
+    return Room(hotel_id, i % 4 + 1, i, 100.0 + i % 300, True, f"https://example.com/rooms/{i}.jpg")
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    objects = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, current
+
+
+def time_page_decode(pages, decode, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            for data in page:
+                decode(data)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    hotel_id = ObjectId()
+    _, dict_bytes = measure_memory(lambda: [make_room(i, hotel_id).to_dict() for i in range(args.rooms)])
+    _, slots_bytes = measure_memory(lambda: [make_room(i, hotel_id) for i in range(args.rooms)])
+    print(f"[BENCH] {args.rooms} rooms as dicts:        {dict_bytes / 2 ** 20:8.2f} MiB")
+    print(f"[BENCH] {args.rooms} rooms as slot models:  {slots_bytes / 2 ** 20:8.2f} MiB")
+
+    encoded = [make_room(i, hotel_id).to_bson() for i in range(args.rooms)]
+    pages = [encoded[i:i + args.page_size] for i in range(0, len(encoded), args.page_size)]
+
+    def raw_first_field(data):
+        # a lazy page that is only partially rendered touches a single field
+        return RawBSONDocument(data)['room_number']
+
+    for label, decode in (("bson.decode -> dict", bson.decode),
+                          ("Room.from_bson", Room.from_bson),
+                          ("RawBSONDocument (lazy)", RawBSONDocument),
+                          ("RawBSONDocument + 1 field", raw_first_field)):
+        per_page = time_page_decode(pages, decode, args.repeat)
+        print(f"[BENCH] {label:26} {per_page * 1e6:9.1f} us per page of {args.page_size}")
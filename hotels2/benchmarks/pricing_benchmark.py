@@ -0,0 +1,55 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from hotels2.models.room import Room
+from hotels2.server.dynamicPricing import load_config, reprice
+from hotels2.server.sqliteBackend import SqliteBackend
+
+# One dynamic pricing run over synthetic rooms in an in-memory SQLite database.
+# Runs offline, exits with 1 when the run (read, plan and bulk writes) is over budget:
+#   python -m hotels2.benchmarks.pricing_benchmark --rooms 10000 --bookings-per-room 20 --budget-s 5
+
+
+def seed(storage: SqliteBackend, rooms: int, bookings_per_room: int, today: datetime, rng: random.Random):
+    hotels = [ObjectId() for _ in range(max(1, rooms // 40))]
+    for number in range(rooms):
+        room_id = storage.insert_room(Room(rng.choice(hotels), rng.randint(1, 4), number, float(rng.randint(80, 600)),
+                                           True, "img"))
+        day = today - timedelta(days=rng.randint(0, 30))
+        for _ in range(bookings_per_room):
+            day += timedelta(days=rng.randint(0, 4))
+            nights = rng.randint(1, 7)
+            storage.push_room_booking(room_id, {"booking_id": ObjectId(), "customer_id": ObjectId(),
+                                                "date_from": day, "date_to": day + timedelta(days=nights)})
+            day += timedelta(days=nights)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--bookings-per-room", type=int, default=20)
+    parser.add_argument("--budget-s", type=float, default=5.0)
+    args = parser.parse_args()
+
+    storage = SqliteBackend(f"file:pricing{ObjectId()}?mode=memory&cache=shared")
+    today = datetime(2399, 1, 1)
+    start = time.perf_counter()
+    seed(storage, args.rooms, args.bookings_per_room, today, random.Random(42))
+    print(f"[BENCH] Seeded {args.rooms} rooms, {args.rooms * args.bookings_per_room} bookings "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    config = load_config()
+    changes, rooms, _, read_time, _ = reprice(storage, config, dry_run=True, today=today)
+    print(f"[BENCH] Dry run: {rooms} rooms read and priced in {read_time:.2f} s, {len(changes)} changes")
+    changes, rooms, written, read_time, write_time = reprice(storage, config, today=today)
+    total = read_time + write_time
+    print(f"[BENCH] Run: read and priced in {read_time:.2f} s, {written} rooms written in {write_time:.2f} s "
+          f"({rooms / total:.0f} rooms/s)")
+    changes, _, _, _, _ = reprice(storage, config, dry_run=True, today=today)
+    print(f"[BENCH] Rooms still stepping towards their target price (max_step): {len(changes)}")
+    if total > args.budget_s:
+        print(f"[BENCH] Over the {args.budget_s} s budget")
+        sys.exit(1)
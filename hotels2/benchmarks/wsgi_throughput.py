@@ -0,0 +1,113 @@
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+# Throughput of the Werkzeug dev server (app.py) against gunicorn with gunicorn_conf.py, on the same
+# seeded SQLite database. Every client process sends requests one after another for --seconds:
+#   python -m hotels2.benchmarks.wsgi_throughput --hotels 50 --rooms 20 --clients 16 --seconds 15
+# Rate limiting is switched off in the servers, otherwise the clients only measure 429 responses.
+os.environ.setdefault("HOTELS_BACKEND", "sqlite")
+os.environ.setdefault("HOTELS_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "throughput.sqlite3"))
+
+PATHS = ("/", "/rooms", "/api/hotels/search?q=hotel%201", "/api/rooms/near?lng=19.94&lat=50.06&radius_km=5")
+SERVERS = {
+    'dev': [sys.executable, "-c", "import sys; from hotels2.app import app; "
+                                  "app.run(port=int(sys.argv[1]), debug=True, use_reloader=False)"],
+    'gunicorn': [sys.executable, "-m", "gunicorn", "-c", "python:hotels2.gunicorn_conf", "hotels2.wsgi:app"],
+}
+
+
+def seed(hotels: int, rooms: int):
+    from hotels2.server.dbOperations import add_hotel, add_room, get_all_hotels, storage
+    print("[LOAD] Seeding", hotels, "hotels with", rooms, "rooms each into", storage.name, "storage")
+    for i in range(hotels):
+        add_hotel(f"Hotel {i}", f"Testowa {i}", f"City {i % 10}", "12345", "img",
+                  longitude=19.94 + i / 1000, latitude=50.06)
+    for hotel in get_all_hotels():
+        for number in range(rooms):
+            add_room(hotel['_id'], 2, number + 1, 100 + number, "room-img")
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/hotels/search?q=hotel")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client(port: int, seconds: float, offset: int, results: Queue):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    i = offset
+    while time.monotonic() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            # a new connection per request: the dev server closes it after every response anyway
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status != 200:
+                errors += 1
+                continue
+        except OSError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def run(name: str, port: int, args):
+    env = dict(os.environ, RATE_LIMIT_ENABLED="0", BIND=f"127.0.0.1:{port}")
+    command = SERVERS[name] + ([str(port)] if name == 'dev' else [])
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            print("[LOAD]", name, "did not start")
+            return
+        results = Queue()
+        clients = [Process(target=client, args=(port, args.seconds, i, results)) for i in range(args.clients)]
+        for process in clients:
+            process.start()
+        collected = [results.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies = sorted(latency for part, _ in collected for latency in part) or [0.0]
+    errors = sum(part for _, part in collected)
+    print(f"[LOAD] {name:8} {len(latencies) / args.seconds:8.1f} req/s, errors {errors:4}, "
+          f"p50 {latencies[len(latencies) // 2] * 1e3:7.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e3:7.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    args = parser.parse_args()
+
+    seed(args.hotels, args.rooms)
+    print(f"[LOAD] {args.clients} clients, {args.seconds:.0f} s per server, {os.cpu_count()} CPU(s)")
+    for name in args.servers:
+        run(name, args.port, args)
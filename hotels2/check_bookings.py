@@ -0,0 +1,50 @@
+import argparse
+import sys
+from datetime import timedelta
+
+from hotels2.server.dbOperations import storage
+from hotels2.server.bookingIntegrity import BookingReconciler, BATCH_SIZE, GRACE
+
+# Reconciles the two copies of every booking (Rooms.bookings and Customers.bookings):
+#   python -m hotels2.check_bookings --report issues.jsonl
+#   python -m hotels2.check_bookings --repair --batch-size 2000
+# Exits with 1 when issues were found (and, with --repair, not all of them could be fixed).
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find and repair diverged booking copies.")
+    parser.add_argument("--repair", action="store_true", help="fix the issues that have a safe repair")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--grace-minutes", type=float, default=GRACE.total_seconds() / 60,
+                        help="skip bookings created this recently (they may still be being written)")
+    parser.add_argument("--report", help="write every issue as a JSON line to this file")
+    parser.add_argument("--skip-overlaps", action="store_true", help="do not look for double-booked rooms")
+    args = parser.parse_args(argv)
+
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        checker = BookingReconciler(storage, args.batch_size, args.repair, timedelta(minutes=args.grace_minutes),
+                                    report)
+        counts = checker.run(overlaps=not args.skip_overlaps)
+    finally:
+        if report is not None:
+            report.close()
+
+    print(f"[ADMIN] Checked {counts['bookings']} bookings on {storage.name} storage "
+          f"({counts['skipped_recent']} too recent to check)")
+    issues = 0
+    for kind, examples in checker.examples.items():
+        issues += counts[kind]
+        print(f"[ADMIN] {kind}: {counts[kind]}")
+        for example in examples:
+            print("[ADMIN]     ", example)
+    if args.repair:
+        print(f"[ADMIN] Repaired {counts['repaired']}, could not repair {counts['repair_failed']}")
+        unresolved = issues - counts['repaired']
+    else:
+        unresolved = issues
+    return 1 if unresolved else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
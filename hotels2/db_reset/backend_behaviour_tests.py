@@ -0,0 +1,166 @@
+import time
+from datetime import datetime
+from threading import Event, Thread
+from hotels2.server.bulkOperations import parse_operation, parse_room_price
+from hotels2.server.dbOperations import *
+from hotels2.server.dynamicPricing import apply_prices, load_config, plan_prices
+
+# Runs the same scenario against whichever backend HOTELS_BACKEND selects, e.g.
+#   HOTELS_BACKEND=sqlite HOTELS_SQLITE_PATH="file:behaviour?mode=memory&cache=shared" \
+#       python -m hotels2.db_reset.backend_behaviour_tests
+# It creates its own hotel, room and customer and removes them at the end.
+
+
+if __name__ == '__main__':
+    print("[TEST] Backend:", storage.name)
+    # bulk rows with a price that is not a finite positive number are rejected before anything is written
+    for price in ("0", "-10", "nan", "inf", "-inf"):
+        for parse, op in ((parse_room_price, {'room_id': str(ObjectId()), 'price': price}),
+                          (parse_operation, {'op': 'set_price', 'city': 'X', 'price': price}),
+                          (parse_operation, {'op': 'scale_price', 'city': 'X', 'factor': price})):
+            try:
+                parse(op)
+                assert False, (op, price)
+            except ValueError:
+                pass
+    assert parse_room_price({'room_id': str(ObjectId()), 'price': "120.5"})[1] == 120.5
+
+    email = "behaviour.test@example.com"
+    city = "Behaviour City"
+
+    assert not add_hotel("Behaviour Hotel", "Testowa 1", city, "1234", "img")
+    assert add_hotel("Behaviour Hotel", "Testowa 1", city, "12345", "img")
+    hotel = [h for h in get_all_hotels() if h['city'] == city][0]
+    assert {'city': city} in get_all_cities()
+
+    assert add_room(hotel['_id'], 2, 1, 100, "room-img")
+    assert not add_room(hotel['_id'], 2, 1, 100, "room-img")
+    assert add_room(hotel['_id'], 3, 2, 200, "room-img")
+    rooms = filter_rooms(hotel_city=city)
+    assert len(rooms) == 2
+    room_id = [r for r in rooms if r['room_type'] == 2][0]['room_id']
+
+    assert set_price_per_night(room_id, 120)
+    assert not set_price_per_night(room_id, -5)
+    assert [r['price_per_night'] for r in filter_rooms(hotel_city=city, room_type=2)] == [120.0]
+    assert filter_rooms(hotel_city=city, min_price=150) and not filter_rooms(hotel_city=city, max_price=100)
+
+    assert add_customer("Test", "Behaviour", email, "hash")
+    assert not add_customer("Test", "Behaviour", email, "hash")
+    customer = get_user_email(email)
+    assert get_customer(customer['_id'])['email'] == email
+
+    check_in, check_out = datetime(2399, 6, 25), datetime(2399, 6, 30)
+    assert add_new_booking(customer['_id'], room_id, check_in, check_out)
+    assert not add_new_booking(customer['_id'], room_id, datetime(2399, 6, 27), datetime(2399, 6, 29))
+    assert not add_new_booking(customer['_id'], room_id, datetime(2399, 6, 20), datetime(2399, 7, 5))
+    assert add_new_booking(customer['_id'], room_id, check_out, datetime(2399, 7, 2))
+    assert not can_be_booked(room_id, check_out, check_in)
+
+    free = filter_rooms(check_in, check_out, hotel_city=city)
+    assert [r['room_type'] for r in free] == [3]
+
+    bookings = sorted(get_all_user_bookings(customer['_id']), key=lambda b: b['date_from'])
+    assert len(bookings) == 2 and bookings[0]['hotel_city'] == city and bookings[0]['can_be_edited']
+    booking_id = bookings[0]['booking_id']
+
+    assert change_booking(customer['_id'], room_id, booking_id, datetime(2399, 6, 20), datetime(2399, 6, 30))
+    assert not change_booking(customer['_id'], room_id, booking_id, datetime(2399, 6, 20), datetime(2399, 7, 1))
+    assert get_all_user_bookings(customer['_id'])[0]['date_from'] == datetime(2399, 6, 20).date()
+
+    assert remove_booking(booking_id, customer['_id'], room_id)
+    assert not remove_booking(booking_id, customer['_id'], room_id)
+    assert can_be_booked(room_id, check_in, check_out)
+
+    hold = hold_room(customer['_id'], room_id, check_in, check_out)
+    assert hold is not None and hold_room(customer['_id'], room_id, check_in, check_out) is None
+    assert not can_be_booked(room_id, check_in, check_out)
+    assert room_id not in [r['room_id'] for r in filter_rooms(check_in, check_out, hotel_city=city)]
+    assert not confirm_hold(hold['_id'], ObjectId())
+    assert confirm_hold(hold['_id'], customer['_id'])
+    assert not confirm_hold(hold['_id'], customer['_id'])
+
+    # two guests holding the same free term at once: the second one runs while the first is between its check
+    # and its insert; whatever the order of their hold ids, exactly one hold is placed
+    hold_in, hold_out = datetime(2399, 8, 1), datetime(2399, 8, 5)
+    backend = storage.get()
+    first_inserting, first_may_finish = Event(), Event()
+    insert_hold = backend.insert_hold
+
+    def slow_insert_hold(hold):
+        if hold.customer_id == customer['_id']:
+            first_inserting.set()
+            first_may_finish.wait(1)
+        return insert_hold(hold)
+
+    backend.insert_hold = slow_insert_hold
+    holds = {}
+    first = Thread(target=lambda: holds.setdefault('first', hold_room(customer['_id'], room_id, hold_in, hold_out)))
+    first.start()
+    first_inserting.wait(1)
+    second = Thread(target=lambda: holds.setdefault('second', hold_room(ObjectId(), room_id, hold_in, hold_out)))
+    second.start()
+    time.sleep(0.2)
+    first_may_finish.set()
+    first.join()
+    second.join()
+    backend.insert_hold = insert_hold
+    assert [name for name, hold in sorted(holds.items()) if hold is not None] == ['first']
+    assert release_hold(holds['first']['_id'], customer['_id'])
+
+    # the waitlisted stay is booked as soon as the colliding booking is removed
+    assert join_waitlist(customer['_id'], room_id, datetime(2399, 6, 26), datetime(2399, 6, 28))
+    held = sorted(get_all_user_bookings(customer['_id']), key=lambda b: b['date_from'])[0]
+    assert remove_booking(held['booking_id'], customer['_id'], room_id)
+    waitlisted = sorted(get_all_user_bookings(customer['_id']), key=lambda b: b['date_from'])[0]
+    assert waitlisted['date_from'] == datetime(2399, 6, 26).date()
+    assert remove_booking(waitlisted['booking_id'], customer['_id'], room_id)
+
+    # a retried request with the same idempotency key books once and gets the first outcome back
+    assert add_new_booking(customer['_id'], room_id, check_in, check_out, "behaviour-key")
+    assert add_new_booking(customer['_id'], room_id, check_in, check_out, "behaviour-key")
+    assert not add_new_booking(customer['_id'], room_id, check_out, datetime(2399, 7, 3), "behaviour-key")
+    retried = [b for b in get_all_user_bookings(customer['_id']) if b['date_from'] == check_in.date()]
+    assert len(retried) == 1
+    assert remove_booking(retried[0]['booking_id'], customer['_id'], room_id)
+    storage.delete_idempotency_key(f"{customer['_id']}:behaviour-key")
+
+    # occupancy-driven prices start from the base price, so repricing again does not compound and a price
+    # set by hand becomes the new base; only this hotel's rooms are repriced
+    assert add_new_booking(customer['_id'], room_id, datetime(2399, 6, 1), datetime(2399, 6, 11))
+    config = dict(load_config(), horizon_days=10, max_step=1.0)
+
+    def reprice_hotel():
+        rooms = [r for r in storage.find_pricing_rooms(datetime(2399, 6, 1), datetime(2399, 6, 11))
+                 if r['hotel_id'] == hotel['_id']]
+        changes = plan_prices(rooms, config, datetime(2399, 6, 1))
+        apply_prices(storage, changes)
+        return {str(change['room_id']): change['new_price'] for change in changes}
+
+    assert reprice_hotel()[str(room_id)] == 180.0
+    assert str(room_id) not in reprice_hotel()
+    assert set_price_per_night(room_id, 100)
+    assert reprice_hotel()[str(room_id)] == 150.0
+    assert [r['price_per_night'] for r in filter_rooms(hotel_city=city, room_type=2)] == [150.0]
+    booked = [b for b in get_all_user_bookings(customer['_id']) if b['date_from'] == datetime(2399, 6, 1).date()]
+    assert remove_booking(booked[0]['booking_id'], customer['_id'], room_id)
+
+    assert set_availability(room_id, False)
+    assert len(filter_rooms(hotel_city=city)) == 1
+
+    assert remove_hotel(hotel['_id'], background=False)
+    assert get_cascade_job(hotel['_id'])['rooms_removed'] == 2
+    assert get_cascade_job(hotel['_id'])['status'] == 'done'
+    assert remove_hotel(hotel['_id'], background=False) and get_cascade_job(hotel['_id'])['rooms_removed'] == 0
+    # a cascade running with a fresh heartbeat is claimed once; a stale one can be taken over
+    job = get_cascade_job(hotel['_id'])
+    assert claim_cascade(dict(job)) and not claim_cascade(dict(job))
+    assert resume_cascades() == 0 and get_cascade_job(hotel['_id'])['status'] == 'running'
+    job['status'], job['heartbeat'] = 'running', datetime.utcnow() - CASCADE_LEASE * 2
+    storage.save_cascade_job(job)
+    assert resume_cascades() == 1 and get_cascade_job(hotel['_id'])['status'] == 'done'
+    assert get_all_user_bookings(customer['_id']) == []
+    assert not filter_rooms(hotel_city=city)
+    assert remove_customer(customer['_id'])
+    assert get_user_email(email) is None
+    print("[TEST] All behaviour checks passed.")
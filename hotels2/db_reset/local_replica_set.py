@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+from pymongo import MongoClient
+
+# Local three-node replica set for testing read routing. Start the nodes first, e.g.:
+#   mkdir -p /tmp/rs0-0 /tmp/rs0-1 /tmp/rs0-2
+#   mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 --bind_ip localhost --fork --logpath /tmp/rs0-0.log
+#   mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 --bind_ip localhost --fork --logpath /tmp/rs0-1.log
+#   mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2 --bind_ip localhost --fork --logpath /tmp/rs0-2.log
+# then run this script and point the app at the set:
+#   MONGODB_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+
+REPLICA_SET = os.getenv("REPLICA_SET_NAME", "rs0")
+# change streams only need a replica set, a single node is enough: REPLICA_SET_PORTS=27017
+PORTS = [int(port) for port in os.getenv("REPLICA_SET_PORTS", "27017,27018,27019").split(",")]
+
+
+if __name__ == '__main__':
+    client = MongoClient("localhost", PORTS[0], directConnection=True)
+    config = {
+        "_id": REPLICA_SET,
+        "members": [{"_id": i, "host": f"localhost:{port}", "priority": 2 if i == 0 else 1}
+                    for i, port in enumerate(PORTS)]
+    }
+    try:
+        client.admin.command("replSetInitiate", config)
+        print("[SETUP] Replica set", REPLICA_SET, "initiated.")
+    except Exception as e:
+        print("[SETUP]", e)
+
+    for _ in range(30):
+        status = client.admin.command("replSetGetStatus")
+        states = [member['stateStr'] for member in status['members']]
+        print("[SETUP] Members:", states)
+        if states.count("PRIMARY") == 1 and states.count("SECONDARY") == len(PORTS) - 1:
+            print("[SETUP] MONGODB_URI=mongodb://" + ",".join(f"localhost:{port}" for port in PORTS)
+                  + f"/?replicaSet={REPLICA_SET}")
+            sys.exit(0)
+        time.sleep(1)
+    print("[SETUP] Replica set did not become healthy in time.")
+    sys.exit(1)
@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import signal
+
+# gunicorn -c python:hotels2.gunicorn_conf hotels2.wsgi:app
+# every setting can be overridden from the environment (or on the gunicorn command line)
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', 8000)}")
+
+# requests spend most of their time waiting for MongoDB, so each process runs several threads;
+# processes beyond the CPU count only add memory (each one holds its own search index, fragment cache
+# and pool). Mongo connection budget: about workers * (threads + 2 with CHANGE_STREAMS=1) connections,
+# capped per worker by MONGODB_MAX_POOL_SIZE
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# routes/admission.py reads GUNICORN_THREADS too: ADMISSION_MAX_CONCURRENT defaults to the thread count
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+# the app, templates and static fingerprints are loaded once and shared copy-on-write;
+# storage connects lazily in each worker (LazyStorage), so nothing is opened before the fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+# a worker told to stop finishes its requests and in-flight bookings within this time (see worker_exit)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# recycled workers start with a fresh heap; the jitter keeps them from restarting all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", None)
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    # the lowest slot no live worker holds: a worker that replaces an exited one (max_requests, crash) takes
+    # over its slot, and with it the change stream consumer name and resume tokens (see changeStreams.py)
+    taken = {getattr(live, 'slot', None) for live in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    os.environ["WORKER_SLOT"] = str(worker.slot)
+
+
+def post_worker_init(worker):
+    from hotels2.wsgi import start_worker, begin_drain
+
+    # SIGTERM stops the worker from accepting connections; bookings arriving on open keep-alive
+    # connections from now on are answered with 503 so they are retried elsewhere
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        begin_drain()
+        stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    start_worker()
+
+
+def worker_exit(server, worker):
+    from hotels2.wsgi import stop_worker, DRAIN_TIMEOUT
+    # the arbiter kills workers that outlive graceful_timeout, so the drain ends a little earlier
+    stop_worker(min(DRAIN_TIMEOUT, max(1, graceful_timeout - 5)))
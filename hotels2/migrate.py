@@ -0,0 +1,46 @@
+import argparse
+import sys
+
+from hotels2.server.dbOperations import get_mongo
+from hotels2.server.schemaMigrations import BATCH_SIZE, PAUSE_RATIO, load_migrations, migration_states, migrate, \
+    pending_counts
+
+# Versioned schema migrations (hotels2/migrations/m<version>_<name>.py), recorded in Schema_Migrations:
+#   python -m hotels2.migrate status
+#   python -m hotels2.migrate up --batch-size 500 --max-rate 2000
+#   python -m hotels2.migrate up --dry-run
+# An interrupted run (Ctrl+C, crash) continues from the checkpoint of its last batch.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned schema migrations with batched backfills.")
+    parser.add_argument("command", choices=["status", "up"])
+    parser.add_argument("--target", type=int, help="last version to apply (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="only count documents left to backfill")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-rate", type=float, help="documents per second")
+    parser.add_argument("--pause-ratio", type=float, default=PAUSE_RATIO, help="pause after a batch, times its duration")
+    args = parser.parse_args(argv)
+
+    mongo = get_mongo()
+    if mongo is None:
+        print("[ADMIN] Migrations are only used by the Mongo backend; the embedded schema is created with it.")
+        return 0
+
+    if args.command == "status":
+        states = migration_states(mongo)
+        for migration in load_migrations():
+            state = states.get(migration.version, {})
+            print(f"[ADMIN] {migration.version:4} {migration.name:32} {state.get('status', 'pending'):8} "
+                  f"{state.get('processed', 0):8} documents  {migration.description}")
+        return 0
+
+    if args.dry_run:
+        for migration, count in pending_counts(mongo, args.target):
+            print(f"[ADMIN] {migration.version:4} {migration.name:32} would touch {count} documents")
+        return 0
+    return 0 if migrate(mongo, args.target, args.batch_size, args.max_rate, args.pause_ratio) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
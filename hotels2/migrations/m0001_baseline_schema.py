@@ -0,0 +1,279 @@
+"""Schema validators and indexes of the collections as they were before versioned migrations.
+
+The specs below are a frozen copy; later schema changes are new migrations, never edits of this file.
+"""
+
+hotel_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["name", "street", "city", "zip_code", "imgUrl"],
+        "properties": {
+            "name": {
+                "bsonType": "string"
+            },
+            "street": {
+                "bsonType": "string"
+            },
+            "city": {
+                "bsonType": "string"
+            },
+            "zip_code": {
+                "bsonType": "string",
+                "description": "string consisting of 5 digit without any separators"
+            },
+            "imgUrl": {
+                "bsonType": "string"
+            },
+            "location": {
+                "bsonType": ["object", "null"],
+                "description": "optional GeoJSON point: {type: 'Point', coordinates: [longitude, latitude]}",
+                "required": ["type", "coordinates"],
+                "properties": {
+                    "type": {
+                        "enum": ["Point"]
+                    },
+                    "coordinates": {
+                        "bsonType": "array",
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "items": {
+                            "bsonType": "double"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+room_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["hotel_id", "room_type", "room_number", "price_per_night", "is_available", "imgUrl"],
+        "properties": {
+            "hotel_id": {
+                "bsonType": "objectId"
+            },
+            "room_type": {
+                "bsonType": "int"
+            },
+            "room_number": {
+                "bsonType": "int"
+            },
+            "price_per_night": {
+                "bsonType": "double",
+                "minimum": 0.0,
+                "exclusiveMinimum": True
+            },
+            "is_available": {
+                "bsonType": "bool"
+            },
+            "imgUrl": {
+                "bsonType": "string"
+            },
+            "bookings": {
+                "bsonType": "array",
+                "items": {
+                    "bsonType": "object",
+                    "properties": {
+                        "booking_id": {
+                            "bsonType": "objectId"
+                        },
+                        "customer_id": {
+                            "bsonType": "objectId"
+                        },
+                        "date_from": {
+                            "bsonType": "date"
+                        },
+                        "date_to": {
+                            "bsonType": "date"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+customer_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["name", "surname", "email", "password", "bookings"],
+        "properties": {
+            "name": {
+                "bsonType": "string"
+            },
+            "surname": {
+                "bsonType": "string"
+            },
+            "email": {
+                "bsonType": "string"
+            },
+            "password": {
+                "bsonType": "string"
+            },
+            "bookings": {
+                "bsonType": ["array"],
+                "items": {
+                    "bsonType": "object",
+                    "properties": {
+                        "booking_id": {
+                            "bsonType": "objectId"
+                        },
+                        "room_id": {
+                            "bsonType": "objectId",
+                        },
+                        "date_from": {
+                            "bsonType": "date"
+                        },
+                        "date_to": {
+                            "bsonType": "date"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+booking_logs_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["booking_id", "customer_id", "room_id", "date_from", "date_to"],
+        "properties": {
+            "booking_id": {
+                "bsonType": "objectId"
+            },
+            "customer_id": {
+                "bsonType": "objectId"
+            },
+            "room_id": {
+                "bsonType": "objectId"
+            },
+            "date_from": {
+                "bsonType": "date"
+            },
+            "date_to": {
+                "bsonType": "date"
+            }
+        }
+    }
+}
+
+room_holds_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["room_id", "customer_id", "booking_id", "date_from", "date_to", "expires_at"],
+        "properties": {
+            "room_id": {
+                "bsonType": "objectId"
+            },
+            "customer_id": {
+                "bsonType": "objectId"
+            },
+            "booking_id": {
+                "bsonType": "objectId"
+            },
+            "date_from": {
+                "bsonType": "date"
+            },
+            "date_to": {
+                "bsonType": "date"
+            },
+            "expires_at": {
+                "bsonType": "date",
+                "description": "the TTL index removes the hold after this moment"
+            }
+        }
+    }
+}
+
+waitlist_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["room_id", "customer_id", "date_from", "date_to", "created_at", "expires_at"],
+        "properties": {
+            "room_id": {
+                "bsonType": "objectId"
+            },
+            "customer_id": {
+                "bsonType": "objectId"
+            },
+            "date_from": {
+                "bsonType": "date"
+            },
+            "date_to": {
+                "bsonType": "date"
+            },
+            "created_at": {
+                "bsonType": "date"
+            },
+            "expires_at": {
+                "bsonType": "date"
+            }
+        }
+    }
+}
+
+idempotency_keys_validator = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["key", "fingerprint", "booking_id", "status", "locked_at", "expires_at"],
+        "properties": {
+            "key": {
+                "bsonType": "string",
+                "description": "customer id and the key sent by the client, unique"
+            },
+            "fingerprint": {
+                "bsonType": "string"
+            },
+            "booking_id": {
+                "bsonType": "objectId"
+            },
+            "status": {
+                "enum": ["pending", "done"]
+            },
+            "result": {
+                "bsonType": ["bool", "null"]
+            },
+            "locked_at": {
+                "bsonType": "date"
+            },
+            "expires_at": {
+                "bsonType": "date"
+            }
+        }
+    }
+}
+
+collection_validators = [
+    ("Hotels", hotel_validator),
+    ("Rooms", room_validator),
+    ("Customers", customer_validator),
+    ("Booking_Logs", booking_logs_validator),
+    ("Room_Holds", room_holds_validator),
+    ("Waitlist", waitlist_validator),
+    ("Idempotency_Keys", idempotency_keys_validator),
+]
+
+# (collection, keys, options)
+indexes = [
+    ("Hotels", [("location", "2dsphere")], {"name": "hotels_location"}),
+    ("Room_Holds", [("expires_at", 1)], {"name": "holds_ttl", "expireAfterSeconds": 0}),
+    ("Room_Holds", [("room_id", 1), ("date_from", 1), ("date_to", 1)], {"name": "holds_interval"}),
+    ("Waitlist", [("expires_at", 1)], {"name": "waitlist_ttl", "expireAfterSeconds": 0}),
+    ("Waitlist", [("room_id", 1), ("created_at", 1)], {"name": "waitlist_room"}),
+    ("Idempotency_Keys", [("key", 1)], {"name": "idempotency_key", "unique": True}),
+    ("Idempotency_Keys", [("expires_at", 1)], {"name": "idempotency_ttl", "expireAfterSeconds": 0}),
+]
+
+
+def schema(mongo):
+    existing = mongo.db.list_collection_names()
+    for name, validator in collection_validators:
+        if name not in existing:
+            mongo.db.create_collection(name)
+        mongo.db.command("collMod", name, validator=validator)
+    for name, keys, options in indexes:
+        mongo.db[name].create_index(keys, **options)
@@ -0,0 +1,9 @@
+"""Hotels added before geo search get an explicit `location: null`, so every hotel has the field."""
+
+collection = "Hotels"
+backfill_filter = {"location": {"$exists": False}}
+projection = {"_id": 1}
+
+
+def backfill(document):
+    return {"$set": {"location": None}}
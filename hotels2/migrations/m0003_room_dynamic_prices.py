@@ -0,0 +1,24 @@
+"""Rooms may carry base_price and dynamic_price, written by the pricing engine (hotels2.reprice).
+
+No backfill: a room without them is priced from its current price_per_night on its first run.
+"""
+from copy import deepcopy
+from hotels2.migrations.m0001_baseline_schema import room_validator as previous_room_validator
+
+room_validator = deepcopy(previous_room_validator)
+room_validator["$jsonSchema"]["properties"].update({
+    "base_price": {
+        "bsonType": "double",
+        "minimum": 0.0,
+        "exclusiveMinimum": True
+    },
+    "dynamic_price": {
+        "bsonType": "double",
+        "minimum": 0.0,
+        "exclusiveMinimum": True
+    },
+})
+
+
+def schema(mongo):
+    mongo.db.command("collMod", "Rooms", validator=room_validator)
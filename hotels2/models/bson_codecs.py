@@ -0,0 +1,29 @@
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from bson.raw_bson import RawBSONDocument
+from hotels2.models.hotel import Hotel
+from hotels2.models.room import Room
+from hotels2.models.customer import Customer
+from hotels2.models.booking_log import BookingLog
+from hotels2.models.room_hold import RoomHold
+from hotels2.models.waitlist_entry import WaitlistEntry
+from hotels2.models.idempotency_key import IdempotencyKey
+
+
+class ModelEncoder(TypeEncoder):
+    # lets model instances be used anywhere inside a document (e.g. a BookingLog pushed into an array)
+    def __init__(self, model_class):
+        self.model_class = model_class
+
+    @property
+    def python_type(self):
+        return self.model_class
+
+    def transform_python(self, value):
+        return value.to_dict()
+
+
+model_type_registry = TypeRegistry([ModelEncoder(model) for model in (Hotel, Room, Customer, BookingLog,
+                                                                       RoomHold, WaitlistEntry, IdempotencyKey)])
+model_codec_options = CodecOptions(type_registry=model_type_registry)
+# documents are kept as undecoded bytes until a field is read - cheap for large result pages
+raw_codec_options = CodecOptions(document_class=RawBSONDocument)
\ No newline at end of file
@@ -0,0 +1,26 @@
+import bson
+
+
+class BsonModel:
+    # subclasses list their fields in __slots__; the slot order is the field order in the stored document
+    __slots__ = ()
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, document):
+        model = cls.__new__(cls)
+        for field in cls.__slots__:
+            setattr(model, field, document.get(field))
+        return model
+
+    def to_bson(self):
+        return bson.encode(self.to_dict())
+
+    @classmethod
+    def from_bson(cls, data):
+        return cls.from_dict(bson.decode(data))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
\ No newline at end of file
@@ -1,4 +1,9 @@
-class Customer:
+from hotels2.models.bson_model import BsonModel
+
+
+class Customer(BsonModel):
+    __slots__ = ('name', 'surname', 'email', 'password', 'bookings')
+
     def __init__(self, name, surname, email, password, bookings=None):
         if bookings is None:
             bookings = []
@@ -6,4 +11,4 @@ class Customer:
         self.surname = surname
         self.email = email
         self.password = password
-        self.bookings = bookings
+        self.bookings = bookings
\ No newline at end of file
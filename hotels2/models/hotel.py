@@ -1,7 +1,18 @@
-class Hotel:
-    def __init__(self, name, street, city, zip_code, imgUrl):
+from hotels2.models.bson_model import BsonModel
+
+
+def make_point(longitude: float, latitude: float):
+    # GeoJSON keeps the longitude first
+    return {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+
+
+class Hotel(BsonModel):
+    __slots__ = ('name', 'street', 'city', 'zip_code', 'imgUrl', 'location')
+
+    def __init__(self, name, street, city, zip_code, imgUrl, location=None):
         self.name = name
         self.street = street
         self.city = city
         self.zip_code = zip_code
         self.imgUrl = imgUrl
+        self.location = location
@@ -0,0 +1,14 @@
+from hotels2.models.bson_model import BsonModel
+
+
+class IdempotencyKey(BsonModel):
+    __slots__ = ('key', 'fingerprint', 'booking_id', 'status', 'result', 'locked_at', 'expires_at')
+
+    def __init__(self, key, fingerprint, booking_id, status, result, locked_at, expires_at):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.booking_id = booking_id
+        self.status = status
+        self.result = result
+        self.locked_at = locked_at
+        self.expires_at = expires_at
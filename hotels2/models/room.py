@@ -1,4 +1,9 @@
-class Room:
+from hotels2.models.bson_model import BsonModel
+
+
+class Room(BsonModel):
+    __slots__ = ('hotel_id', 'room_type', 'room_number', 'price_per_night', 'is_available', 'imgUrl', 'bookings')
+
     def __init__(self, hotel_id, room_type, room_number, price_per_night, is_available, imgUrl):
         self.hotel_id = hotel_id
         self.room_type = room_type
@@ -6,4 +11,4 @@ class Room:
         self.price_per_night = price_per_night
         self.is_available = is_available
         self.imgUrl = imgUrl
-        self.bookings = []
+        self.bookings = []
\ No newline at end of file
@@ -0,0 +1,14 @@
+from hotels2.models.bson_model import BsonModel
+
+
+class RoomHold(BsonModel):
+    __slots__ = ('room_id', 'customer_id', 'booking_id', 'date_from', 'date_to', 'expires_at')
+
+    def __init__(self, room_id, customer_id, booking_id, date_from, date_to, expires_at):
+        self.room_id = room_id
+        self.customer_id = customer_id
+        # id the booking gets when the hold is confirmed
+        self.booking_id = booking_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.expires_at = expires_at
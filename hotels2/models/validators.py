@@ -1,141 +1,8 @@
 # Mongo schemas ###
+# The current validator of every collection is the frozen spec of the latest migration that changed it.
+# A schema change is a new migration in hotels2/migrations with its own copy of the spec; here only the
+# import moves to that migration, so replaying older migrations still reproduces the older schema.
 
-hotel_validator = {
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["name", "street", "city", "zip_code", "imgUrl"],
-        "properties": {
-            "name": {
-                "bsonType": "string"
-            },
-            "street": {
-                "bsonType": "string"
-            },
-            "city": {
-                "bsonType": "string"
-            },
-            "zip_code": {
-                "bsonType": "string",
-                "description": "string consisting of 5 digit without any separators"
-            },
-            "imgUrl": {
-                "bsonType": "string"
-            }
-        }
-    }
-}
-
-room_validator = {
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["hotel_id", "room_type", "room_number", "price_per_night", "is_available", "imgUrl"],
-        "properties": {
-            "hotel_id": {
-                "bsonType": "objectId"
-            },
-            "room_type": {
-                "bsonType": "int"
-            },
-            "room_number": {
-                "bsonType": "int"
-            },
-            "price_per_night": {
-                "bsonType": "double",
-                "minimum": 0.0,
-                "exclusiveMinimum": True
-            },
-            "is_available": {
-                "bsonType": "bool"
-            },
-            "imgUrl": {
-                "bsonType": "string"
-            },
-            "bookings": {
-                "bsonType": "array",
-                "items": {
-                    "bsonType": "object",
-                    "properties": {
-                        "booking_id": {
-                            "bsonType": "objectId"
-                        },
-                        "customer_id": {
-                            "bsonType": "objectId"
-                        },
-                        "date_from": {
-                            "bsonType": "date"
-                        },
-                        "date_to": {
-                            "bsonType": "date"
-                        }
-                    }
-                }
-            }
-        }
-    }
-}
-
-customer_validator = {
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["name", "surname", "email", "password", "bookings"],
-        "properties": {
-            "name": {
-                "bsonType": "string"
-            },
-            "surname": {
-                "bsonType": "string"
-            },
-            "email": {
-                "bsonType": "string"
-            },
-            "password": {
-                "bsonType": "string"
-            },
-            "bookings": {
-                "bsonType": ["array"],
-                "items": {
-                    "bsonType": "object",
-                    "properties": {
-                        "booking_id": {
-                            "bsonType": "objectId"
-                        },
-                        "room_id": {
-                            "bsonType": "objectId",
-                        },
-                        "date_from": {
-                            "bsonType": "date"
-                        },
-                        "date_to": {
-                            "bsonType": "date"
-                        }
-                    }
-                }
-            }
-        }
-    }
-}
-
-
-booking_logs_validator = {
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["booking_id", "customer_id", "room_id", "date_from", "date_to"],
-        "properties": {
-            "booking_id": {
-                "bsonType": "objectId"
-            },
-            "customer_id": {
-                "bsonType": "objectId"
-            },
-            "room_id": {
-                "bsonType": "objectId"
-            },
-            "date_from": {
-                "bsonType": "date"
-            },
-            "date_to": {
-                "bsonType": "date"
-            }
-        }
-    }
-}
+from hotels2.migrations.m0001_baseline_schema import hotel_validator, customer_validator, booking_logs_validator, \
+    room_holds_validator, waitlist_validator, idempotency_keys_validator
+from hotels2.migrations.m0003_room_dynamic_prices import room_validator
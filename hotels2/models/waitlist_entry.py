@@ -0,0 +1,13 @@
+from hotels2.models.bson_model import BsonModel
+
+
+class WaitlistEntry(BsonModel):
+    __slots__ = ('room_id', 'customer_id', 'date_from', 'date_to', 'created_at', 'expires_at')
+
+    def __init__(self, room_id, customer_id, date_from, date_to, created_at, expires_at):
+        self.room_id = room_id
+        self.customer_id = customer_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.created_at = created_at
+        self.expires_at = expires_at
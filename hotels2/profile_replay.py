@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import uuid
+
+# Sends requests recorded by the profiling middleware (PROFILING=1) again, against the local database,
+# with profiling forced on, and prints where their time went:
+#   HOTELS_BACKEND=sqlite HOTELS_SQLITE_PATH=hotels.sqlite3 \
+#       python -m hotels2.profile_replay profiles/requests.jsonl --endpoint views.my_bookings --repeat 5
+# Requests that are not GET are skipped unless --include-writes is given, as they change the database.
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def load_recordings(path: str, ids=None, endpoint: str = None, include_writes: bool = False):
+    recordings = []
+    with open(path, encoding="utf-8") as recordings_file:
+        for line in recordings_file:
+            record = json.loads(line)
+            if ids and record['id'] not in ids:
+                continue
+            if endpoint and record['endpoint'] != endpoint:
+                continue
+            if not include_writes and record['request']['method'] not in READ_METHODS:
+                continue
+            recordings.append(record)
+    return recordings
+
+
+def send(client, recorded: dict, headers: dict):
+    with client.session_transaction() as session:
+        session.clear()
+        if recorded['user_id']:
+            # what flask_login keeps in the session of a logged in user
+            session['_user_id'] = recorded['user_id']
+            session['_fresh'] = True
+    return client.open(recorded['path'], method=recorded['method'], query_string=recorded['query_string'],
+                       data=recorded['form'] or None, json=recorded['json'], headers=headers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded requests with profiling.")
+    parser.add_argument("recordings", help="requests.jsonl written by the profiling middleware")
+    parser.add_argument("--id", action="append", dest="ids", help="only this recording (repeatable)")
+    parser.add_argument("--endpoint", help="only recordings of this endpoint, e.g. views.my_bookings")
+    parser.add_argument("--repeat", type=int, default=3, help="profiled runs of every request")
+    parser.add_argument("--warmup", type=int, default=1, help="unprofiled runs first (caches, connections)")
+    parser.add_argument("--mode", choices=["sample", "cprofile"], default="sample")
+    parser.add_argument("--interval-ms", type=float, default=1.0, help="sampling interval")
+    parser.add_argument("--out", default=os.path.join("profiles", "replay"), help="directory for the profiles")
+    parser.add_argument("--include-writes", action="store_true", help="also replay POST and other writes")
+    args = parser.parse_args(argv)
+
+    recordings = load_recordings(args.recordings, args.ids, args.endpoint, args.include_writes)
+    if not recordings:
+        print("[ADMIN] No recordings match.")
+        return 1
+
+    token = uuid.uuid4().hex
+    os.environ.update(PROFILING="1", PROFILING_SAMPLE_RATE="0", PROFILING_TOKEN=token, PROFILING_MODE=args.mode,
+                      PROFILING_INTERVAL_MS=str(args.interval_ms), PROFILING_DIR=args.out, RATE_LIMIT_ENABLED="0")
+    from hotels2 import create_app
+    from hotels2.routes.profiling import RECORDINGS_FILE
+    client = create_app(start_workers=False).test_client()
+
+    profile_ids = []
+    for record in recordings:
+        recorded = record['request']
+        for _ in range(args.warmup):
+            send(client, recorded, {})
+        ids = []
+        for _ in range(args.repeat):
+            response = send(client, recorded, {'X-Profile': token})
+            ids.append(response.headers.get('X-Profile-Id'))
+        profile_ids.append((record, response.status_code, ids))
+
+    with open(os.path.join(args.out, RECORDINGS_FILE), encoding="utf-8") as results_file:
+        results = {result['id']: result for result in map(json.loads, results_file)}
+    for record, status, ids in profile_ids:
+        runs = sorted((results[profile_id] for profile_id in ids if profile_id in results),
+                      key=lambda result: result['duration_ms'])
+        if not runs:
+            print(f"[ADMIN] {record['request']['method']} {record['request']['path']}: not profiled")
+            continue
+        median = runs[len(runs) // 2]
+        print(f"[ADMIN] {record['request']['method']} {record['request']['path']} ({record['endpoint']}) -> "
+              f"{status}: median {median['duration_ms']:.1f} ms of {len(runs)} runs "
+              f"(recorded: {record['duration_ms']:.1f} ms)")
+        categories = {category: statistics.median(run['categories_ms'][category] for run in runs)
+                      for category in median['categories_ms']}
+        for category, milliseconds in sorted(categories.items(), key=lambda item: -item[1]):
+            print(f"[ADMIN]     {category:7} {milliseconds:8.1f} ms")
+        print(f"[ADMIN]     files: {', '.join(os.path.join(args.out, name) for name in median['files'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse
+import csv
+import sys
+import time
+
+from hotels2.server.dbOperations import storage
+from hotels2.server.dynamicPricing import BATCH_SIZE, load_config, reprice
+
+# Sets price_per_night of every room from the occupancy of its hotel and room type over the next days:
+#   python -m hotels2.reprice --dry-run --diff prices.csv
+#   python -m hotels2.reprice --config pricing.json --every 60
+# Prices are derived from each room's base price (its last price set by hand), so runs never compound.
+
+DIFF_FIELDS = ["room_id", "hotel_id", "room_type", "occupancy", "multiplier", "base_price", "old_price", "new_price"]
+
+
+def write_diff(path: str, changes: list):
+    with open(path, "w", newline="", encoding="utf-8") as diff_file:
+        writer = csv.DictWriter(diff_file, DIFF_FIELDS)
+        writer.writeheader()
+        writer.writerows(changes)
+
+
+def run_once(args, config):
+    changes, rooms, written, read_time, write_time = reprice(storage, config, args.dry_run,
+                                                             batch_size=args.batch_size)
+    raised = sum(1 for change in changes if change['new_price'] > change['old_price'])
+    print(f"[ADMIN] {rooms} rooms read and priced in {read_time:.2f}s: {len(changes)} to change "
+          f"({raised} up, {len(changes) - raised} down)")
+    for change in sorted(changes, key=lambda c: abs(c['new_price'] / c['old_price'] - 1), reverse=True)[:args.top]:
+        print(f"[ADMIN]     {change['room_id']} type {change['room_type']} occupancy {change['occupancy']:.0%}: "
+              f"{change['old_price']:.2f} -> {change['new_price']:.2f} (base {change['base_price']:.2f})")
+    if args.diff:
+        write_diff(args.diff, changes)
+        print("[ADMIN] Diff written to", args.diff)
+    if not args.dry_run:
+        print(f"[ADMIN] {written} rooms updated in {write_time:.2f}s "
+              f"({len(changes) - written} changed meanwhile and skipped)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Occupancy-driven room prices.")
+    parser.add_argument("--config", help="JSON file overriding the default demand curves and limits")
+    parser.add_argument("--dry-run", action="store_true", help="only show the price changes")
+    parser.add_argument("--diff", help="write every planned change to this CSV file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="bulk_write batch size")
+    parser.add_argument("--top", type=int, default=10, help="largest changes to print")
+    parser.add_argument("--every", type=float, help="keep running, once every this many minutes")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print("[ADMIN]", e)
+        return 1
+
+    while True:
+        run_once(args, config)
+        if not args.every:
+            return 0
+        try:
+            time.sleep(args.every * 60)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import secrets
+from collections import Counter
+from flask import Blueprint, current_app, request, g, jsonify, abort
+from flask_login import current_user
+from hotels2.server.rateLimiter import MemoryBucketStore, SqliteBucketStore, ConcurrencyLimiter
+from hotels2.server.workerLifecycle import in_flight
+
+admission = Blueprint('admission', __name__)
+
+# endpoints that run aggregations against the database; static pages and assets are never limited
+LIMITED_ENDPOINTS = {'views.home', 'views.rooms_list', 'views.reserve_list', 'views.my_bookings',
+                     'views.remove_specific_booking', 'views.room_availability', 'views.hotel_availability',
+                     'views.rooms_near', 'views.create_hold', 'views.confirm_room_hold', 'views.release_room_hold',
+                     'views.join_room_waitlist', 'auth.login', 'auth.sign_up', 'auth.api_token'}
+BOOKING_ENDPOINTS = {'views.remove_specific_booking', 'views.create_hold', 'views.confirm_room_hold',
+                     'views.release_room_hold', 'views.join_room_waitlist'}
+
+# (tokens per second, burst) of each bucket, per priority class
+RATE_LIMITS = {
+    'booking': {'ip': (2.0, 20), 'user': (1.0, 10)},
+    'default': {'ip': (5.0, 30), 'user': (3.0, 20)},
+    'search': {'ip': (1.0, 10), 'user': (2.0, 15)},
+}
+# share of the concurrency slots each class may fill; the rest is kept for booking writes
+CONCURRENCY_SHARES = {'booking': 1.0, 'default': 0.8, 'search': 0.5}
+# seconds a request may wait for a free slot before it is shed
+CONCURRENCY_WAITS = {'booking': 2.0, 'default': 0.1, 'search': 0.0}
+
+admission_metrics = Counter()
+
+
+def request_priority():
+    form = request.form if request.method == 'POST' else {}
+    if request.endpoint in BOOKING_ENDPOINTS or \
+            (request.endpoint == 'views.reserve_list' and form.get('checkin') is not None) or \
+            (request.endpoint == 'views.my_bookings' and form.get('new_checkin') is not None):
+        return 'booking'
+    if request.endpoint in ('views.rooms_list', 'views.reserve_list', 'views.rooms_near') and \
+            not current_user.is_authenticated:
+        return 'search'
+    return 'default'
+
+
+def too_many_requests(reason: str, retry_after: float):
+    admission_metrics[f"rejected_{reason}"] += 1
+    response = jsonify({'error': 'Too many requests, try again later.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def shutting_down():
+    admission_metrics["rejected_draining"] += 1
+    response = jsonify({'error': 'Server is restarting, try again.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    response.headers['Connection'] = 'close'
+    return response
+
+
+def admit_request():
+    if request.endpoint not in LIMITED_ENDPOINTS:
+        return None
+
+    priority = request_priority()
+    if priority == 'booking':
+        # a worker that is shutting down finishes the bookings it started but takes no new ones
+        if in_flight.draining.is_set():
+            return shutting_down()
+        in_flight.begin('booking')
+        g.in_flight_booking = True
+    if not current_app.config['RATE_LIMIT_ENABLED']:
+        return None
+
+    store = current_app.extensions['rate_limit_store']
+    keys = [('ip', request.remote_addr or 'unknown')]
+    if current_user.is_authenticated:
+        keys.append(('user', current_user._id))
+    for scope, value in keys:
+        rate, burst = RATE_LIMITS[priority][scope]
+        allowed, retry_after = store.take((priority, scope, value), rate, burst)
+        if not allowed:
+            return too_many_requests(f"{priority}_{scope}_rate", retry_after)
+
+    if not current_app.extensions['concurrency_limiter'].acquire(priority):
+        return too_many_requests(f"{priority}_concurrency", 1)
+    g.admission_slot = True
+    admission_metrics[f"admitted_{priority}"] += 1
+    return None
+
+
+def release_slot(exc=None):
+    if g.pop('admission_slot', False):
+        current_app.extensions['concurrency_limiter'].release()
+    if g.pop('in_flight_booking', False):
+        in_flight.end('booking')
+
+
+@admission.route('/metrics')
+def metrics():
+    # opt-in: served only with METRICS_TOKEN set and sent as `Authorization: Bearer <METRICS_TOKEN>`
+    token = current_app.config['METRICS_TOKEN']
+    if not token or not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(404)
+    limiter = current_app.extensions['concurrency_limiter']
+    lines = [f"hotels2_admission_in_flight {limiter.in_flight}",
+             f"hotels2_admission_concurrency_limit {limiter.limit}",
+             f"hotels2_in_flight_bookings {in_flight.count('booking')}",
+             f"hotels2_rate_limit_buckets {len(current_app.extensions['rate_limit_store'])}"]
+    lines += [f"hotels2_admission_{name}_total {count}" for name, count in sorted(admission_metrics.items())]
+    return current_app.response_class("\n".join(lines) + "\n", mimetype='text/plain')
+
+
+def init_admission_control(app):
+    app.config.setdefault('RATE_LIMIT_ENABLED', os.getenv("RATE_LIMIT_ENABLED", "1") == "1")
+    # a gunicorn worker runs at most GUNICORN_THREADS requests at once, so a larger limit is never reached;
+    # by default it equals the thread count (see gunicorn_conf.py) and the class shares start shedding
+    # searches once half of the threads are busy
+    app.config.setdefault('ADMISSION_MAX_CONCURRENT',
+                          int(os.getenv("ADMISSION_MAX_CONCURRENT", os.getenv("GUNICORN_THREADS", 8))))
+    app.config.setdefault('METRICS_TOKEN', os.getenv("METRICS_TOKEN"))
+    if os.getenv("RATE_LIMIT_BACKEND") == "sqlite":
+        store = SqliteBucketStore(os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.sqlite3"))
+    else:
+        store = MemoryBucketStore()
+    app.extensions['rate_limit_store'] = store
+    app.extensions['concurrency_limiter'] = ConcurrencyLimiter(app.config['ADMISSION_MAX_CONCURRENT'],
+                                                               CONCURRENCY_SHARES, CONCURRENCY_WAITS)
+    app.register_blueprint(admission)
+    app.before_request(admit_request)
+    app.teardown_request(release_slot)
@@ -1,15 +1,28 @@
 import re
+import time
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, current_app
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from hotels2.models.logged_user import LoggedUser
-from hotels2.server.dbOperations import *
+from hotels2.server.dbOperations import add_customer, get_user_email
+from hotels2.server.authTokens import create_auth_token
 
 auth = Blueprint('auth', __name__)
 
 
+def remember_profile(user_id: str, name: str, surname: str, email: str):
+    session['user_profile'] = {'_id': user_id, 'name': name, 'surname': surname, 'email': email,
+                               'checked_at': time.time()}
+
+
+def regenerate_session():
+    # server-side sessions get a new id; cookie sessions carry their own data and have no id to fix
+    if hasattr(session, 'regenerate'):
+        session.regenerate()
+
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -21,7 +34,9 @@ def login():
             flash('There is no user with this email address.', category='error')
         elif check_password_hash(user['password'], password):
             user = LoggedUser(str(user['_id']), user['name'], user['surname'], user['email'], user['password'], user['bookings'])
+            regenerate_session()
             login_user(user, remember=True)
+            remember_profile(user._id, user.name, user.surname, user.email)
             flash("Logged in!", category='success')
             return redirect(url_for('views.home'))
         else:
@@ -33,6 +48,8 @@ def login():
 @login_required
 def logout():
     logout_user()
+    session.pop('user_profile', None)
+    regenerate_session()
     return redirect(url_for('auth.login'))
 
 
@@ -62,9 +79,26 @@ def sign_up():
                 flash('Account created successfully!', category='success')
                 user = get_user_email(email)
                 user = LoggedUser(str(user['_id']), name, surname, email, password1)
+                regenerate_session()
                 login_user(user, remember=True)
+                remember_profile(user._id, name, surname, email)
                 return redirect(url_for('views.home'))
             else:
                 flash('Creating account failed, this email is already taken!', category='error')
 
     return render_template("signup.html", user=current_user)
+
+
+@auth.route('/api/token', methods=['POST'])
+def api_token():
+    credentials = request.get_json(silent=True) or request.form
+    email = credentials.get('email')
+    password = credentials.get('password')
+
+    user = get_user_email(email)
+    if user is None or not check_password_hash(user['password'], password):
+        return jsonify({'error': 'Invalid email or password.'}), 401
+
+    token, expires_at = create_auth_token(current_app.config['SECRET_KEY'], user,
+                                          current_app.config['AUTH_TOKEN_MAX_AGE'])
+    return jsonify({'token': token, 'token_type': 'Bearer', 'expires_at': expires_at})
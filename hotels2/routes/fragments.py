@@ -0,0 +1,26 @@
+from flask import current_app
+from markupsafe import Markup
+from hotels2.server.fragmentCache import fragment_cache
+
+
+def render_fragment(template: str, **context):
+    # fragments do not depend on the request, so they skip context processors
+    return current_app.jinja_env.get_template(template).render(**context)
+
+
+def hotel_card(hotel):
+    return Markup(fragment_cache.get_or_render(
+        'hotel', hotel,
+        lambda: render_fragment("fragments/hotel_card.html", hotel=hotel)))
+
+
+def room_card_info(room):
+    return Markup(fragment_cache.get_or_render(
+        'room', room,
+        lambda: render_fragment("fragments/room_card_info.html", room=room),
+        doc_id=room['room_id']))
+
+
+def init_fragment_cache(app):
+    app.jinja_env.globals['hotel_card'] = hotel_card
+    app.jinja_env.globals['room_card_info'] = room_card_info
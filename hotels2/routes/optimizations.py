@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Blueprint, current_app, request, url_for, abort
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+assets = Blueprint('assets', __name__)
+
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript'}
+# catalogue pages answered with a weak ETag so an unchanged page costs a 304 instead of the full HTML
+CONDITIONAL_ENDPOINTS = {'views.home', 'views.rooms_list'}
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+asset_fingerprints = {}
+asset_bodies = {}
+
+
+def choose_encoding(accept_encoding: str):
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def fingerprint(filename: str):
+    path = os.path.join(current_app.static_folder, filename)
+    mtime = os.path.getmtime(path)
+    cached = asset_fingerprints.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as asset:
+            cached = (mtime, hashlib.md5(asset.read()).hexdigest()[:10])
+        asset_fingerprints[filename] = cached
+    return cached[1]
+
+
+def asset_url(filename: str):
+    # base_style.css -> /assets/base_style.<hash>.css, so a changed file gets a new URL
+    stem, ext = os.path.splitext(filename)
+    return url_for('assets.fingerprinted_asset', filename=f"{stem}.{fingerprint(filename)}{ext}")
+
+
+@assets.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    stem, ext = os.path.splitext(filename)
+    real_stem, _, digest = stem.rpartition('.')
+    real_name = real_stem + ext
+    path = safe_join(current_app.static_folder, real_name)
+    if not real_stem or path is None or not os.path.isfile(path) or fingerprint(real_name) != digest:
+        abort(404)
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    key = (real_name, digest, encoding)
+    if key not in asset_bodies:
+        with open(path, 'rb') as asset:
+            data = asset.read()
+        asset_bodies[key] = compress(data, encoding) if encoding else data
+
+    mimetype = mimetypes.guess_type(real_name)[0] or 'application/octet-stream'
+    response = current_app.response_class(asset_bodies[key], mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def optimize_response(response):
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+
+    if request.method == 'GET' and request.endpoint in CONDITIONAL_ENDPOINTS and 'ETag' not in response.headers:
+        response.set_etag(hashlib.md5(response.get_data()).hexdigest(), weak=True)
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_response_optimizations(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.register_blueprint(assets)
+    app.after_request(optimize_response)
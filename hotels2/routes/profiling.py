@@ -0,0 +1,99 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app, g, request
+from flask_login import current_user
+from hotels2.server.requestProfiler import PROFILE_MODES, make_profiler
+
+# every profiled request is appended here (inside PROFILING_DIR) so profile_replay can send it again
+RECORDINGS_FILE = "requests.jsonl"
+# form fields never written to the recording
+SECRET_FIELDS = ('password', 'password1', 'password2')
+
+recordings_lock = threading.Lock()
+
+
+def wants_profile():
+    # the header only works with the configured token, so clients cannot turn profiling on by themselves
+    token = current_app.config['PROFILING_TOKEN']
+    if token and request.headers.get('X-Profile') == token:
+        mode = request.headers.get('X-Profile-Mode', current_app.config['PROFILING_MODE'])
+        return mode if mode in PROFILE_MODES else current_app.config['PROFILING_MODE']
+    if random.random() < current_app.config['PROFILING_SAMPLE_RATE']:
+        return current_app.config['PROFILING_MODE']
+    return None
+
+
+def start_profile():
+    if request.endpoint == 'static':
+        return None
+    mode = wants_profile()
+    if mode is None:
+        return None
+    profiler = make_profiler(mode, current_app.config['PROFILING_INTERVAL_MS'] / 1000)
+    try:
+        profiler.start()
+    except ValueError:
+        # cProfile is already running for another request (one profiler per interpreter on Python 3.12+)
+        return None
+    g.profile = (profiler, uuid.uuid4().hex[:12], time.perf_counter())
+    return None
+
+
+def add_profile_header(response):
+    if 'profile' in g:
+        response.headers['X-Profile-Id'] = g.profile[1]
+        g.profile_status = response.status_code
+    return response
+
+
+def recorded_request():
+    form = {key: values for key, values in request.form.to_dict(flat=False).items() if key not in SECRET_FIELDS}
+    body = request.get_json(silent=True) if request.is_json else None
+    if isinstance(body, dict):
+        body = {key: value for key, value in body.items() if key not in SECRET_FIELDS}
+    return {"method": request.method, "path": request.path,
+            "query_string": request.query_string.decode('utf-8', 'replace'), "form": form, "json": body,
+            "user_id": current_user._id if current_user.is_authenticated else None}
+
+
+def finish_profile(exc=None):
+    entry = g.pop('profile', None)
+    if entry is None:
+        return
+    profiler, profile_id, started = entry
+    profiler.stop()
+    duration = time.perf_counter() - started
+
+    directory = current_app.config['PROFILING_DIR']
+    os.makedirs(directory, exist_ok=True)
+    endpoint = request.endpoint or 'unknown'
+    name = f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint.replace('.', '_')}-{profile_id}"
+    files = profiler.write(os.path.join(directory, name), f"{request.method} {request.full_path}")
+    record = {"id": profile_id, "time": datetime.now().isoformat(timespec='seconds'), "endpoint": endpoint,
+              "status": g.pop('profile_status', 500), "duration_ms": round(duration * 1000, 2),
+              "categories_ms": {category: round(seconds * 1000, 2)
+                                for category, seconds in profiler.categories().items()},
+              "files": [os.path.basename(path) for path in files], "request": recorded_request()}
+    with recordings_lock, open(os.path.join(directory, RECORDINGS_FILE), "a", encoding="utf-8") as recordings:
+        recordings.write(json.dumps(record, default=str) + "\n")
+
+
+def init_request_profiling(app):
+    # off unless PROFILING=1; then sampled requests and requests with `X-Profile: <PROFILING_TOKEN>` are profiled
+    app.config.setdefault('PROFILING_ENABLED', os.getenv("PROFILING") == "1")
+    app.config.setdefault('PROFILING_SAMPLE_RATE', float(os.getenv("PROFILING_SAMPLE_RATE", 0)))
+    app.config.setdefault('PROFILING_TOKEN', os.getenv("PROFILING_TOKEN"))
+    app.config.setdefault('PROFILING_MODE', os.getenv("PROFILING_MODE", "sample"))
+    app.config.setdefault('PROFILING_INTERVAL_MS', float(os.getenv("PROFILING_INTERVAL_MS", 1)))
+    app.config.setdefault('PROFILING_DIR', os.getenv("PROFILING_DIR", "profiles"))
+    if not app.config['PROFILING_ENABLED']:
+        return
+    # first, so the time spent in admission control and the other hooks is profiled too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_profile)
+    app.after_request(add_profile_header)
+    app.teardown_request(finish_profile)
@@ -1,10 +1,23 @@
-from flask import Blueprint, render_template, request, flash, jsonify
+import hashlib
+import json
+import secrets
+from flask import Blueprint, render_template, request, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from hotels2.server.dbOperations import *
+from datetime import datetime
+from bson.objectid import ObjectId
+from hotels2.server.dbOperations import add_new_booking, change_booking, confirm_hold, filter_rooms, \
+    get_all_cities, get_all_hotels, get_all_user_bookings, get_month_availability, hold_room, join_waitlist, \
+    release_hold, remove_booking, run_idempotent, search_hotels
 
 views = Blueprint('views', __name__)
 
 
+@views.app_template_global()
+def new_idempotency_key():
+    # rendered into every booking form, so a resubmitted form is recognised as the same request
+    return secrets.token_urlsafe(16)
+
+
 @views.route('/')
 def home():
     hotels = get_all_hotels()
@@ -45,7 +58,7 @@ def my_bookings():
 @views.route('/rooms', methods=['GET', 'POST'])
 def rooms_list():
     cities = get_all_cities()
-    rooms = filter_rooms()
+    rooms = filter_rooms(lazy=True)
     if request.method == 'POST':
         min_price = request.form.get('min_price')
         max_price = request.form.get('max_price')
@@ -72,7 +85,7 @@ def rooms_list():
         elif check_in is not None and check_in < curr_date:
             flash('Check in date must be greater or equal to current date.', category='error')
         else:
-            rooms = filter_rooms(check_in, check_out, min_price, max_price, people, city)
+            rooms = filter_rooms(check_in, check_out, min_price, max_price, people, city, lazy=True)
 
     return render_template("rooms_list.html", user=current_user, rooms=rooms, cities=cities)
 
@@ -81,7 +94,7 @@ def rooms_list():
 @login_required
 def reserve_list():
     cities = get_all_cities()
-    rooms = filter_rooms()
+    rooms = filter_rooms(lazy=True)
     if request.method == 'POST' and request.form.get('checkin') is not None:
         date_format = "%Y-%m-%d"
         check_in = request.form.get('checkin')
@@ -99,8 +112,9 @@ def reserve_list():
         else:
             room_id = request.form.get('room_id')
             customer_id = request.form.get('customer_id')
+            idempotency_key = request.form.get('idempotency_key')
 
-            if add_new_booking(customer_id, room_id, check_in, check_out):
+            if add_new_booking(customer_id, room_id, check_in, check_out, idempotency_key):
                 flash('Room booked successfully!', category='success')
             else:
                 flash('Room is already booked in this period of time.', category='error')
@@ -130,7 +144,7 @@ def reserve_list():
         elif check_in is not None and check_in < curr_date:
             flash('Check in date must be greater or equal to current date.', category='error')
         else:
-            rooms = filter_rooms(check_in, check_out, min_price, max_price, people, city)
+            rooms = filter_rooms(check_in, check_out, min_price, max_price, people, city, lazy=True)
 
     return render_template("reserve_rooms.html", user=current_user, rooms=rooms, cities=cities)
 
@@ -146,3 +160,132 @@ def remove_specific_booking():
     else:
         flash('Something went wrong.', category='error')
     return jsonify({})
+
+
+def availability_response(year_month: str, room_id: str = None, hotel_id: str = None):
+    try:
+        month = datetime.strptime(year_month, "%Y-%m") if year_month else datetime.now()
+    except ValueError:
+        return jsonify({'error': 'Month must be given as YYYY-MM.'}), 400
+
+    availability = get_month_availability(month.year, month.month, room_id, hotel_id)
+    if availability is None:
+        return jsonify({'error': 'Invalid id.'}), 400
+    if room_id is not None and not availability['rooms']:
+        return jsonify({'error': 'No room with such id.'}), 404
+
+    body = json.dumps(availability, sort_keys=True)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.md5(body.encode()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+
+@views.route('/api/rooms/<room_id>/availability')
+def room_availability(room_id):
+    return availability_response(request.args.get('month'), room_id=room_id)
+
+
+@views.route('/api/hotels/<hotel_id>/availability')
+def hotel_availability(hotel_id):
+    return availability_response(request.args.get('month'), hotel_id=hotel_id)
+
+
+@views.route('/api/rooms/near')
+def rooms_near():
+    # e.g. /api/rooms/near?lng=19.94&lat=50.06&radius_km=5&checkin=2024-07-01&checkout=2024-07-03&max_price=300
+    try:
+        longitude = float(request.args['lng'])
+        latitude = float(request.args['lat'])
+        radius_km = float(request.args.get('radius_km', 5))
+        # without both dates rooms are not filtered by occupancy, like filter_rooms() with its defaults
+        stay = {}
+        if request.args.get('checkin') and request.args.get('checkout'):
+            stay['check_in'] = datetime.strptime(request.args['checkin'], "%Y-%m-%d")
+            stay['check_out'] = datetime.strptime(request.args['checkout'], "%Y-%m-%d")
+        min_price = float(request.args['min_price']) if request.args.get('min_price') else None
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+        people = int(request.args['people']) if request.args.get('people') else None
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lng and lat are required; dates as YYYY-MM-DD, prices and radius_km as numbers.'}), 400
+
+    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90) or not 0 < radius_km <= 100:
+        return jsonify({'error': 'Location out of range or radius_km not in (0, 100].'}), 400
+    if stay and stay['check_out'] < stay['check_in']:
+        return jsonify({'error': 'Check in date must be less or equal than check out date.'}), 400
+
+    rooms = filter_rooms(min_price=min_price, max_price=max_price, room_type=people,
+                         near=(longitude, latitude, radius_km), **stay)
+    for room in rooms:
+        room['room_id'] = str(room['room_id'])
+        room['hotel_id'] = str(room['hotel_id'])
+    return jsonify({'rooms': rooms})
+
+
+@views.route('/api/hotels/search')
+def hotels_search():
+    # typeahead: /api/hotels/search?q=gołę or ?q=rzesz ul
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number.'}), 400
+    return jsonify({'hotels': search_hotels(query, limit)})
+
+
+def stay_from_request():
+    data = request.get_json(silent=True) or request.form
+    date_format = "%Y-%m-%d"
+    return (data.get('room_id'), datetime.strptime(data.get('checkin', ''), date_format),
+            datetime.strptime(data.get('checkout', ''), date_format))
+
+
+@views.route('/api/holds', methods=['POST'])
+@login_required
+def create_hold():
+    try:
+        room_id, check_in, check_out = stay_from_request()
+    except ValueError:
+        return jsonify({'error': 'room_id, checkin and checkout (YYYY-MM-DD) are required.'}), 400
+
+    hold = hold_room(current_user._id, room_id, check_in, check_out)
+    if hold is None:
+        return jsonify({'error': 'Room is already booked or held in this period of time.'}), 409
+    return jsonify({'hold_id': str(hold['_id']), 'expires_at': hold['expires_at'].isoformat() + 'Z'}), 201
+
+
+@views.route('/api/holds/<hold_id>/confirm', methods=['POST'])
+@login_required
+def confirm_room_hold(hold_id):
+    # a retried confirmation with the same Idempotency-Key header gets the first outcome back
+    try:
+        customer_id = ObjectId(current_user._id)
+    except Exception:
+        return jsonify({'error': 'Invalid user.'}), 400
+    booked = run_idempotent(request.headers.get('Idempotency-Key'), customer_id, f"confirm:{hold_id}",
+                            lambda booking_id: confirm_hold(hold_id, customer_id))
+    if not booked:
+        return jsonify({'error': 'Hold expired or does not exist.'}), 409
+    return jsonify({'booked': True})
+
+
+@views.route('/api/holds/<hold_id>', methods=['DELETE'])
+@login_required
+def release_room_hold(hold_id):
+    if not release_hold(hold_id, current_user._id):
+        return jsonify({'error': 'No such hold.'}), 404
+    return jsonify({})
+
+
+@views.route('/api/waitlist', methods=['POST'])
+@login_required
+def join_room_waitlist():
+    try:
+        room_id, check_in, check_out = stay_from_request()
+    except ValueError:
+        return jsonify({'error': 'room_id, checkin and checkout (YYYY-MM-DD) are required.'}), 400
+
+    if not join_waitlist(current_user._id, room_id, check_in, check_out):
+        return jsonify({'error': 'Invalid room or dates.'}), 400
+    return jsonify({'waitlisted': True}), 201
@@ -0,0 +1,35 @@
+import time
+from itsdangerous import URLSafeSerializer, BadSignature
+
+TOKEN_SALT = "hotels2-api-token"
+DEFAULT_TOKEN_MAX_AGE = 3600
+
+
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt=TOKEN_SALT)
+
+
+def create_auth_token(secret_key, user, max_age: int = DEFAULT_TOKEN_MAX_AGE):
+    # token is self-contained: everything needed to rebuild LoggedUser travels with it,
+    # so verifying it never touches the database
+    claims = {
+        "id": str(user['_id']),
+        "name": user['name'],
+        "surname": user['surname'],
+        "email": user['email'],
+        "exp": int(time.time()) + max_age
+    }
+    return _serializer(secret_key).dumps(claims), claims['exp']
+
+
+def verify_auth_token(secret_key, token: str):
+    try:
+        claims = _serializer(secret_key).loads(token)
+    except BadSignature:
+        print("[SERVER] Invalid auth token signature.")
+        return None
+
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        print("[SERVER] Auth token expired.")
+        return None
+    return claims
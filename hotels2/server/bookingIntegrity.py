@@ -0,0 +1,175 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from hotels2.server.dbOperations import HOLD_TTL
+
+BATCH_SIZE = 1000
+# bookings younger than this may still be half-written by push_bookings and are not checked; the booking_id is
+# created with the hold, which can be confirmed up to HOLD_TTL later, so the grace outlasts every live hold
+GRACE = HOLD_TTL + timedelta(minutes=5)
+EXAMPLES = 5
+BOOKING_FIELDS = ('room_id', 'customer_id', 'date_from', 'date_to')
+
+
+def grouped(bookings):
+    # (booking_id, [entries]) from a stream sorted by booking_id
+    key, group = None, []
+    for booking in bookings:
+        if group and booking['booking_id'] != key:
+            yield key, group
+            group = []
+        key = booking['booking_id']
+        group.append(booking)
+    if group:
+        yield key, group
+
+
+def merge_join(room_bookings, customer_bookings):
+    # (booking_id, entries in Rooms, entries in Customers) of two streams sorted by booking_id
+    rooms, customers = grouped(room_bookings), grouped(customer_bookings)
+    room, customer = next(rooms, None), next(customers, None)
+    while room is not None or customer is not None:
+        if customer is None or (room is not None and room[0] < customer[0]):
+            yield room[0], room[1], []
+            room = next(rooms, None)
+        elif room is None or customer[0] < room[0]:
+            yield customer[0], [], customer[1]
+            customer = next(customers, None)
+        else:
+            yield room[0], room[1], customer[1]
+            room, customer = next(rooms, None), next(customers, None)
+
+
+class BookingReconciler:
+    """Finds (and with repair=True fixes) bookings whose two copies in Rooms and Customers diverged.
+
+    Both copies are streamed sorted by booking_id and merge-joined, so memory stays bounded by the
+    batch size however many bookings there are. Rooms are the source of truth, as they are what
+    can_be_booked checks:
+      missing_in_customer      the room holds it, the customer does not -> copied to the customer
+      missing_in_room          the customer holds it, the room does not (a half-done cancellation)
+                               -> removed from the customer
+      mismatch                 the copies differ in room, customer or dates -> customer copy rewritten;
+                               a room copy without a customer is only reported
+      orphan_room_booking      its customer no longer exists -> removed from the room
+      orphan_customer_booking  its room no longer exists -> removed from the customer
+      duplicate, overlap       one booking_id stored twice on a side, or overlapping stays in one room;
+                               these need a person and are only reported
+    Every repair re-reads both copies first, so bookings changed during the scan are left alone.
+    """
+
+    def __init__(self, storage, batch_size: int = BATCH_SIZE, repair: bool = False, grace: timedelta = GRACE,
+                 report=None):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.repair = repair
+        self.cutoff = datetime.now(timezone.utc) - grace
+        self.report = report
+        self.counts = Counter()
+        self.examples = {}
+        self.one_sided = []
+
+    def issue(self, kind: str, booking: dict, **details):
+        self.counts[kind] += 1
+        record = {"kind": kind, **{field: str(value) for field, value in booking.items()}, **details}
+        examples = self.examples.setdefault(kind, [])
+        if len(examples) < EXAMPLES:
+            examples.append(record)
+        if self.report is not None:
+            self.report.write(json.dumps(record, default=str) + "\n")
+
+    def fixed(self, done):
+        self.counts['repaired' if done else 'repair_failed'] += 1
+
+    def check_copies(self):
+        for booking_id, in_rooms, in_customers in merge_join(self.storage.iter_room_bookings(self.batch_size),
+                                                             self.storage.iter_customer_bookings(self.batch_size)):
+            self.counts['bookings'] += 1
+            if booking_id.generation_time > self.cutoff:
+                self.counts['skipped_recent'] += 1
+                continue
+            if len(in_rooms) > 1 or len(in_customers) > 1:
+                self.issue('duplicate', in_rooms[0] if in_rooms else in_customers[0],
+                           copies_in_rooms=len(in_rooms), copies_in_customers=len(in_customers))
+            elif in_rooms and in_rooms[0].get('customer_id') is None:
+                # the source of truth does not say whose booking it is: nothing to match or repair it against
+                self.issue('mismatch', in_rooms[0], missing_field='customer_id',
+                           customer_copy={field: str(in_customers[0].get(field)) for field in BOOKING_FIELDS}
+                           if in_customers else None)
+            elif not in_customers or not in_rooms:
+                self.one_sided.append((in_rooms[0], 'room') if in_rooms else (in_customers[0], 'customer'))
+                if len(self.one_sided) >= self.batch_size:
+                    self.check_one_sided()
+            elif any(in_rooms[0].get(field) != in_customers[0].get(field) for field in BOOKING_FIELDS):
+                self.issue('mismatch', in_rooms[0], customer_copy={field: str(in_customers[0].get(field))
+                                                                   for field in BOOKING_FIELDS})
+                if self.repair:
+                    self.fixed(self.rewrite_customer_copy(in_rooms[0], in_customers[0]))
+        self.check_one_sided()
+
+    def check_one_sided(self):
+        # one existence lookup per kind for the whole batch instead of one per booking
+        customers = self.storage.find_existing_ids(
+            "customers", {booking['customer_id'] for booking, side in self.one_sided if side == 'room'})
+        rooms = self.storage.find_existing_ids(
+            "rooms", {booking.get('room_id') for booking, side in self.one_sided if side == 'customer'} - {None})
+        for booking, side in self.one_sided:
+            if side == 'room':
+                kind = 'missing_in_customer' if booking['customer_id'] in customers else 'orphan_room_booking'
+            else:
+                # a customer copy without a room points nowhere, like one whose room was removed
+                kind = 'missing_in_room' if booking.get('room_id') in rooms else 'orphan_customer_booking'
+            self.issue(kind, booking)
+            if self.repair:
+                self.fixed(self.repair_one_sided(kind, booking))
+        self.one_sided = []
+
+    def repair_one_sided(self, kind: str, booking: dict):
+        booking_id, room_id, customer_id = booking['booking_id'], booking.get('room_id'), booking['customer_id']
+        in_room = self.storage.find_room_booking(room_id, booking_id)
+        in_customer = self.storage.find_customer_booking(customer_id, booking_id)
+        if kind == 'missing_in_customer' and in_room is not None and in_customer is None:
+            return self.storage.push_customer_booking(customer_id, customer_copy(booking)) > 0
+        if kind == 'orphan_room_booking' and in_room is not None and in_customer is None:
+            return self.storage.pull_room_booking(room_id, booking_id) > 0
+        if kind in ('missing_in_room', 'orphan_customer_booking') and in_room is None and in_customer is not None:
+            return self.storage.pull_customer_booking(customer_id, booking_id) > 0
+        return False
+
+    def rewrite_customer_copy(self, room_copy: dict, wrong_copy: dict):
+        booking_id = room_copy['booking_id']
+        in_room = self.storage.find_room_booking(room_copy['room_id'], booking_id)
+        in_customer = self.storage.find_customer_booking(wrong_copy['customer_id'], booking_id)
+        if in_room is None or in_customer is None or \
+                (in_room['date_from'], in_room['date_to']) != (room_copy['date_from'], room_copy['date_to']) or \
+                (in_customer.get('date_from'), in_customer.get('date_to')) != \
+                (wrong_copy.get('date_from'), wrong_copy.get('date_to')):
+            return False
+        if wrong_copy['customer_id'] != room_copy['customer_id'] or wrong_copy.get('room_id') != room_copy['room_id']:
+            self.storage.pull_customer_booking(wrong_copy['customer_id'], booking_id)
+            return self.storage.push_customer_booking(room_copy['customer_id'], customer_copy(room_copy)) > 0
+        return self.storage.set_customer_booking_dates(room_copy['customer_id'], booking_id,
+                                                       room_copy['date_from'], room_copy['date_to']) > 0
+
+    def check_overlaps(self):
+        # sweep over each room's bookings by start date; `active` holds the stays not yet ended
+        room_id, active = None, []
+        for booking in self.storage.iter_bookings_by_room(self.batch_size):
+            if booking['room_id'] != room_id:
+                room_id, active = booking['room_id'], []
+            active = [other for other in active if other['date_to'] > booking['date_from']]
+            for other in active:
+                self.issue('overlap', booking, overlaps_booking_id=str(other['booking_id']),
+                           overlaps_dates=f"{other['date_from']} - {other['date_to']}")
+            active.append(booking)
+
+    def run(self, overlaps: bool = True):
+        self.check_copies()
+        if overlaps:
+            self.check_overlaps()
+        return self.counts
+
+
+def customer_copy(booking: dict):
+    return {"booking_id": booking['booking_id'], "room_id": booking['room_id'],
+            "date_from": booking['date_from'], "date_to": booking['date_to']}
@@ -0,0 +1,166 @@
+import math
+import time
+from datetime import datetime
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from hotels2.server.dbOperations import storage
+
+BULK_BATCH_SIZE = 500
+BULK_OPERATIONS = ('scale_price', 'set_price', 'set_availability', 'remove_rooms')
+
+
+def parse_room_numbers(room_numbers):
+    # accepts 7, "7", "1-50" or "1,4,9-12"
+    if room_numbers is None or room_numbers == '':
+        return None
+    if isinstance(room_numbers, int):
+        return [room_numbers]
+
+    numbers = []
+    for part in str(room_numbers).split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-')
+            numbers.extend(range(int(first), int(last) + 1))
+        elif part:
+            numbers.append(int(part))
+    return numbers
+
+
+def build_room_filter(city: str = None, hotel_id: str = None, room_type: int = None, room_numbers=None):
+    room_filter = {}
+    if hotel_id:
+        room_filter['hotel_id'] = ObjectId(hotel_id)
+    elif city:
+        room_filter['city'] = city
+    if room_type not in (None, ''):
+        room_filter['room_type'] = int(room_type)
+
+    numbers = parse_room_numbers(room_numbers)
+    if numbers is not None:
+        room_filter['room_numbers'] = numbers
+    return room_filter
+
+
+def scale_prices(room_filter: dict, factor: float, dry_run: bool = False):
+    if factor <= 0:
+        print("[SERVER] Price factor must be greater than 0.")
+        return None
+    if dry_run:
+        return storage.count_rooms(room_filter)
+    return storage.update_rooms(room_filter, multiply_fields={"price_per_night": float(factor)})
+
+
+def set_prices(room_filter: dict, price: float, dry_run: bool = False):
+    if price <= 0:
+        print("[SERVER] Price must be greater than 0.")
+        return None
+    if dry_run:
+        return storage.count_rooms(room_filter)
+    return storage.update_rooms(room_filter, set_fields={"price_per_night": float(price)})
+
+
+def set_availabilities(room_filter: dict, availability: bool, dry_run: bool = False):
+    if dry_run:
+        return storage.count_rooms(room_filter)
+    return storage.update_rooms(room_filter, set_fields={"is_available": availability})
+
+
+def remove_rooms(room_filter: dict, dry_run: bool = False, batch_size: int = BULK_BATCH_SIZE):
+    if not room_filter:
+        print("[SERVER] Refusing to remove rooms without a filter.")
+        return None
+    if dry_run:
+        return storage.count_rooms(room_filter)
+
+    # bookings of the removed rooms are archived and pulled from Customers.bookings, as in cascade_remove_rooms
+    removed = 0
+    while True:
+        result = storage.remove_rooms_batch(room_filter, batch_size, datetime.utcnow())
+        if result is None:
+            return removed
+        removed += result[0]
+
+
+def parse_operation(op: dict):
+    # returns (name, room_filter, value); raises ValueError for a row that must not be applied
+    name = op.get('op')
+    if name not in BULK_OPERATIONS:
+        raise ValueError(f"unknown operation {name!r}")
+    try:
+        room_filter = build_room_filter(op.get('city'), op.get('hotel_id'), op.get('room_type'),
+                                        op.get('room_numbers'))
+        if name == 'scale_price':
+            value = float(op['factor'])
+        elif name == 'set_price':
+            value = float(op['price'])
+        elif name == 'set_availability':
+            value = str(op['is_available']).lower() in ('1', 'true', 'yes')
+        else:
+            value = None
+    except KeyError as e:
+        raise ValueError(f"missing field {e}")
+    except (InvalidId, TypeError) as e:
+        raise ValueError(str(e))
+
+    if not room_filter:
+        # a row without city, hotel_id, room_type or room_numbers would touch every room in the database
+        raise ValueError("no room filter given")
+    if name in ('scale_price', 'set_price'):
+        check_price(value, "price and factor")
+    return name, room_filter, value
+
+
+def check_price(value: float, what: str = "price"):
+    # float() accepts "nan", "inf" and "-1"; none of them may reach a room
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{what} must be a finite number greater than 0")
+    return value
+
+
+def parse_room_price(op: dict):
+    try:
+        room_id, price = ObjectId(op['room_id']), float(op['price'])
+    except KeyError as e:
+        raise ValueError(f"missing field {e}")
+    except (InvalidId, TypeError) as e:
+        raise ValueError(str(e))
+    return room_id, check_price(price)
+
+
+def set_room_prices(prices: list, dry_run: bool = False, batch_size: int = BULK_BATCH_SIZE, progress=None):
+    # prices: list of (room_id, new_price) pairs, written in bulk batches
+    try:
+        prices = [(ObjectId(room_id), check_price(float(price))) for room_id, price in prices]
+    except (InvalidId, TypeError, ValueError) as e:
+        print("[SERVER] Invalid room price:", e)
+        return None
+    if dry_run:
+        return len(prices)
+
+    modified = 0
+    for start in range(0, len(prices), batch_size):
+        batch = prices[start:start + batch_size]
+        modified += storage.set_room_prices(batch)
+        if progress is not None:
+            progress(start + len(batch), len(prices))
+    return modified
+
+
+def run_operation(op: dict, dry_run: bool = False):
+    try:
+        name, room_filter, value = parse_operation(op)
+    except ValueError as e:
+        print("[SERVER] Invalid bulk operation:", e)
+        return None
+
+    start = time.perf_counter()
+    if name == 'scale_price':
+        count = scale_prices(room_filter, value, dry_run)
+    elif name == 'set_price':
+        count = set_prices(room_filter, value, dry_run)
+    elif name == 'set_availability':
+        count = set_availabilities(room_filter, value, dry_run)
+    else:
+        count = remove_rooms(room_filter, dry_run)
+    return count, time.perf_counter() - start
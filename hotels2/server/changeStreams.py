@@ -0,0 +1,175 @@
+import os
+import socket
+import time
+from queue import Queue, Full, Empty
+from threading import Thread, Event
+from pymongo.errors import PyMongoError, OperationFailure
+
+WATCHED_COLLECTIONS = ("Rooms", "Hotels", "Customers", "Booking_Logs")
+TOKENS_COLLECTION = "Change_Stream_Tokens"
+CHANGE_QUEUE_SIZE = 1000
+TOKEN_SAVE_EVERY = 100
+TOKEN_SAVE_INTERVAL = 1.0
+RETRY_DELAY = 2.0
+# tokens of consumers that stopped saving them long ago (e.g. workers that exited) are deleted on start
+TOKEN_MAX_AGE = 7 * 24 * 3600
+CHANGE_STREAM_HISTORY_LOST = 286
+# events of these collections carry the whole document after an update (one extra lookup per event)
+FULL_DOCUMENT_COLLECTIONS = ("Hotels",)
+
+handlers = {collection: [] for collection in WATCHED_COLLECTIONS}
+
+
+def register_handler(collection: str, handler):
+    # handler(change) is called on the dispatcher thread for every change event of the collection;
+    # registering the same handler again (e.g. a second start in one process) does nothing
+    if handler not in handlers[collection]:
+        handlers[collection].append(handler)
+
+
+def handled_collections():
+    # a collection without handlers is not watched at all: its events would only be read and dropped
+    return [collection for collection in WATCHED_COLLECTIONS if handlers[collection]]
+
+
+class ChangeStreamConsumer:
+    """Watches the collections that have handlers and fans change events out to them.
+
+    One watcher thread per collection feeds a bounded queue (a slow handler blocks the watchers
+    instead of growing memory); a single dispatcher thread runs the handlers and persists the
+    resume token of every handled event, so a restarted consumer continues where it stopped.
+    """
+
+    def __init__(self, mongo, name: str, queue_size: int = CHANGE_QUEUE_SIZE):
+        self.mongo = mongo
+        self.name = name
+        self.queue = Queue(maxsize=queue_size)
+        self.stopped = Event()
+        self.threads = []
+        self.tokens = mongo.db[TOKENS_COLLECTION]
+        self.pending_tokens = {}
+        self.last_save = time.monotonic()
+        self.handled = 0
+
+    def token_id(self, collection: str):
+        return f"{self.name}:{collection}"
+
+    def load_token(self, collection: str):
+        saved = self.tokens.find_one({"_id": self.token_id(collection)})
+        return saved['token'] if saved else None
+
+    def prune_tokens(self):
+        self.tokens.delete_many({"updated_at": {"$lt": time.time() - TOKEN_MAX_AGE}})
+
+    def save_tokens(self):
+        for collection, token in self.pending_tokens.items():
+            self.tokens.update_one({"_id": self.token_id(collection)},
+                                   {"$set": {"token": token, "updated_at": time.time()}}, upsert=True)
+        self.pending_tokens.clear()
+        self.last_save = time.monotonic()
+
+    def watch(self, collection: str):
+        token = self.load_token(collection)
+        while not self.stopped.is_set():
+            try:
+                full_document = "updateLookup" if collection in FULL_DOCUMENT_COLLECTIONS else None
+                with self.mongo.db[collection].watch(resume_after=token, max_await_time_ms=1000,
+                                                     full_document=full_document) as stream:
+                    while not self.stopped.is_set():
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        token = change['_id']
+                        self.put(collection, change)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # the oplog no longer holds our position; start from now and let handlers rebuild
+                    print("[SERVER] Change stream history lost for", collection, "- restarting from now")
+                    token = None
+                    self.put(collection, {"operationType": "invalidate_all", "ns": {"coll": collection}})
+                else:
+                    print("[SERVER] Change stream", collection, "failed:", e)
+                    self.stopped.wait(RETRY_DELAY)
+            except PyMongoError as e:
+                print("[SERVER] Change stream", collection, "failed:", e)
+                self.stopped.wait(RETRY_DELAY)
+
+    def put(self, collection: str, change: dict):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put((collection, change), timeout=1)
+                return
+            except Full:
+                continue
+
+    def dispatch(self):
+        while not self.stopped.is_set() or not self.queue.empty():
+            try:
+                collection, change = self.queue.get(timeout=1)
+            except Empty:
+                collection = None
+
+            if collection is not None:
+                for handler in handlers[collection]:
+                    try:
+                        handler(change)
+                    except Exception as e:
+                        print("[SERVER] Change handler", getattr(handler, '__name__', handler), "failed:", e)
+                if '_id' in change:
+                    self.pending_tokens[collection] = change['_id']
+                self.handled += 1
+
+            if self.pending_tokens and (self.handled % TOKEN_SAVE_EVERY == 0 or
+                                        time.monotonic() - self.last_save > TOKEN_SAVE_INTERVAL):
+                try:
+                    self.save_tokens()
+                except PyMongoError as e:
+                    print("[SERVER] Saving resume tokens failed:", e)
+        if self.pending_tokens:
+            self.save_tokens()
+
+    def start(self):
+        try:
+            self.prune_tokens()
+        except PyMongoError as e:
+            print("[SERVER] Pruning resume tokens failed:", e)
+        self.threads = [Thread(target=self.watch, args=(collection,), daemon=True, name=f"watch-{collection}")
+                        for collection in handled_collections()]
+        self.threads.append(Thread(target=self.dispatch, daemon=True, name="change-dispatcher"))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+def invalidate_cities_on_change(change):
+    from hotels2.server.dbOperations import invalidate_cities
+    invalidate_cities()
+
+
+def update_hotel_search(change):
+    from hotels2.server.dbOperations import hotel_search
+    hotel_search.apply_change(change)
+
+
+def register_default_handlers():
+    # keeps this worker's derived caches in line with writes made by other workers and tools
+    register_handler("Hotels", invalidate_cities_on_change)
+    register_handler("Hotels", update_hotel_search)
+
+
+def default_consumer_name():
+    # one consumer per worker slot: two live processes sharing a name would resume from each other's position
+    # and skip events. gunicorn_conf.py gives every worker the slot of the one it replaces (WORKER_SLOT), so a
+    # restarted worker resumes from its predecessor's tokens; a process started without gunicorn is slot 0
+    return f"hotels2:{socket.gethostname()}:{os.getenv('WORKER_SLOT', '0')}"
+
+
+def start_change_streams(mongo, name: str = None):
+    name = name or default_consumer_name()
+    register_default_handlers()
+    return ChangeStreamConsumer(mongo, name).start()
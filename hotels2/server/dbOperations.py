@@ -1,54 +1,229 @@
-from hotels2.server.mongoConnection import *
-from hotels2.models.hotel import Hotel
+from hotels2.server.storageBackend import get_storage_backend, LazyStorage
+from hotels2.models.hotel import Hotel, make_point
 from hotels2.models.room import Room
 from hotels2.models.customer import Customer
-from datetime import datetime
+from hotels2.models.room_hold import RoomHold
+from hotels2.models.waitlist_entry import WaitlistEntry
+from hotels2.models.idempotency_key import IdempotencyKey
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from bson.objectid import ObjectId
-from hotels2.models.validators import *
+import random
 import re
-from pprint import pprint
-
-mongo = MongoConnection()
-
-
-def add_validators():
+import time
+import os
+from threading import Thread
+from hotels2.server.hotelSearch import HotelSearchIndex
+from hotels2.server.workerLifecycle import in_flight
+
+# connects on first use (in every gunicorn worker after the fork), never at import
+storage = LazyStorage(get_storage_backend)
+
+CASCADE_BATCH_SIZE = 200
+# a running cascade refreshes its heartbeat after every batch; one silent for longer than this lost its worker
+# and may be claimed by remove_hotel or resume_cascades
+CASCADE_LEASE = timedelta(minutes=5)
+
+# cities change rarely; the TTL is only a safety net when no change stream consumer is running
+CITIES_CACHE_TTL = 60
+cities_cache = {"cities": None, "expires": 0.0}
+
+hotel_search = HotelSearchIndex(lambda: storage.find_hotels())
+
+# how long a room stays reserved for a guest who is completing the checkout
+HOLD_TTL = timedelta(minutes=int(os.getenv("HOLD_MINUTES", 10)))
+
+# stored outcomes of booking requests are kept for a day; a request that died halfway is taken over
+# by its retry once the lease has passed, a retry arriving earlier waits up to IDEMPOTENCY_WAIT seconds
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_LEASE = timedelta(seconds=30)
+IDEMPOTENCY_WAIT = 5.0
+
+# the check-then-write of holds and bookings of one room runs under a lease on the room, taken in the database
+# so it also holds between processes; the lease frees the room if its holder dies halfway
+ROOM_LOCK_LEASE = timedelta(seconds=10)
+ROOM_LOCK_WAIT = 2.0
+
+
+def get_mongo():
+    # raw Mongo connection for Mongo-only tooling (validators, db_reset scripts); None on embedded backends
+    return getattr(storage.get(), 'mongo', None)
+
+
+def warm_up():
+    # run in every worker after the fork: opens the connection pool and fills the catalogue caches,
+    # so the first requests do not pay for the connection handshake and the search index build
+    start = time.perf_counter()
+    mongo = get_mongo()
+    if mongo is not None:
+        mongo.client.admin.command("ping")
+    get_all_cities()
+    hotel_search.ensure_built()
+    print("[SERVER] Warmed up", storage.name, "storage,", len(hotel_search), "hotels indexed in",
+          round((time.perf_counter() - start) * 1000), "ms")
+
+
+def add_validators(mongo=None):
+    mongo = mongo if mongo is not None else get_mongo()
+    if mongo is None:
+        print("[SERVER] Validators are only used by the Mongo backend.")
+        return
+    from hotels2.models.validators import room_validator, hotel_validator, customer_validator, \
+        booking_logs_validator, room_holds_validator, waitlist_validator, idempotency_keys_validator
     mongo.db.command("collMod", "Rooms", validator=room_validator)
     mongo.db.command("collMod", "Hotels", validator=hotel_validator)
     mongo.db.command("collMod", "Customers", validator=customer_validator)
     mongo.db.command("collMod", "Booking_Logs", validator=booking_logs_validator)
+    for name, validator in (("Room_Holds", room_holds_validator), ("Waitlist", waitlist_validator),
+                            ("Idempotency_Keys", idempotency_keys_validator)):
+        if name not in mongo.db.list_collection_names():
+            mongo.db.create_collection(name)
+        mongo.db.command("collMod", name, validator=validator)
+
+
+def add_indexes(mongo=None):
+    mongo = mongo if mongo is not None else get_mongo()
+    if mongo is None:
+        print("[SERVER] Indexes of the embedded backends are created with their schema.")
+        return
+    # sparse by nature: hotels without a location are simply not in the index
+    mongo.hotels.create_index([("location", "2dsphere")], name="hotels_location")
+    # TTL indexes: MongoDB deletes holds and waitlist entries once expires_at has passed
+    mongo.holds.create_index("expires_at", expireAfterSeconds=0, name="holds_ttl")
+    mongo.holds.create_index([("room_id", 1), ("date_from", 1), ("date_to", 1)], name="holds_interval")
+    mongo.waitlist.create_index("expires_at", expireAfterSeconds=0, name="waitlist_ttl")
+    mongo.waitlist.create_index([("room_id", 1), ("created_at", 1)], name="waitlist_room")
+    mongo.idempotency_keys.create_index("key", unique=True, name="idempotency_key")
+    mongo.idempotency_keys.create_index("expires_at", expireAfterSeconds=0, name="idempotency_ttl")
 
 
 # ### Hotels methods ###
-def add_hotel(name: str, street: str, city: str, zip_code: str, img: str):
+def add_hotel(name: str, street: str, city: str, zip_code: str, img: str,
+              longitude: float = None, latitude: float = None):
     zip_regex = r"^\d{5}$"
     result = re.match(zip_regex, zip_code)
 
     if result:
-        new_hotel = Hotel(name, street, city, zip_code, img)
-        mongo.hotels.insert_one(vars(new_hotel))
+        location = None
+        if longitude is not None and latitude is not None:
+            if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+                print("[SERVER] Invalid hotel location.")
+                return False
+            location = make_point(longitude, latitude)
+        new_hotel = Hotel(name, street, city, zip_code, img, location)
+        _id = storage.insert_hotel(new_hotel)
+        hotel_search.add({'_id': _id, **new_hotel.to_dict()})
+        invalidate_cities()
         return True
     else:
         print("[SERVER] Invalid zip code format. The format is: xxxxx")
         return False
 
 
-def remove_hotel(hotel_id: str):
+def remove_hotel(hotel_id: str, background: bool = True):
+    # also re-runs the cascade of a hotel that is already gone, e.g. after a failed or interrupted job
     try:
         _id = ObjectId(hotel_id)
     except Exception as e:
         print("[SERVER]", e)
         return False
 
-    res1 = mongo.hotels.delete_one({"_id": _id})
-    res2 = mongo.rooms.delete_many({"hotel_id": _id})
-    print("[SERVER] Removed:", res1.deleted_count, "hotels")
-    print("[SERVER] Removed:", res2.deleted_count, "rooms")
+    # the job is stored before the hotel disappears, so a worker dying at any point leaves a job to resume
+    job = storage.find_cascade_job(_id)
+    if job is None or job["status"] == "done":
+        job = {"hotel_id": _id, "status": "queued", "rooms_removed": 0, "bookings_archived": 0,
+               "customers_updated": 0, "started_at": datetime.utcnow(), "finished_at": None}
+    claimed = claim_cascade(job)
+
+    res = storage.delete_hotel(_id)
+    print("[SERVER] Removed:", res, "hotels")
+    hotel_search.remove(_id)
+    invalidate_cities()
+
+    if not claimed:
+        # another worker is running this cascade right now and finishes it
+        print("[SERVER] Cascade", _id, "is already running.")
+        return True
+    # rooms, their upcoming bookings and customer references are cleaned up off the request thread
+    if background:
+        # counted from here, so a worker shutting down waits for the cascade before it exits
+        in_flight.begin('cascade')
+        Thread(target=background_cascade, args=(_id, job), daemon=True).start()
+    else:
+        cascade_remove_rooms(_id, job)
+    return True
+
+
+def claim_cascade(job: dict):
+    # atomic: of two workers removing or resuming the same hotel only one gets to run its cascade
+    job["status"] = "running"
+    job["heartbeat"] = datetime.utcnow()
+    return storage.claim_cascade_job(job, job["heartbeat"] - CASCADE_LEASE)
+
+
+def cascade_remove_rooms(hotel_id: ObjectId, job: dict, batch_size: int = CASCADE_BATCH_SIZE):
+    # the job must be claimed (claim_cascade); progress and the heartbeat are saved after every batch,
+    # bookings that ended before the job started are dropped, not archived
+    try:
+        while True:
+            removed = storage.remove_rooms_batch({"hotel_id": hotel_id}, batch_size, job["started_at"])
+            if removed is None:
+                break
+            rooms_removed, bookings_archived, customers_updated = removed
+
+            job["rooms_removed"] += rooms_removed
+            job["bookings_archived"] += bookings_archived
+            job["customers_updated"] += customers_updated
+            job["heartbeat"] = datetime.utcnow()
+            storage.save_cascade_job(job)
+            print("[SERVER] Cascade", hotel_id, "- removed", job["rooms_removed"], "rooms,",
+                  "archived", job["bookings_archived"], "bookings")
+    except Exception as e:
+        job["status"] = "failed"
+        print("[SERVER] Cascade", hotel_id, "failed:", e)
+        try:
+            storage.save_cascade_job(job)
+        except Exception as save_error:
+            print("[SERVER] Saving cascade", hotel_id, "failed:", save_error)
+        return False
+
+    job["status"] = "done"
+    job["finished_at"] = datetime.utcnow()
+    storage.save_cascade_job(job)
     return True
 
 
+def background_cascade(hotel_id: ObjectId, job: dict):
+    try:
+        cascade_remove_rooms(hotel_id, job)
+    finally:
+        in_flight.end('cascade')
+
+
+def resume_cascades():
+    # finishes hotel removals whose job failed or whose worker died (status queued or failed, or running with
+    # a heartbeat older than CASCADE_LEASE); cascades still running elsewhere are left alone
+    resumed = 0
+    for job in storage.find_unfinished_cascade_jobs():
+        status = job["status"]
+        if not claim_cascade(job):
+            continue
+        print("[SERVER] Resuming cascade", job["hotel_id"], "left", status)
+        if cascade_remove_rooms(job["hotel_id"], job):
+            resumed += 1
+    return resumed
+
+
+def get_cascade_job(hotel_id: str):
+    try:
+        return storage.find_cascade_job(ObjectId(hotel_id))
+    except Exception as e:
+        print("[SERVER]", e)
+        return None
+
+
 def get_all_hotels():
-    hotels = mongo.hotels.find()
-    hotels = list(hotels)
+    hotels = storage.find_hotels()
     if not len(hotels):
         print("[SERVER] No hotels in the database.")
     return hotels
@@ -62,13 +237,13 @@ def add_room(hotel_id: str, room_type: int, room_number: int, ppn, img: str, ava
         print("[SERVER]", e)
         return False
 
-    count = mongo.rooms.count_documents({"hotel_id": _id, "room_number": room_number})
+    count = storage.count_rooms({"hotel_id": _id, "room_number": room_number})
     if count > 0:
         print("[SERVER] Room number", room_number, "already exists.")
         return False
     else:
         new_room = Room(_id, room_type, room_number, float(ppn), availability, img)
-        mongo.rooms.insert_one(vars(new_room))
+        storage.insert_room(new_room)
         return True
 
 
@@ -79,8 +254,8 @@ def remove_room(room_id: str):
         print("[SERVER]", e)
         return False
 
-    res = mongo.rooms.delete_one({"_id": _id})
-    print("[SERVER] Removed:", res.deleted_count, "elements")
+    res = storage.delete_room(_id)
+    print("[SERVER] Removed:", res, "elements")
     return True
 
 
@@ -91,18 +266,15 @@ def set_price_per_night(room_id: str, new_price):
         print("[SERVER]", e)
         return False
 
-    price_update = {
-        "$set": {"price_per_night": float(new_price)}
-    }
     try:
-        update = mongo.rooms.update_one({"_id": _id}, price_update)
-        if update.matched_count <= 0:
+        update = storage.update_room(_id, {"price_per_night": float(new_price)})
+        if update <= 0:
             print("[SERVER] No room with such id")
             return False
         return True
     except Exception as e:
         print("[SERVER] Validation failed")
-        pprint(e)
+        print("[SERVER]", e)
         return False
 
 
@@ -113,11 +285,8 @@ def set_availability(room_id: str, availability: bool):
         print("[SERVER]", e)
         return False
 
-    availability_update = {
-        "$set": {"is_available": availability}
-    }
-    update = mongo.rooms.update_one({"_id": _id}, availability_update)
-    if update.matched_count <= 0:
+    update = storage.update_room(_id, {"is_available": availability})
+    if update <= 0:
         print("[SERVER] No room with such id")
         return False
     return True
@@ -125,12 +294,12 @@ def set_availability(room_id: str, availability: bool):
 
 # ### Customers methods ###
 def add_customer(name: str, surname: str, mail: str, passwd: str):
-    count = mongo.customers.count_documents({"email": mail})
+    count = storage.count_customers_with_email(mail)
     if count > 0:
         print("[SERVER] This email address is already taken.")
         return False
     new_customer = Customer(name, surname, mail, passwd)
-    mongo.customers.insert_one(vars(new_customer))
+    storage.insert_customer(new_customer)
     return True
 
 
@@ -141,104 +310,29 @@ def remove_customer(customer_id):
         print("[SERVER]", e)
         return False
 
-    res = mongo.customers.delete_one({"_id": _id})
-    print("[SERVER] Removed:", res.deleted_count, "elements")
+    res = storage.delete_customer(_id)
+    print("[SERVER] Removed:", res, "elements")
     return True
 
 
 def get_wrong_bookings(room_id: ObjectId, check_in: datetime, check_out: datetime, booking_id: ObjectId):
-    query = [
-        {
-            '$match': {
-                '_id': {'$exists': 1},
-                'is_available': True
-            }
-        },
-        {
-            '$project': {
-                'bookings': 1
-            }
-        },
-        {
-            '$unwind': '$bookings'
-        }
-    ]
-    if room_id is not None:
-        query[0]['$match']['_id'] = room_id
-
-    if booking_id is not None:
-        query.append({
-            "$match": {
-                "bookings.booking_id": {'$nin': [ObjectId(booking_id)]}
-            }
-        })
-    query.append({
-        '$match': {
-            '$or': [
-                {
-                    '$and': [
-                        {
-                            'bookings.date_from': {
-                                '$gte': check_in
-                            }
-                        }, {
-                            'bookings.date_from': {
-                                '$lt': check_out
-                            }
-                        }
-                    ]
-                }, {
-                    '$and': [
-                        {
-                            'bookings.date_from': {
-                                '$gte': check_in
-                            }
-                        }, {
-                            'bookings.date_to': {
-                                '$lte': check_out
-                            }
-                        }
-                    ]
-                }, {
-                    '$and': [
-                        {
-                            'bookings.date_from': {
-                                '$lte': check_in
-                            }
-                        }, {
-                            'bookings.date_to': {
-                                '$gte': check_out
-                            }
-                        }
-                    ]
-                }, {
-                    '$and': [
-                        {
-                            'bookings.date_to': {
-                                '$gt': check_in
-                            }
-                        }, {
-                            'bookings.date_to': {
-                                '$lte': check_out
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
-    })
-
-    return list(mongo.rooms.aggregate(query))
-
-
-def can_be_booked(room_id: ObjectId, check_in: datetime, check_out: datetime, booking_id: ObjectId = None):
+    return storage.find_wrong_bookings(room_id, check_in, check_out, booking_id)
+
+
+def can_be_booked(room_id: ObjectId, check_in: datetime, check_out: datetime, booking_id: ObjectId = None,
+                  hold_id: ObjectId = None):
     if check_in >= check_out:
         print("[SERVER] Check in date must be less than check out date.")
         return False
 
     bookings = get_wrong_bookings(room_id, check_in, check_out, booking_id)
+    if len(bookings) > 0:
+        return False
 
-    return len(bookings) == 0
+    # live holds of other guests count as occupied
+    holds = storage.find_live_holds(room_id, check_in, check_out, datetime.utcnow())
+    return all(hold['_id'] == hold_id or (booking_id is not None and hold.get('booking_id') == booking_id)
+               for hold in holds)
 
 
 def push_bookings(booking_id: ObjectId, customer_id: ObjectId, room_id: ObjectId, check_in: datetime,
@@ -256,21 +350,59 @@ def push_bookings(booking_id: ObjectId, customer_id: ObjectId, room_id: ObjectId
         "date_to": check_out
     }
 
-    room_update = mongo.rooms.update_one({"_id": room_id}, {"$push": {"bookings": booking_in_rooms}})
-    if room_update.matched_count <= 0:
+    room_update = storage.push_room_booking(room_id, booking_in_rooms)
+    if room_update <= 0:
         print("[SERVER] Failed to add booking to a room.")
         return False
 
-    customer_update = mongo.customers.update_one({"_id": customer_id},
-                                                 {"$push": {"bookings": booking_in_customers}})
-    if customer_update.matched_count <= 0:
+    customer_update = storage.push_customer_booking(customer_id, booking_in_customers)
+    if customer_update <= 0:
         print("[SERVER] Failed to add booking to a customer.")
         return False
     print("[SERVER] Successfully booked a room.")
     return True
 
 
-def add_new_booking(customer_id: str, room_id: str, check_in: datetime, check_out: datetime):
+def run_idempotent(key: str, customer_id: ObjectId, fingerprint: str, operation):
+    # operation(booking_id) -> bool runs at most once per key; repeated requests get the stored outcome
+    if not key:
+        return operation(ObjectId())
+
+    key = f"{customer_id}:{key}"
+    now = datetime.utcnow()
+    record = IdempotencyKey(key, fingerprint, ObjectId(), "pending", None, now, now + IDEMPOTENCY_TTL)
+    if not storage.insert_idempotency_key(record):
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while True:
+            stored = storage.find_idempotency_key(key)
+            if stored is None or stored['fingerprint'] != fingerprint:
+                print("[SERVER] Idempotency key was used for a different request.")
+                return False
+            if stored['status'] == "done":
+                print("[SERVER] Repeated request, returning the stored outcome.")
+                return stored['result']
+            now = datetime.utcnow()
+            if storage.lock_idempotency_key(key, now - IDEMPOTENCY_LEASE, now):
+                # the first attempt died halfway; finish it with the same booking id
+                record.booking_id = stored['booking_id']
+                break
+            if time.monotonic() > deadline:
+                print("[SERVER] Request with this idempotency key is still running.")
+                return False
+            time.sleep(0.1)
+
+    try:
+        result = operation(record.booking_id)
+    except Exception:
+        # keep the booking id: the retry finishes whatever part of the booking was written
+        storage.unlock_idempotency_key(key)
+        raise
+    storage.finish_idempotency_key(key, result)
+    return result
+
+
+def add_new_booking(customer_id: str, room_id: str, check_in: datetime, check_out: datetime,
+                    idempotency_key: str = None):
     try:
         customer_id = ObjectId(customer_id)
         room_id = ObjectId(room_id)
@@ -278,13 +410,136 @@ def add_new_booking(customer_id: str, room_id: str, check_in: datetime, check_ou
         print("[SERVER]", e)
         return False
 
-    if can_be_booked(room_id, check_in, check_out):
-        booking_id = ObjectId()
-        return push_bookings(booking_id, customer_id, room_id, check_in, check_out)
-    else:
+    def book(booking_id: ObjectId):
+        # booking straight away is a hold confirmed at once, so it races with other holds fairly
+        hold_id = place_hold(customer_id, room_id, check_in, check_out, booking_id)
+        if hold_id is None:
+            print("[SERVER] Term is colliding.")
+            return False
+        return confirm_hold(hold_id, customer_id)
+
+    fingerprint = f"book:{room_id}:{check_in.isoformat()}:{check_out.isoformat()}"
+    return run_idempotent(idempotency_key, customer_id, fingerprint, book)
+
+
+@contextmanager
+def room_lock(room_id: ObjectId):
+    # yields False when the room stayed locked for ROOM_LOCK_WAIT seconds
+    owner = ObjectId()
+    deadline = time.monotonic() + ROOM_LOCK_WAIT
+    while True:
+        now = datetime.utcnow()
+        if storage.lock_room(room_id, owner, now, now + ROOM_LOCK_LEASE):
+            break
+        if time.monotonic() > deadline:
+            print("[SERVER] Room", room_id, "is busy.")
+            yield False
+            return
+        time.sleep(random.uniform(0.01, 0.05))
+    try:
+        yield True
+    finally:
+        storage.unlock_room(room_id, owner)
+
+
+def place_hold(customer_id: ObjectId, room_id: ObjectId, check_in: datetime, check_out: datetime,
+               booking_id: ObjectId = None):
+    # booking_id is given by a retried request: its half-written booking and hold must not collide with it
+    with room_lock(room_id) as locked:
+        # nobody else checks or writes this room until the hold is inserted, so two guests can never
+        # both pass the check
+        if not locked or not can_be_booked(room_id, check_in, check_out, booking_id):
+            return None
+        booking_id = booking_id or ObjectId()
+        return storage.insert_hold(RoomHold(room_id, customer_id, booking_id, check_in, check_out,
+                                            datetime.utcnow() + HOLD_TTL))
+
+
+def hold_room(customer_id: str, room_id: str, check_in: datetime, check_out: datetime):
+    try:
+        customer_id = ObjectId(customer_id)
+        room_id = ObjectId(room_id)
+    except Exception as e:
+        print("[SERVER]", e)
+        return None
+
+    hold_id = place_hold(customer_id, room_id, check_in, check_out)
+    if hold_id is None:
         print("[SERVER] Term is colliding.")
+        return None
+    return storage.find_hold(hold_id)
+
+
+def confirm_hold(hold_id, customer_id):
+    try:
+        hold_id = ObjectId(hold_id)
+        customer_id = ObjectId(customer_id)
+    except Exception as e:
+        print("[SERVER]", e)
+        return False
+
+    hold = storage.find_hold(hold_id)
+    if hold is None or hold['customer_id'] != customer_id or hold['expires_at'] <= datetime.utcnow():
+        print("[SERVER] Hold expired or does not exist.")
         return False
 
+    booking_id = hold.get('booking_id') or ObjectId()
+    with room_lock(hold['room_id']) as locked:
+        if not locked:
+            return False
+        # a booking written around the holds (e.g. by change_booking before this hold existed) still wins
+        if get_wrong_bookings(hold['room_id'], hold['date_from'], hold['date_to'], booking_id):
+            print("[SERVER] Term is colliding.")
+            storage.delete_hold(hold_id)
+            return False
+        booked = push_bookings(booking_id, customer_id, hold['room_id'], hold['date_from'], hold['date_to'])
+        storage.delete_hold(hold_id)
+    return booked
+
+
+def release_hold(hold_id, customer_id):
+    try:
+        hold_id = ObjectId(hold_id)
+        customer_id = ObjectId(customer_id)
+    except Exception as e:
+        print("[SERVER]", e)
+        return False
+
+    hold = storage.find_hold(hold_id)
+    if hold is None or hold['customer_id'] != customer_id:
+        return False
+    storage.delete_hold(hold_id)
+    promote_waitlist(hold['room_id'])
+    return True
+
+
+def join_waitlist(customer_id: str, room_id: str, check_in: datetime, check_out: datetime):
+    try:
+        customer_id = ObjectId(customer_id)
+        room_id = ObjectId(room_id)
+    except Exception as e:
+        print("[SERVER]", e)
+        return False
+
+    now = datetime.utcnow()
+    if check_in >= check_out or check_in <= now:
+        print("[SERVER] Waitlist dates must be in the future.")
+        return False
+    # an entry is useless once the stay has started; the TTL index removes it then
+    storage.insert_waitlist_entry(WaitlistEntry(room_id, customer_id, check_in, check_out, now, check_in))
+    return True
+
+
+def promote_waitlist(room_id: ObjectId):
+    promoted = 0
+    for entry in storage.find_waitlist(room_id, datetime.utcnow()):
+        if add_new_booking(entry['customer_id'], room_id, entry['date_from'], entry['date_to']):
+            storage.delete_waitlist_entry(entry['_id'])
+            promoted += 1
+    if promoted:
+        print("[SERVER] Promoted", promoted, "waitlist entries for room", room_id)
+    return promoted
+
 
 def change_booking(customer_id: str, room_id: str, booking_id: str, check_in: datetime, check_out: datetime):
     try:
@@ -294,60 +549,44 @@ def change_booking(customer_id: str, room_id: str, booking_id: str, check_in: da
     except Exception as e:
         print("[SERVER]", e)
         return False
-    if can_be_booked(room_id, check_in, check_out, booking_id):
-
-        # update in Customers
-        customer_update = mongo.customers.update_one(
-            {
-                "_id": ObjectId(customer_id),
-                "bookings.booking_id": booking_id
-            },
-            {
-                "$set": {
-                    "bookings.$.date_from": check_in,
-                    "bookings.$.date_to": check_out
-                }
-            }
-        )
-
-        if customer_update.matched_count <= 0:
-            print("[SERVER] Failed to add booking to a room.")
+    # under the room lock, so a hold cannot be placed between the check and the write
+    with room_lock(room_id) as locked:
+        if not locked:
             return False
-
-        # update Rooms
-        room_update = mongo.rooms.update_one(
-            {
-                "_id": room_id,
-                "bookings.booking_id": booking_id
-            },
-            {
-                "$set": {
-                    "bookings.$.date_from": check_in,
-                    "bookings.$.date_to": check_out
-                }
-            }
-        )
-
-        if room_update.matched_count <= 0:
-            print("[SERVER] Failed to add booking to a room.")
+        if can_be_booked(room_id, check_in, check_out, booking_id):
+
+            # update in Customers
+            customer_update = storage.set_customer_booking_dates(customer_id, booking_id, check_in, check_out)
+            if customer_update <= 0:
+                print("[SERVER] Failed to add booking to a room.")
+                return False
+
+            # update Rooms
+            room_update = storage.set_room_booking_dates(room_id, booking_id, check_in, check_out)
+            if room_update <= 0:
+                print("[SERVER] Failed to add booking to a room.")
+                return False
+            return True
+        else:
+            print("[SERVER] You cannot rebook this room.")
             return False
-        return True
-    else:
-        print("[SERVER] You cannot rebook this room.")
-        return False
 
 
-def get_occupied_rooms(check_in: datetime, check_out: datetime):
+def get_occupied_rooms(check_in: datetime, check_out: datetime, hotel_ids: list = None):
 
-    booked_rooms = get_wrong_bookings(None, check_in, check_out, None)
+    booked_rooms = storage.find_wrong_bookings(None, check_in, check_out, None, hotel_ids)
     res: set = set()
     for i in booked_rooms:
         res.add(i['_id'])
+    if check_in is not None and check_out is not None:
+        for hold in storage.find_live_holds(None, check_in, check_out, datetime.utcnow()):
+            res.add(hold['room_id'])
     return list(res)
 
 
 def filter_rooms(check_in: datetime = datetime(2400, 1, 1), check_out: datetime = datetime(2400, 1, 2), min_price: float = None, max_price: float = None,
-                 room_type: int = None, hotel_city: str = None):
+                 room_type: int = None, hotel_city: str = None, lazy: bool = False, near: tuple = None):
+    # near: (longitude, latitude, radius in km); rooms come back nearest hotel first with a distance_km field
 
     if check_in is None:
         check_in_fixed = datetime.now().date()
@@ -355,61 +594,76 @@ def filter_rooms(check_in: datetime = datetime(2400, 1, 1), check_out: datetime
     else:
         check_in_fixed = check_in
 
-    black_list = get_occupied_rooms(check_in_fixed, check_out)
-
-    query = [
-        {
-            '$match': {
-                'is_available': True,
-                '_id': {
-                    '$nin': black_list
-                },
-                'price_per_night': {
-                    '$gte': 0.0,
-                    '$lt': 100000000.0
-                },
-                'room_type': {'$exists': 1}
-            }
-        }, {
-            '$lookup': {
-                'from': 'Hotels',
-                'localField': 'hotel_id',
-                'foreignField': '_id',
-                'as': 'hotel_info'
-            }
-        }, {
-            '$unwind': '$hotel_info'
-        }, {
-            '$project': {
-                '_id': 0,
-                'room_id': '$_id',
-                'room_type': 1,
-                'price_per_night': 1,
-                'room_imgUrl': '$imgUrl',
-                'hotel_name': '$hotel_info.name',
-                'hotel_street': '$hotel_info.street',
-                'hotel_city': '$hotel_info.city'
-            }
-        }, {
-            '$match': {
-                'hotel_city': {
-                    '$exists': 1
-                }
-            }
-        }
-    ]
-
-    if min_price is not None:
-        query[0]['$match']['price_per_night']['$gte'] = min_price
-    if max_price is not None:
-        query[0]['$match']['price_per_night']['$lt'] = max_price
-    if room_type is not None:
-        query[0]['$match']['room_type'] = room_type
-    if hotel_city is not None:
-        query[4]['$match']['hotel_city'] = hotel_city
-
-    result = mongo.rooms.aggregate(query)
-    return list(result)
+    if near is None:
+        black_list = get_occupied_rooms(check_in_fixed, check_out)
+        return storage.find_available_rooms(black_list, min_price, max_price, room_type, hotel_city, lazy)
+
+    # the geo filter runs first, so only rooms of nearby hotels go through the occupancy check
+    longitude, latitude, radius_km = near
+    distances = {hotel['_id']: hotel['distance'] for hotel in
+                 storage.find_hotels_near(longitude, latitude, radius_km * 1000)}
+    if not distances:
+        return []
+    hotel_ids = list(distances)
+    black_list = get_occupied_rooms(check_in_fixed, check_out, hotel_ids)
+    rooms = storage.find_available_rooms(black_list, min_price, max_price, room_type, hotel_city,
+                                         hotel_ids=hotel_ids)
+    for room in rooms:
+        room['distance_km'] = round(distances[room['hotel_id']] / 1000, 2)
+    return sorted(rooms, key=lambda room: room['distance_km'])
+
+
+def month_range(year: int, month: int):
+    first_day = datetime(year, month, 1)
+    next_month = datetime(year + month // 12, month % 12 + 1, 1)
+    return first_day, next_month
+
+
+def occupied_days(bookings: list, first_day: datetime, days: int):
+    # sweep line: every booking adds +1 on its first night and -1 on its check out day,
+    # the running sum over the month tells whether a night is taken
+    delta = [0] * (days + 1)
+    for booking in sorted(bookings, key=lambda b: b['date_from']):
+        start = max((booking['date_from'] - first_day).days, 0)
+        end = min((booking['date_to'] - first_day).days, days)
+        if start < end:
+            delta[start] += 1
+            delta[end] -= 1
+
+    taken = []
+    running = 0
+    for day in range(days):
+        running += delta[day]
+        taken.append(running > 0)
+    return taken
+
+
+def get_month_availability(year: int, month: int, room_id: str = None, hotel_id: str = None):
+    try:
+        if room_id is not None:
+            room_filter = {"room_id": ObjectId(room_id)}
+        else:
+            room_filter = {"hotel_id": ObjectId(hotel_id)}
+        first_day, next_month = month_range(year, month)
+    except Exception as e:
+        print("[SERVER]", e)
+        return None
+
+    days = (next_month - first_day).days
+    rooms = storage.find_room_bookings(room_filter, first_day, next_month)
+    availability = {}
+    for room in rooms:
+        if not room.get('is_available', True):
+            availability[str(room['_id'])] = [False] * days
+        else:
+            availability[str(room['_id'])] = [not taken for taken in occupied_days(room['bookings'], first_day, days)]
+
+    return {
+        "month": first_day.strftime("%Y-%m"),
+        "days": [(first_day + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(days)],
+        "rooms": availability,
+        "free_rooms": [sum(free[day] for free in availability.values()) for day in range(days)]
+    }
 
 
 def get_all_user_bookings(user_id: str):
@@ -419,83 +673,7 @@ def get_all_user_bookings(user_id: str):
         print("[SERVER]", e)
         return False
 
-    query = [
-        {
-            '$match': {
-                '_id': _id
-            }
-        },
-        {
-            '$unwind': '$bookings'
-        },
-        {
-            '$lookup': {
-                'from': 'Rooms',
-                'localField': 'bookings.room_id',
-                'foreignField': '_id',
-                'as': 'room_info'
-            }
-        },
-        {
-            '$unwind': '$room_info'
-        },
-        {
-            '$project': {
-                '_id': 0,
-                'name': 0,
-                'surname': 0,
-                'email': 0,
-                'password': 0,
-                'room_info.is_available': 0,
-                'room_info.bookings': 0
-            }
-        },
-        {
-            '$lookup': {
-                'from': 'Hotels',
-                'localField': 'room_info.hotel_id',
-                'foreignField': '_id',
-                'as': 'hotel_info'
-            }
-        },
-        {
-            '$unwind': '$hotel_info'
-        },
-        {
-            '$project': {
-                'room_id': '$bookings.room_id',
-                'booking_id': '$bookings.booking_id',
-                'date_from': '$bookings.date_from',
-                'date_to': '$bookings.date_to',
-                'hotel_id': '$room_info.hotel_id',
-                'room_type': '$room_info.room_type',
-                'room_number': '$room_info.room_number',
-                'price_per_night': '$room_info.price_per_night',
-                'room_imgUrl': '$room_info.imgUrl',
-                'hotel_name': '$hotel_info.name',
-                'hotel_address': '$hotel_info.street',
-                'hotel_city': '$hotel_info.city',
-                'hotel_zip_code': '$hotel_info.zip_code',
-                'hotel_imgUrl': '$hotel_info.imgUrl'
-            }
-        },
-        {
-            '$addFields': {
-                'can_be_edited': {
-                    '$cond': {
-                        'if': {
-                            '$gt': [
-                                '$date_from', datetime.utcnow()
-                            ]
-                        },
-                        'then': True,
-                        'else': False
-                    }
-                }
-            }
-        }
-    ]
-    res = list(mongo.customers.aggregate(query))
+    res = storage.find_user_bookings(_id, datetime.utcnow())
     for booking in res:
         booking['date_from'] = booking['date_from'].date()
         booking['date_to'] = booking['date_to'].date()
@@ -512,56 +690,52 @@ def remove_booking(booking_id: str, customer_id: str, room_id: str):
         print("[SERVER]", e)
         return False
 
-    removed_from_rooms = mongo.rooms.update_one(
-        {
-            '_id': room_id,
-        },
-        {
-            '$pull': {
-                'bookings': {'booking_id': booking_id}
-            }
-        },
-        False,
-        True
-    )
-    if removed_from_rooms.modified_count <= 0:
+    removed_from_rooms = storage.pull_room_booking(room_id, booking_id)
+    if removed_from_rooms <= 0:
         print("[SERVER] Error during room update")
         return False
 
-    removed_from_customers = mongo.customers.update_one(
-        {
-            '_id': customer_id
-        },
-        {
-            '$pull': {
-                'bookings': {'booking_id': booking_id}
-            }
-        },
-        False,
-        True
-    )
-    if removed_from_customers.modified_count <= 0:
+    removed_from_customers = storage.pull_customer_booking(customer_id, booking_id)
+    if removed_from_customers <= 0:
         print("[SERVER] Error during customer update")
         return False
+
+    promote_waitlist(room_id)
     return True
 
 
+def get_booking_logs(date_from: datetime, date_to: datetime, room_id: str = None):
+    try:
+        room_id = ObjectId(room_id) if room_id is not None else None
+    except Exception as e:
+        print("[SERVER]", e)
+        return False
+    return storage.find_booking_logs(date_from, date_to, room_id)
+
+
 def get_all_cities():
-    query = [
-        {
-            '$group': {
-                '_id': '$city'
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'city': '$_id'
-            }
-        }
-    ]
-    cities = mongo.hotels.aggregate(query)
-    return list(cities)
+    if cities_cache["cities"] is None or cities_cache["expires"] < time.monotonic():
+        cities_cache["cities"] = storage.find_cities()
+        cities_cache["expires"] = time.monotonic() + CITIES_CACHE_TTL
+    return list(cities_cache["cities"])
+
+
+def invalidate_cities():
+    cities_cache["cities"] = None
+
+
+def search_hotels(query: str, limit: int = 10):
+    return hotel_search.search(query, limit)
 
 
 def get_user_email(email: str):
-    return mongo.customers.find_one({"email": email})
+    return storage.find_customer_by_email(email)
+
+
+def get_customer(customer_id: str):
+    try:
+        _id = ObjectId(customer_id)
+    except Exception as e:
+        print("[SERVER]", e)
+        return None
+    return storage.find_customer(_id)
@@ -0,0 +1,128 @@
+import json
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+BATCH_SIZE = 500
+DEFAULT_CONFIG = {
+    # days from today whose occupancy drives the price
+    "horizon_days": 30,
+    # [occupancy, multiplier of the base price] points; linear in between, flat outside
+    "curve": [[0.0, 0.85], [0.4, 1.0], [0.7, 1.15], [0.9, 1.35], [1.0, 1.5]],
+    # room type -> its own curve, e.g. {"4": [[0.0, 0.9], [1.0, 1.8]]}
+    "room_type_curves": {},
+    # the price moves towards its target by at most this fraction of the current price per run
+    "max_step": 0.15,
+    # smaller changes are not written
+    "min_change": 1.0,
+}
+
+
+def load_config(path: str = None):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, encoding='utf-8') as config_file:
+            config.update(json.load(config_file))
+    for curve in [config['curve'], *config['room_type_curves'].values()]:
+        occupancies = [point[0] for point in curve]
+        if not curve or occupancies != sorted(occupancies) or any(point[1] <= 0 for point in curve):
+            raise ValueError(f"Invalid demand curve: {curve}")
+    return config
+
+
+def curve_value(curve: list, occupancy: float):
+    i = bisect_right([point[0] for point in curve], occupancy)
+    if i == 0:
+        return curve[0][1]
+    if i == len(curve):
+        return curve[-1][1]
+    (x0, y0), (x1, y1) = curve[i - 1], curve[i]
+    return y0 + (y1 - y0) * (occupancy - x0) / (x1 - x0)
+
+
+def daily_occupancy(rooms: list, start: datetime, days: int):
+    # (hotel_id, room_type) -> share of its bookable rooms taken on each day of the horizon,
+    # counted with one difference array per group instead of walking every night of every booking
+    rooms_in_group = {}
+    taken = {}
+    for room in rooms:
+        if not room['is_available']:
+            continue
+        group = (room['hotel_id'], room['room_type'])
+        rooms_in_group[group] = rooms_in_group.get(group, 0) + 1
+        changes = taken.setdefault(group, [0] * (days + 1))
+        for booking in room['bookings']:
+            first = max(0, (booking['date_from'] - start).days)
+            last = min(days, (booking['date_to'] - start).days)
+            if first < last:
+                changes[first] += 1
+                changes[last] -= 1
+
+    occupancy = {}
+    for group, changes in taken.items():
+        booked, shares = 0, []
+        for day in range(days):
+            booked += changes[day]
+            shares.append(min(1.0, booked / rooms_in_group[group]))
+        occupancy[group] = shares
+    return occupancy
+
+
+def base_price(room: dict):
+    # a price that is not the one written by the last run was set by hand and becomes the new base;
+    # prices are always derived from the base, so running again never compounds a multiplier
+    if room.get('base_price') is None or room['price_per_night'] != room.get('dynamic_price'):
+        return room['price_per_night']
+    return room['base_price']
+
+
+def plan_prices(rooms: list, config: dict, start: datetime):
+    occupancy = daily_occupancy(rooms, start, config['horizon_days'])
+    multipliers = {}
+    changes = []
+    for room in rooms:
+        group = (room['hotel_id'], room['room_type'])
+        if group not in occupancy:
+            continue
+        if group not in multipliers:
+            curve = config['room_type_curves'].get(str(room['room_type']), config['curve'])
+            shares = occupancy[group]
+            # the mean of the curve over the days, so a few sold-out nights weigh in even when the average is low
+            multipliers[group] = (sum(shares) / len(shares),
+                                  sum(curve_value(curve, share) for share in shares) / len(shares))
+        mean_occupancy, multiplier = multipliers[group]
+
+        base = base_price(room)
+        current = room['price_per_night']
+        step = current * config['max_step']
+        new_price = round(min(current + step, max(current - step, base * multiplier)), 2)
+        if abs(new_price - current) < config['min_change']:
+            continue
+        changes.append({"room_id": room['_id'], "hotel_id": room['hotel_id'], "room_type": room['room_type'],
+                        "occupancy": round(mean_occupancy, 3), "multiplier": round(multiplier, 3),
+                        "base_price": base, "old_price": current, "new_price": new_price})
+    return changes
+
+
+def apply_prices(storage, changes: list, batch_size: int = BATCH_SIZE, progress=None):
+    modified = 0
+    for start in range(0, len(changes), batch_size):
+        batch = changes[start:start + batch_size]
+        modified += storage.reprice_rooms([(change['room_id'], change['old_price'], change['new_price'],
+                                            change['base_price']) for change in batch])
+        if progress is not None:
+            progress(start + len(batch), len(changes))
+    return modified
+
+
+def reprice(storage, config: dict, dry_run: bool = False, today: datetime = None, batch_size: int = BATCH_SIZE,
+            progress=None):
+    # returns (changes, rooms read, rooms written, seconds spent reading, seconds spent writing)
+    today = today or datetime.now()
+    first_day = datetime(today.year, today.month, today.day)
+    start = time.perf_counter()
+    rooms = storage.find_pricing_rooms(first_day, first_day + timedelta(days=config['horizon_days']))
+    changes = plan_prices(rooms, config, first_day)
+    planned = time.perf_counter()
+    written = 0 if dry_run else apply_prices(storage, changes, batch_size, progress)
+    return changes, len(rooms), written, planned - start, time.perf_counter() - planned
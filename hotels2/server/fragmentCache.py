@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+FRAGMENT_CACHE_SIZE = 20000
+
+
+def content_digest(document):
+    # lazily decoded rooms (RawBSONDocument) hash their BSON bytes; decoded documents hash their repr
+    raw = getattr(document, 'raw', None)
+    data = raw if raw is not None else repr(sorted(document.items(), key=lambda item: item[0])).encode()
+    return blake2b(data, digest_size=16).digest()
+
+
+class FragmentCache:
+    """LRU cache of rendered HTML fragments keyed by (kind, document id, digest of the document).
+
+    The key is taken from the document the view has just read, so a change made by any process
+    (another worker, admin_cli, reprice) renders a new fragment on the next request; fragments of
+    older contents are never looked up again and fall out of the LRU on their own.
+    """
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, kind: str, document, render, doc_id=None):
+        # document: everything the fragment shows, e.g. a room card with its hotel's name and city
+        key = (kind, str(doc_id if doc_id is not None else document['_id']), content_digest(document))
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = render()
+        with self.lock:
+            self.entries[key] = html
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return html
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,180 @@
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from threading import Lock, RLock
+
+SEARCH_FIELDS = ('name', 'street', 'city')
+# letters that do not decompose into a base letter and a combining mark
+FOLD_TABLE = str.maketrans({'ł': 'l', 'Ł': 'l', 'ø': 'o', 'Ø': 'o', 'đ': 'd', 'Đ': 'd', 'ß': 'ss'})
+TOKEN_REGEX = re.compile(r"\w+")
+# prefixes matching more terms than this are treated as unselective without summing their postings
+ESTIMATE_TERMS = 64
+# hotels written by other workers or admin tools show up after at most this many seconds
+# (sooner with a change stream consumer running)
+INDEX_TTL = 60
+
+
+def fold(text: str):
+    # "Gołębiewski" -> "golebiewski", "Rzeszów" -> "rzeszow"
+    text = unicodedata.normalize('NFKD', text.translate(FOLD_TABLE))
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text: str):
+    return TOKEN_REGEX.findall(fold(text or ''))
+
+
+class HotelSearchIndex:
+    """In-process inverted index over hotel name, street and city.
+
+    Terms are kept diacritic-folded in a sorted list, so every query token is matched as a prefix
+    with two bisects ("gołę", "rzesz", "krak ul"). add()/remove() keep the index in step with hotel
+    writes of this process; the first search builds it from all hotels in the database and searches
+    after `ttl` seconds rebuild it, so writes of other processes are picked up too.
+    """
+
+    def __init__(self, loader=None, ttl: float = INDEX_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = RLock()
+        self.rebuild_lock = Lock()
+        self.built = False
+        self.expires = 0.0
+        self.postings = {}
+        self.name_postings = {}
+        self.terms = []
+        self.documents = {}
+        # add()/remove() calls made while a rebuild loads hotels; replayed onto the new index before the swap
+        self.pending = None
+
+    def ensure_built(self):
+        if self.loader is None or (self.built and time.monotonic() < self.expires):
+            return
+        # the first build blocks every search; a stale index keeps serving while one thread rebuilds it
+        if not self.rebuild_lock.acquire(blocking=not self.built):
+            return
+        try:
+            if not self.built or time.monotonic() >= self.expires:
+                self.rebuild()
+        finally:
+            self.rebuild_lock.release()
+
+    def rebuild(self):
+        # the loader's snapshot may have been read before a write this process applies meanwhile,
+        # so writes made during the load are recorded and applied again on top of it
+        with self.lock:
+            self.pending = []
+        try:
+            fresh = HotelSearchIndex()
+            for hotel in self.loader():
+                fresh.add(hotel)
+            with self.lock:
+                for operation, argument in self.pending:
+                    getattr(fresh, operation)(argument)
+                self.postings, self.name_postings = fresh.postings, fresh.name_postings
+                self.terms, self.documents = fresh.terms, fresh.documents
+                self.built = True
+                self.expires = time.monotonic() + self.ttl
+        finally:
+            with self.lock:
+                self.pending = None
+
+    def add(self, hotel: dict):
+        hotel_id = str(hotel['_id'])
+        terms = tuple({term for field in SEARCH_FIELDS for term in tokenize(hotel.get(field))})
+        name_terms = tuple(set(tokenize(hotel.get('name'))))
+        summary = {'_id': hotel_id, 'name': hotel.get('name'), 'street': hotel.get('street'),
+                   'city': hotel.get('city')}
+        with self.lock:
+            self.remove(hotel_id)
+            if self.pending is not None:
+                self.pending.append(('add', hotel))
+            self.documents[hotel_id] = (summary, terms, name_terms)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = set()
+                    insort(self.terms, term)
+                posting.add(hotel_id)
+            for term in name_terms:
+                self.name_postings.setdefault(term, set()).add(hotel_id)
+
+    def remove(self, hotel_id):
+        hotel_id = str(hotel_id)
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(('remove', hotel_id))
+            document = self.documents.pop(hotel_id, None)
+            if document is None:
+                return
+            _, terms, name_terms = document
+            for term in name_terms:
+                self.name_postings[term].discard(hotel_id)
+                if not self.name_postings[term]:
+                    del self.name_postings[term]
+            for term in terms:
+                posting = self.postings[term]
+                posting.discard(hotel_id)
+                if not posting:
+                    del self.postings[term]
+                    del self.terms[bisect_left(self.terms, term)]
+
+    def prefix_terms(self, prefix: str):
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + '\uffff', start)
+        return self.terms[start:end]
+
+    def estimate(self, terms: list):
+        if len(terms) > ESTIMATE_TERMS:
+            return len(self.documents)
+        return sum(len(self.postings[term]) for term in terms)
+
+    def search(self, query: str, limit: int = 10):
+        # results come in tiers: whole-word hits in the name, whole-word hits anywhere,
+        # then prefix hits in the name and anywhere; the scan stops after `limit` hotels
+        self.ensure_built()
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self.lock:
+            ranges = [self.prefix_terms(token) for token in tokens]
+            if not all(ranges):
+                return []
+            # the most selective token drives the scan, the others are checked on each hotel's terms
+            anchor = min(range(len(tokens)), key=lambda i: self.estimate(ranges[i]))
+            token = tokens[anchor]
+            others = tokens[:anchor] + tokens[anchor + 1:]
+            exact = [token] if token in self.postings else []
+            prefixed = [term for term in ranges[anchor] if term != token]
+
+            results = []
+            seen = set()
+            for terms, postings in ((exact, self.name_postings), (exact, self.postings),
+                                    (prefixed, self.name_postings), (prefixed, self.postings)):
+                for term in terms:
+                    for hotel_id in postings.get(term, ()):
+                        if hotel_id in seen:
+                            continue
+                        seen.add(hotel_id)
+                        summary, hotel_terms, _ = self.documents[hotel_id]
+                        if all(any(hotel_term.startswith(other) for hotel_term in hotel_terms) for other in others):
+                            results.append(summary)
+                            if len(results) >= limit:
+                                return results
+            return results
+
+    def apply_change(self, change: dict):
+        # change stream events of the Hotels collection
+        if change['operationType'] == 'invalidate_all':
+            with self.lock:
+                self.postings, self.name_postings, self.terms, self.documents = {}, {}, [], {}
+                self.built = False
+        elif change['operationType'] == 'delete':
+            self.remove(change['documentKey']['_id'])
+        elif change.get('fullDocument') is not None:
+            self.add(change['fullDocument'])
+
+    def __len__(self):
+        return len(self.documents)
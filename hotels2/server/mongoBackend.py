@@ -0,0 +1,636 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne, UpdateOne, UpdateMany
+from pymongo.errors import DuplicateKeyError
+from hotels2.server.mongoConnection import MongoConnection
+from hotels2.server.storageBackend import StorageBackend
+from hotels2.models.booking_log import BookingLog
+
+
+class MongoBackend(StorageBackend):
+    name = "mongo"
+
+    def __init__(self, connection: MongoConnection = None):
+        self.mongo = connection if connection is not None else MongoConnection()
+
+    def room_query(self, room_filter: dict):
+        query = {}
+        if room_filter.get('hotel_id') is not None:
+            query['hotel_id'] = room_filter['hotel_id']
+        elif room_filter.get('city') is not None:
+            hotel_ids = [hotel['_id'] for hotel in self.mongo.hotels.find({"city": room_filter['city']}, {"_id": 1})]
+            query['hotel_id'] = {'$in': hotel_ids}
+        if room_filter.get('room_type') is not None:
+            query['room_type'] = room_filter['room_type']
+        if room_filter.get('room_number') is not None:
+            query['room_number'] = room_filter['room_number']
+        if room_filter.get('room_numbers') is not None:
+            query['room_number'] = {'$in': room_filter['room_numbers']}
+        return query
+
+    # ### Hotels ###
+    def insert_hotel(self, hotel):
+        return self.mongo.hotels.insert_one(hotel.to_dict()).inserted_id
+
+    def delete_hotel(self, hotel_id):
+        return self.mongo.hotels.delete_one({"_id": hotel_id}).deleted_count
+
+    def find_hotels(self):
+        return list(self.mongo.catalogue_hotels.find())
+
+    def find_cities(self):
+        query = [
+            {
+                '$group': {
+                    '_id': '$city'
+                }
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'city': '$_id'
+                }
+            }
+        ]
+        return list(self.mongo.catalogue_hotels.aggregate(query))
+
+    def find_hotels_near(self, longitude, latitude, max_distance):
+        # $geoNear has to be the first stage and uses the 2dsphere index on Hotels.location
+        query = [
+            {
+                '$geoNear': {
+                    'near': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                    'distanceField': 'distance',
+                    'maxDistance': max_distance,
+                    'spherical': True
+                }
+            }, {
+                '$project': {
+                    '_id': 1,
+                    'distance': 1
+                }
+            }
+        ]
+        return list(self.mongo.catalogue_hotels.aggregate(query))
+
+    # ### Rooms ###
+    def insert_room(self, room):
+        return self.mongo.rooms.insert_one(room.to_dict()).inserted_id
+
+    def count_rooms(self, room_filter):
+        return self.mongo.rooms.count_documents(self.room_query(room_filter))
+
+    def delete_room(self, room_id):
+        return self.mongo.rooms.delete_one({"_id": room_id}).deleted_count
+
+    def update_room(self, room_id, fields):
+        return self.mongo.rooms.update_one({"_id": room_id}, {"$set": fields}).matched_count
+
+    def update_rooms(self, room_filter, set_fields=None, multiply_fields=None):
+        update = {}
+        if set_fields:
+            update['$set'] = set_fields
+        if multiply_fields:
+            update['$mul'] = multiply_fields
+        return self.mongo.rooms.update_many(self.room_query(room_filter), update).modified_count
+
+    def remove_rooms_batch(self, room_filter, batch_size, archive_from):
+        rooms = list(self.mongo.rooms.find(self.room_query(room_filter), {"bookings": 1}).limit(batch_size))
+        if not rooms:
+            return None
+        room_ids = [room['_id'] for room in rooms]
+
+        # archive upcoming bookings still embedded in rooms; upsert by booking_id keeps a rerun idempotent
+        logs = []
+        customer_bookings = {}
+        for room in rooms:
+            for booking in room.get('bookings', []):
+                if booking['date_to'] >= archive_from:
+                    log = BookingLog(booking['booking_id'], booking['customer_id'], room['_id'],
+                                     booking['date_from'], booking['date_to'])
+                    logs.append(ReplaceOne({"booking_id": booking['booking_id']}, log.to_dict(), upsert=True))
+                customer_bookings.setdefault(booking['customer_id'], []).append(booking['booking_id'])
+        if logs:
+            self.mongo.logs.bulk_write(logs, ordered=False)
+
+        customer_updates = [
+            UpdateOne({"_id": customer_id}, {"$pull": {"bookings": {"booking_id": {"$in": booking_ids}}}})
+            for customer_id, booking_ids in customer_bookings.items()
+        ]
+        # also catches customer entries that were already missing from Rooms.bookings
+        customer_updates.append(UpdateMany({"bookings.room_id": {"$in": room_ids}},
+                                           {"$pull": {"bookings": {"room_id": {"$in": room_ids}}}}))
+        updated = self.mongo.customers.bulk_write(customer_updates, ordered=False)
+
+        removed = self.mongo.rooms.delete_many({"_id": {"$in": room_ids}})
+        return removed.deleted_count, len(logs), updated.modified_count
+
+    def set_room_prices(self, prices):
+        requests = [UpdateOne({"_id": room_id}, {"$set": {"price_per_night": float(price)}})
+                    for room_id, price in prices]
+        return self.mongo.rooms.bulk_write(requests, ordered=False).modified_count
+
+    def find_wrong_bookings(self, room_id, check_in, check_out, booking_id, hotel_ids=None):
+        query = [
+            {
+                '$match': {
+                    '_id': {'$exists': 1},
+                    'is_available': True
+                }
+            },
+            {
+                '$project': {
+                    'bookings': 1
+                }
+            },
+            {
+                '$unwind': '$bookings'
+            }
+        ]
+        if room_id is not None:
+            query[0]['$match']['_id'] = room_id
+        if hotel_ids is not None:
+            query[0]['$match']['hotel_id'] = {'$in': hotel_ids}
+
+        if booking_id is not None:
+            query.append({
+                "$match": {
+                    "bookings.booking_id": {'$nin': [ObjectId(booking_id)]}
+                }
+            })
+        query.append({
+            '$match': {
+                '$or': [
+                    {
+                        '$and': [
+                            {
+                                'bookings.date_from': {
+                                    '$gte': check_in
+                                }
+                            }, {
+                                'bookings.date_from': {
+                                    '$lt': check_out
+                                }
+                            }
+                        ]
+                    }, {
+                        '$and': [
+                            {
+                                'bookings.date_from': {
+                                    '$gte': check_in
+                                }
+                            }, {
+                                'bookings.date_to': {
+                                    '$lte': check_out
+                                }
+                            }
+                        ]
+                    }, {
+                        '$and': [
+                            {
+                                'bookings.date_from': {
+                                    '$lte': check_in
+                                }
+                            }, {
+                                'bookings.date_to': {
+                                    '$gte': check_out
+                                }
+                            }
+                        ]
+                    }, {
+                        '$and': [
+                            {
+                                'bookings.date_to': {
+                                    '$gt': check_in
+                                }
+                            }, {
+                                'bookings.date_to': {
+                                    '$lte': check_out
+                                }
+                            }
+                        ]
+                    }
+                ]
+            }
+        })
+
+        # a room-specific check guards a booking write and must see the latest majority-committed
+        # bookings; the catalogue-wide variant only feeds search results
+        rooms = self.mongo.booking_rooms if room_id is not None else self.mongo.catalogue_rooms
+        return list(rooms.aggregate(query))
+
+    def find_available_rooms(self, black_list, min_price, max_price, room_type, hotel_city, lazy=False,
+                             hotel_ids=None):
+        query = [
+            {
+                '$match': {
+                    'is_available': True,
+                    '_id': {
+                        '$nin': black_list
+                    },
+                    'price_per_night': {
+                        '$gte': 0.0,
+                        '$lt': 100000000.0
+                    },
+                    'room_type': {'$exists': 1}
+                }
+            }, {
+                '$lookup': {
+                    'from': 'Hotels',
+                    'localField': 'hotel_id',
+                    'foreignField': '_id',
+                    'as': 'hotel_info'
+                }
+            }, {
+                '$unwind': '$hotel_info'
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'room_id': '$_id',
+                    'hotel_id': 1,
+                    'room_type': 1,
+                    'price_per_night': 1,
+                    'room_imgUrl': '$imgUrl',
+                    'hotel_name': '$hotel_info.name',
+                    'hotel_street': '$hotel_info.street',
+                    'hotel_city': '$hotel_info.city'
+                }
+            }, {
+                '$match': {
+                    'hotel_city': {
+                        '$exists': 1
+                    }
+                }
+            }
+        ]
+
+        if min_price is not None:
+            query[0]['$match']['price_per_night']['$gte'] = min_price
+        if max_price is not None:
+            query[0]['$match']['price_per_night']['$lt'] = max_price
+        if room_type is not None:
+            query[0]['$match']['room_type'] = room_type
+        if hotel_city is not None:
+            query[4]['$match']['hotel_city'] = hotel_city
+        if hotel_ids is not None:
+            query[0]['$match']['hotel_id'] = {'$in': hotel_ids}
+
+        rooms = self.mongo.raw_catalogue_rooms if lazy else self.mongo.catalogue_rooms
+        return list(rooms.aggregate(query))
+
+    def find_room_bookings(self, room_filter, date_from, date_to):
+        match = {"_id": room_filter['room_id']} if room_filter.get('room_id') is not None \
+            else {"hotel_id": room_filter['hotel_id']}
+        query = [
+            {
+                '$match': match
+            }, {
+                '$project': {
+                    'is_available': 1,
+                    'bookings': {
+                        '$filter': {
+                            'input': {'$ifNull': ['$bookings', []]},
+                            'as': 'booking',
+                            'cond': {
+                                '$and': [
+                                    {'$lt': ['$$booking.date_from', date_to]},
+                                    {'$gt': ['$$booking.date_to', date_from]}
+                                ]
+                            }
+                        }
+                    }
+                }
+            }
+        ]
+        return list(self.mongo.catalogue_rooms.aggregate(query))
+
+    def find_pricing_rooms(self, date_from, date_to):
+        query = [
+            {
+                '$project': {
+                    'hotel_id': 1,
+                    'room_type': 1,
+                    'is_available': 1,
+                    'price_per_night': 1,
+                    'base_price': {'$ifNull': ['$base_price', None]},
+                    'dynamic_price': {'$ifNull': ['$dynamic_price', None]},
+                    'bookings': {
+                        '$map': {
+                            'input': {
+                                '$filter': {
+                                    'input': {'$ifNull': ['$bookings', []]},
+                                    'as': 'booking',
+                                    'cond': {
+                                        '$and': [
+                                            {'$lt': ['$$booking.date_from', date_to]},
+                                            {'$gt': ['$$booking.date_to', date_from]}
+                                        ]
+                                    }
+                                }
+                            },
+                            'as': 'booking',
+                            'in': {'date_from': '$$booking.date_from', 'date_to': '$$booking.date_to'}
+                        }
+                    }
+                }
+            }
+        ]
+        return list(self.mongo.catalogue_rooms.aggregate(query))
+
+    def reprice_rooms(self, changes):
+        requests = [UpdateOne({"_id": room_id, "price_per_night": float(old_price)},
+                              {"$set": {"price_per_night": float(new_price), "base_price": float(base_price),
+                                        "dynamic_price": float(new_price)}})
+                    for room_id, old_price, new_price, base_price in changes]
+        return self.mongo.rooms.bulk_write(requests, ordered=False).modified_count
+
+    # ### Customers ###
+    def insert_customer(self, customer):
+        return self.mongo.customers.insert_one(customer.to_dict()).inserted_id
+
+    def count_customers_with_email(self, email):
+        return self.mongo.customers.count_documents({"email": email})
+
+    def delete_customer(self, customer_id):
+        return self.mongo.customers.delete_one({"_id": customer_id}).deleted_count
+
+    def find_customer(self, customer_id):
+        return self.mongo.customers.find_one({"_id": customer_id})
+
+    def find_customer_by_email(self, email):
+        return self.mongo.customers.find_one({"email": email})
+
+    # ### Bookings ###
+    # $addToSet: repeating a push with the same booking (a retried request) leaves one copy
+    def push_room_booking(self, room_id, booking):
+        return self.mongo.booking_rooms.update_one({"_id": room_id}, {"$addToSet": {"bookings": booking}}).matched_count
+
+    def push_customer_booking(self, customer_id, booking):
+        return self.mongo.booking_customers.update_one({"_id": customer_id},
+                                                       {"$addToSet": {"bookings": booking}}).matched_count
+
+    def set_room_booking_dates(self, room_id, booking_id, check_in, check_out):
+        return self.mongo.booking_rooms.update_one(
+            {
+                "_id": room_id,
+                "bookings.booking_id": booking_id
+            },
+            {
+                "$set": {
+                    "bookings.$.date_from": check_in,
+                    "bookings.$.date_to": check_out
+                }
+            }
+        ).matched_count
+
+    def set_customer_booking_dates(self, customer_id, booking_id, check_in, check_out):
+        return self.mongo.booking_customers.update_one(
+            {
+                "_id": customer_id,
+                "bookings.booking_id": booking_id
+            },
+            {
+                "$set": {
+                    "bookings.$.date_from": check_in,
+                    "bookings.$.date_to": check_out
+                }
+            }
+        ).matched_count
+
+    def pull_room_booking(self, room_id, booking_id):
+        return self.mongo.booking_rooms.update_one(
+            {
+                '_id': room_id,
+            },
+            {
+                '$pull': {
+                    'bookings': {'booking_id': booking_id}
+                }
+            },
+            False,
+            True
+        ).modified_count
+
+    def pull_customer_booking(self, customer_id, booking_id):
+        return self.mongo.booking_customers.update_one(
+            {
+                '_id': customer_id
+            },
+            {
+                '$pull': {
+                    'bookings': {'booking_id': booking_id}
+                }
+            },
+            False,
+            True
+        ).modified_count
+
+    def find_user_bookings(self, customer_id, now):
+        query = [
+            {
+                '$match': {
+                    '_id': customer_id
+                }
+            },
+            {
+                '$unwind': '$bookings'
+            },
+            {
+                '$lookup': {
+                    'from': 'Rooms',
+                    'localField': 'bookings.room_id',
+                    'foreignField': '_id',
+                    'as': 'room_info'
+                }
+            },
+            {
+                '$unwind': '$room_info'
+            },
+            {
+                '$project': {
+                    '_id': 0,
+                    'name': 0,
+                    'surname': 0,
+                    'email': 0,
+                    'password': 0,
+                    'room_info.is_available': 0,
+                    'room_info.bookings': 0
+                }
+            },
+            {
+                '$lookup': {
+                    'from': 'Hotels',
+                    'localField': 'room_info.hotel_id',
+                    'foreignField': '_id',
+                    'as': 'hotel_info'
+                }
+            },
+            {
+                '$unwind': '$hotel_info'
+            },
+            {
+                '$project': {
+                    'room_id': '$bookings.room_id',
+                    'booking_id': '$bookings.booking_id',
+                    'date_from': '$bookings.date_from',
+                    'date_to': '$bookings.date_to',
+                    'hotel_id': '$room_info.hotel_id',
+                    'room_type': '$room_info.room_type',
+                    'room_number': '$room_info.room_number',
+                    'price_per_night': '$room_info.price_per_night',
+                    'room_imgUrl': '$room_info.imgUrl',
+                    'hotel_name': '$hotel_info.name',
+                    'hotel_address': '$hotel_info.street',
+                    'hotel_city': '$hotel_info.city',
+                    'hotel_zip_code': '$hotel_info.zip_code',
+                    'hotel_imgUrl': '$hotel_info.imgUrl'
+                }
+            },
+            {
+                '$addFields': {
+                    'can_be_edited': {
+                        '$cond': {
+                            'if': {
+                                '$gt': [
+                                    '$date_from', now
+                                ]
+                            },
+                            'then': True,
+                            'else': False
+                        }
+                    }
+                }
+            }
+        ]
+        return list(self.mongo.customers.aggregate(query))
+
+    # ### Holds and waitlist ###
+    def insert_hold(self, hold):
+        return self.mongo.booking_holds.insert_one(hold.to_dict()).inserted_id
+
+    def find_hold(self, hold_id):
+        return self.mongo.booking_holds.find_one({"_id": hold_id})
+
+    def delete_hold(self, hold_id):
+        return self.mongo.booking_holds.delete_one({"_id": hold_id}).deleted_count
+
+    def find_live_holds(self, room_id, check_in, check_out, now):
+        # the TTL monitor runs only once a minute, so expired holds are filtered out here as well
+        query = {"date_from": {"$lt": check_out}, "date_to": {"$gt": check_in}, "expires_at": {"$gt": now}}
+        if room_id is not None:
+            query['room_id'] = room_id
+        return list(self.mongo.booking_holds.find(query))
+
+    def lock_room(self, room_id, owner, now, until):
+        # a live lease does not match the filter, so the upsert tries to insert a second document with the
+        # same _id and fails; an expired lease matches and is taken over
+        try:
+            self.mongo.booking_locks.update_one({"_id": room_id, "expires_at": {"$lte": now}},
+                                                {"$set": {"owner": owner, "expires_at": until}}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def unlock_room(self, room_id, owner):
+        return self.mongo.booking_locks.delete_one({"_id": room_id, "owner": owner}).deleted_count
+
+    def insert_waitlist_entry(self, entry):
+        return self.mongo.waitlist.insert_one(entry.to_dict()).inserted_id
+
+    def delete_waitlist_entry(self, entry_id):
+        return self.mongo.waitlist.delete_one({"_id": entry_id}).deleted_count
+
+    def find_waitlist(self, room_id, now):
+        return list(self.mongo.waitlist.find({"room_id": room_id, "expires_at": {"$gt": now}}).sort("created_at", 1))
+
+    # ### Idempotency keys ###
+    def insert_idempotency_key(self, record):
+        try:
+            self.mongo.booking_keys.insert_one(record.to_dict())
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def find_idempotency_key(self, key):
+        return self.mongo.booking_keys.find_one({"key": key})
+
+    def lock_idempotency_key(self, key, stale_before, now):
+        return self.mongo.booking_keys.update_one({"key": key, "status": "pending", "locked_at": {"$lt": stale_before}},
+                                                  {"$set": {"locked_at": now}}).matched_count
+
+    def unlock_idempotency_key(self, key):
+        return self.mongo.booking_keys.update_one({"key": key, "status": "pending"},
+                                                  {"$set": {"locked_at": datetime(1970, 1, 1)}}).matched_count
+
+    def finish_idempotency_key(self, key, result):
+        return self.mongo.booking_keys.update_one({"key": key},
+                                                  {"$set": {"status": "done", "result": result}}).matched_count
+
+    def delete_idempotency_key(self, key):
+        return self.mongo.booking_keys.delete_one({"key": key}).deleted_count
+
+    # ### Integrity checks ###
+    def booking_stream(self, collection, owner: str, other: str, batch_size: int):
+        query = [
+            {"$unwind": "$bookings"},
+            {"$project": {"_id": 0, "booking_id": "$bookings.booking_id", owner: "$_id", other: f"$bookings.{other}",
+                          "date_from": "$bookings.date_from", "date_to": "$bookings.date_to"}},
+            {"$sort": {"booking_id": 1, owner: 1}}
+        ]
+        # the sort spills to disk on the server; the client holds one cursor batch at a time
+        return collection.aggregate(query, allowDiskUse=True, batchSize=batch_size)
+
+    def iter_room_bookings(self, batch_size):
+        return self.booking_stream(self.mongo.rooms, "room_id", "customer_id", batch_size)
+
+    def iter_customer_bookings(self, batch_size):
+        return self.booking_stream(self.mongo.customers, "customer_id", "room_id", batch_size)
+
+    def iter_bookings_by_room(self, batch_size):
+        rooms = self.mongo.rooms.find({"bookings.0": {"$exists": True}}, {"bookings": 1}).sort("_id", 1)
+        for room in rooms.batch_size(batch_size):
+            for booking in sorted(room['bookings'], key=lambda b: b['date_from']):
+                yield {"booking_id": booking['booking_id'], "room_id": room['_id'],
+                       "customer_id": booking.get('customer_id'), "date_from": booking['date_from'],
+                       "date_to": booking['date_to']}
+
+    def find_existing_ids(self, kind, ids):
+        collection = self.mongo.rooms if kind == "rooms" else self.mongo.customers
+        return {document['_id'] for document in collection.find({"_id": {"$in": list(ids)}}, {"_id": 1})}
+
+    def find_room_booking(self, room_id, booking_id):
+        room = self.mongo.booking_rooms.find_one({"_id": room_id, "bookings.booking_id": booking_id},
+                                                 {"bookings": {"$elemMatch": {"booking_id": booking_id}}})
+        return room['bookings'][0] if room else None
+
+    def find_customer_booking(self, customer_id, booking_id):
+        customer = self.mongo.booking_customers.find_one({"_id": customer_id, "bookings.booking_id": booking_id},
+                                                         {"bookings": {"$elemMatch": {"booking_id": booking_id}}})
+        return customer['bookings'][0] if customer else None
+
+    # ### Booking logs ###
+    def find_booking_logs(self, date_from, date_to, room_id=None):
+        query = {"date_from": {"$lt": date_to}, "date_to": {"$gt": date_from}}
+        if room_id is not None:
+            query["room_id"] = room_id
+        return list(self.mongo.report_logs.find(query, {"_id": 0}).sort("date_from", 1))
+
+    # ### Hotel removal jobs ###
+    def save_cascade_job(self, job):
+        self.mongo.cascade_jobs.replace_one({"_id": job['hotel_id']}, job, upsert=True)
+
+    def claim_cascade_job(self, job, stale_before):
+        # a job that is running with a fresh heartbeat does not match, so the upsert fails on the duplicate _id
+        try:
+            self.mongo.cascade_jobs.update_one(
+                {"_id": job['hotel_id'],
+                 "$or": [{"status": {"$ne": "running"}}, {"heartbeat": {"$not": {"$gt": stale_before}}}]},
+                {"$set": job}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def find_cascade_job(self, hotel_id):
+        return self.mongo.cascade_jobs.find_one({"_id": hotel_id}, {"_id": 0})
+
+    def find_unfinished_cascade_jobs(self):
+        return list(self.mongo.cascade_jobs.find({"status": {"$ne": "done"}}, {"_id": 0}).sort("started_at", 1))
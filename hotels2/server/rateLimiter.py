@@ -0,0 +1,126 @@
+import sqlite3
+import time
+from contextlib import closing
+from threading import Lock, Condition
+
+# a bucket left alone refills, and once it is full it can be forgotten: a new one starts full as well.
+# Every bucket stores the moment it is full again, computed from its own rate and burst
+MEMORY_BUCKETS_MAX = 100000
+SQLITE_PRUNE_INTERVAL = 60
+
+
+class MemoryBucketStore:
+    """Token buckets of a single process, keyed by e.g. ("search", "ip", "1.2.3.4")."""
+
+    def __init__(self, max_buckets: int = MEMORY_BUCKETS_MAX):
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.lock = Lock()
+
+    def take(self, key, rate: float, burst: float, cost: float = 1.0):
+        # returns (allowed, seconds until `cost` tokens are available)
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self.buckets) > self.max_buckets:
+                self.prune(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def prune(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.buckets = {key: value for key, value in self.buckets.items() if value[2] > now}
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SqliteBucketStore:
+    """Token buckets in a local SQLite file, shared by all workers on one host.
+
+    Full buckets are deleted by take() every SQLITE_PRUNE_INTERVAL seconds (per process).
+    """
+
+    def __init__(self, db_path: str = "rate_limits.sqlite3", prune_interval: float = SQLITE_PRUNE_INTERVAL):
+        self.db_path = db_path
+        self.prune_interval = prune_interval
+        self.next_prune = 0.0
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            if 'full_at' not in [row[1] for row in conn.execute("PRAGMA table_info(buckets)")]:
+                # files created before buckets were pruned; their rows are pruned at once
+                conn.execute("ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def take(self, key, rate: float, burst: float, cost: float = 1.0):
+        key = ":".join(key)
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE serializes read-modify-write of a bucket between workers
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                         (key, tokens, now, now + (burst - tokens) / rate))
+            if now >= self.next_prune:
+                self.next_prune = now + self.prune_interval
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def prune(self):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM buckets WHERE full_at < ?", (time.time(),))
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class ConcurrencyLimiter:
+    """Caps requests running against the database at once.
+
+    Each priority class may only fill its share of the slots, so anonymous searches are shed
+    first and the last slots stay free for booking writes. Booking writes also wait briefly
+    for a slot instead of being rejected immediately.
+    """
+
+    def __init__(self, limit: int, shares: dict, waits: dict = None):
+        self.limit = limit
+        self.shares = shares
+        self.waits = waits or {}
+        self.in_flight = 0
+        self.condition = Condition()
+
+    def capacity(self, priority: str):
+        return max(1, int(self.limit * self.shares.get(priority, 1.0)))
+
+    def acquire(self, priority: str):
+        deadline = time.monotonic() + self.waits.get(priority, 0.0)
+        with self.condition:
+            while self.in_flight >= self.capacity(priority):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# where the time of a request went; a stack counts towards the innermost frame that belongs to one of these
+CATEGORIES = ('mongo', 'bson', 'sqlite', 'jinja', 'python')
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+def frame_category(filename: str, name: str = ''):
+    path = filename.replace('\\', '/')
+    if '/pymongo/' in path or 'pymongo' in name:
+        return 'mongo'
+    if '/bson/' in path or 'bson' in name:
+        return 'bson'
+    if '/sqlite3/' in path or 'sqlite3' in name or path.endswith('/sqliteBackend.py'):
+        return 'sqlite'
+    if '/jinja2/' in path or path.endswith('.html'):
+        return 'jinja'
+    return None
+
+
+def stack_category(stack: tuple):
+    for code in reversed(stack):
+        category = frame_category(code.co_filename)
+        if category is not None:
+            return category
+    return 'python'
+
+
+def short_path(filename: str):
+    path = filename.replace('\\', '/')
+    if '/site-packages/' in path:
+        return path.split('/site-packages/', 1)[1]
+    if '/hotels2/' in path:
+        return 'hotels2/' + path.rsplit('/hotels2/', 1)[1]
+    return os.path.basename(path)
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread that called start() every `interval` seconds from a helper thread.
+
+    The profiled code runs at full speed and whole stacks are kept, so the result can be written as
+    collapsed stacks (flamegraph.pl, speedscope) and as a speedscope file; C functions (the sqlite3
+    module, the bson extension) show up as the Python frame that called them.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = None
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.sampler = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+        self.sampler.start()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                # stack of code objects, root first, weighted by the time since the previous sample
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += now - last
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+
+    def categories(self):
+        totals = dict.fromkeys(CATEGORIES, 0.0)
+        for stack, seconds in self.stacks.items():
+            totals[stack_category(stack)] += seconds
+        return totals
+
+    def write(self, base_path: str, title: str):
+        labels = {}
+        for stack in self.stacks:
+            for code in stack:
+                if code not in labels:
+                    labels[code] = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+
+        # collapsed stacks: "root;...;leaf microseconds" per line
+        with open(base_path + ".folded", "w", encoding="utf-8") as folded:
+            for stack, seconds in self.stacks.items():
+                folded.write(f"{';'.join(labels[code] for code in stack)} {round(seconds * 1e6)}\n")
+
+        frames = {code: i for i, code in enumerate(labels)}
+        profile = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": title,
+            "exporter": "hotels2",
+            "shared": {"frames": [{"name": code.co_name, "file": short_path(code.co_filename),
+                                   "line": code.co_firstlineno} for code in labels]},
+            "profiles": [{
+                "type": "sampled",
+                "name": title,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(self.stacks.values()) * 1000,
+                "samples": [[frames[code] for code in stack] for stack in self.stacks],
+                "weights": [seconds * 1000 for seconds in self.stacks.values()],
+            }],
+        }
+        with open(base_path + ".speedscope.json", "w", encoding="utf-8") as speedscope:
+            json.dump(profile, speedscope)
+        return [base_path + ".folded", base_path + ".speedscope.json"]
+
+
+class CallProfiler:
+    """cProfile for one request: exact call counts and own time of every function, written as a .prof file
+    for pstats or snakeviz. It slows the profiled code down and keeps callers only, not whole stacks."""
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        # raises ValueError when another profiler is already active in this interpreter (Python 3.12+)
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def categories(self):
+        import pstats
+        totals = dict.fromkeys(CATEGORIES, 0.0)
+        for (filename, _, name), (_, _, own_time, _, _) in pstats.Stats(self.profile).stats.items():
+            totals[frame_category(filename, name) or 'python'] += own_time
+        return totals
+
+    def write(self, base_path: str, title: str):
+        self.profile.dump_stats(base_path + ".prof")
+        return [base_path + ".prof"]
+
+
+def make_profiler(mode: str, interval: float = 0.001):
+    if mode == 'cprofile':
+        return CallProfiler()
+    return SamplingProfiler(interval)
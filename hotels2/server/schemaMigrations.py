@@ -0,0 +1,191 @@
+import importlib
+import os
+import pkgutil
+import socket
+import time
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne, WriteConcern
+from pymongo.errors import DuplicateKeyError
+
+MIGRATIONS_PACKAGE = "hotels2.migrations"
+MIGRATIONS_COLLECTION = "Schema_Migrations"
+BATCH_SIZE = 500
+# seconds of sleep per second of work after every batch; 1.0 keeps the backfill at half duty
+PAUSE_RATIO = 0.5
+# a runner that stopped sending heartbeats for this long is considered dead and can be taken over
+LEASE = timedelta(minutes=5)
+
+
+class Migration:
+    """One versioned file of hotels2/migrations, e.g. m0002_hotel_location_field.py.
+
+    The module may define:
+      schema(mongo)       - validators, indexes; runs once, before the backfill, and must be idempotent
+      collection          - name of the collection to backfill
+      backfill_filter     - documents that still need the change; updated documents must stop matching
+      projection          - fields backfill() needs (default: whole document)
+      backfill(document)  - update document ({"$set": ...}) for one document, or None to skip it
+    """
+
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+        self.description = (module.__doc__ or "").strip()
+
+    @property
+    def has_backfill(self):
+        return getattr(self.module, 'collection', None) is not None
+
+    def run_schema(self, mongo):
+        if hasattr(self.module, 'schema'):
+            self.module.schema(mongo)
+
+    def batch_query(self, checkpoint):
+        query = dict(getattr(self.module, 'backfill_filter', {}))
+        if checkpoint is not None:
+            query = {"$and": [query, {"_id": {"$gt": checkpoint}}]}
+        return query
+
+
+def load_migrations():
+    package = importlib.import_module(MIGRATIONS_PACKAGE)
+    migrations = {}
+    for module_info in pkgutil.iter_modules(package.__path__):
+        # m0001_baseline_schema -> version 1, name "baseline_schema"
+        prefix, _, name = module_info.name.partition('_')
+        if not prefix.startswith('m') or not prefix[1:].isdigit():
+            continue
+        version = int(prefix[1:])
+        if version in migrations:
+            raise ValueError(f"Two migrations with version {version}: {migrations[version].name}, {name}")
+        module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{module_info.name}")
+        migrations[version] = Migration(version, name, module)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def runner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def migration_states(mongo):
+    return {state['_id']: state for state in mongo.db[MIGRATIONS_COLLECTION].find()}
+
+
+def acquire(mongo, migration: Migration, owner: str):
+    # takes the migration unless another runner holds a fresh lease; returns its state or None
+    now = datetime.utcnow()
+    try:
+        return mongo.db[MIGRATIONS_COLLECTION].find_one_and_update(
+            {"_id": migration.version, "status": {"$ne": "done"},
+             "$or": [{"status": {"$ne": "running"}}, {"heartbeat": {"$lt": now - LEASE}}]},
+            {"$set": {"status": "running", "owner": owner, "heartbeat": now},
+             "$setOnInsert": {"name": migration.name, "schema_done": False, "checkpoint": None,
+                              "processed": 0, "batches": 0, "started_at": now}},
+            upsert=True, return_document=True)
+    except DuplicateKeyError:
+        return None
+
+
+def save_progress(mongo, migration: Migration, owner: str, fields: dict):
+    # also the heartbeat; 0 means another runner took the migration over and this one must stop
+    fields = dict(fields, heartbeat=datetime.utcnow())
+    return mongo.db[MIGRATIONS_COLLECTION].update_one({"_id": migration.version, "owner": owner},
+                                                      {"$set": fields}).matched_count
+
+
+def backfill(mongo, migration: Migration, state: dict, owner: str, batch_size: int = BATCH_SIZE,
+             max_rate: float = None, pause_ratio: float = PAUSE_RATIO):
+    # resumes after state['checkpoint']; every batch is written with majority write concern
+    # (secondaries keep up) and followed by a pause, so the backfill never saturates the cluster
+    module = migration.module
+    collection = mongo.db[module.collection].with_options(write_concern=WriteConcern("majority"))
+    checkpoint, processed, batches = state['checkpoint'], state['processed'], state['batches']
+    while True:
+        start = time.perf_counter()
+        documents = list(collection.find(migration.batch_query(checkpoint), getattr(module, 'projection', None))
+                         .sort("_id", ASCENDING).limit(batch_size))
+        if not documents:
+            return True
+
+        updates = []
+        for document in documents:
+            update = module.backfill(document)
+            if update:
+                # re-checks the filter, so documents changed since they were read are not overwritten
+                updates.append(UpdateOne({"$and": [{"_id": document['_id']},
+                                                   getattr(module, 'backfill_filter', {})]}, update))
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+
+        checkpoint = documents[-1]['_id']
+        processed += len(documents)
+        batches += 1
+        if not save_progress(mongo, migration, owner,
+                             {"checkpoint": checkpoint, "processed": processed, "batches": batches}):
+            print("[SERVER] Migration", migration.version, "was taken over by another runner")
+            return False
+
+        elapsed = time.perf_counter() - start
+        pause = elapsed * pause_ratio
+        if max_rate:
+            pause = max(pause, len(documents) / max_rate - elapsed)
+        print(f"[SERVER] Migration {migration.version}: {processed} documents, checkpoint {checkpoint}, "
+              f"batch {elapsed * 1000:.0f} ms, pause {pause * 1000:.0f} ms")
+        time.sleep(pause)
+
+
+def migrate(mongo, target: int = None, batch_size: int = BATCH_SIZE, max_rate: float = None,
+            pause_ratio: float = PAUSE_RATIO):
+    # applies pending migrations in version order, stopping at the first one that does not finish
+    owner = runner_id()
+    states = migration_states(mongo)
+    for migration in load_migrations():
+        if target is not None and migration.version > target:
+            break
+        if states.get(migration.version, {}).get('status') == 'done':
+            continue
+
+        state = acquire(mongo, migration, owner)
+        if state is None:
+            holder = mongo.db[MIGRATIONS_COLLECTION].find_one({"_id": migration.version}) or {}
+            print("[SERVER] Migration", migration.version, "is being run by", holder.get('owner'))
+            return False
+        print("[SERVER] Migration", migration.version, migration.name,
+              "resumed at" if state['checkpoint'] is not None else "started", state['checkpoint'] or "")
+        try:
+            if not state['schema_done']:
+                migration.run_schema(mongo)
+                save_progress(mongo, migration, owner, {"schema_done": True})
+            if migration.has_backfill and not backfill(mongo, migration, state, owner, batch_size,
+                                                       max_rate, pause_ratio):
+                return False
+        except KeyboardInterrupt:
+            # the checkpoint of the last batch is saved; the next run continues from there
+            save_progress(mongo, migration, owner, {"status": "paused"})
+            print("[SERVER] Migration", migration.version, "paused")
+            return False
+        except Exception as e:
+            save_progress(mongo, migration, owner, {"status": "failed", "error": str(e)})
+            print("[SERVER] Migration", migration.version, "failed:", e)
+            return False
+
+        save_progress(mongo, migration, owner, {"status": "done", "finished_at": datetime.utcnow()})
+        print("[SERVER] Migration", migration.version, migration.name, "done")
+    return True
+
+
+def pending_counts(mongo, target: int = None):
+    # documents each pending migration would still touch (dry run)
+    states = migration_states(mongo)
+    counts = []
+    for migration in load_migrations():
+        if target is not None and migration.version > target:
+            break
+        state = states.get(migration.version, {})
+        if state.get('status') == 'done' or not migration.has_backfill:
+            counts.append((migration, 0))
+            continue
+        query = migration.batch_query(state.get('checkpoint'))
+        counts.append((migration, mongo.db[migration.module.collection].count_documents(query)))
+    return counts
@@ -0,0 +1,100 @@
+import secrets
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        # called at login and logout: an id planted in the browser beforehand never becomes authenticated
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Keeps session data in a local SQLite file; the cookie only carries a signed session id."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db_path: str = "sessions.sqlite3"):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions "
+                         "(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per call keeps the store safe to use from any worker thread;
+        # `with conn` only commits, closing() releases it
+        with closing(sqlite3.connect(self.db_path, timeout=5)) as conn, conn:
+            yield conn
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="hotels2-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM sessions WHERE sid = ? AND expires > ?",
+                               (sid, time.time())).fetchone()
+        if row is None:
+            # never adopt an id the client chose
+            return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+        return ServerSideSession(self.serializer.loads(row[0]), sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM sessions WHERE sid = ?", (session.previous_sid,))
+            session.previous_sid = None
+
+        if not session:
+            if session.modified:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                         (session.sid, self.serializer.dumps(dict(session)), time.time() + lifetime))
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
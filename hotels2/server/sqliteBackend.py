@@ -0,0 +1,709 @@
+import math
+import sqlite3
+import threading
+from datetime import datetime
+from bson.objectid import ObjectId
+from hotels2.server.storageBackend import StorageBackend
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+EARTH_RADIUS = 6371008.8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hotels (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    street TEXT NOT NULL,
+    city TEXT NOT NULL,
+    zip_code TEXT NOT NULL,
+    imgUrl TEXT NOT NULL,
+    longitude REAL,
+    latitude REAL
+);
+CREATE INDEX IF NOT EXISTS hotels_city ON hotels (city);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    id TEXT PRIMARY KEY,
+    hotel_id TEXT NOT NULL,
+    room_type INTEGER NOT NULL,
+    room_number INTEGER NOT NULL,
+    price_per_night REAL NOT NULL CHECK (price_per_night > 0),
+    is_available INTEGER NOT NULL,
+    imgUrl TEXT NOT NULL,
+    base_price REAL,
+    dynamic_price REAL
+);
+CREATE INDEX IF NOT EXISTS rooms_hotel_number ON rooms (hotel_id, room_number);
+CREATE INDEX IF NOT EXISTS rooms_search ON rooms (is_available, room_type, price_per_night);
+
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    surname TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS customers_email ON customers (email);
+
+CREATE TABLE IF NOT EXISTS room_bookings (
+    room_id TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    PRIMARY KEY (room_id, booking_id)
+);
+CREATE INDEX IF NOT EXISTS room_bookings_interval ON room_bookings (room_id, date_from, date_to);
+CREATE INDEX IF NOT EXISTS room_bookings_booking ON room_bookings (booking_id, room_id);
+CREATE INDEX IF NOT EXISTS room_bookings_date_to ON room_bookings (date_to, date_from);
+
+CREATE TABLE IF NOT EXISTS customer_bookings (
+    customer_id TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    PRIMARY KEY (customer_id, booking_id)
+);
+CREATE INDEX IF NOT EXISTS customer_bookings_room ON customer_bookings (room_id);
+CREATE INDEX IF NOT EXISTS customer_bookings_booking ON customer_bookings (booking_id, customer_id);
+
+CREATE TABLE IF NOT EXISTS booking_logs (
+    booking_id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS booking_logs_dates ON booking_logs (date_from, date_to);
+
+CREATE TABLE IF NOT EXISTS room_holds (
+    id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    booking_id TEXT,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS room_holds_interval ON room_holds (room_id, date_from, date_to);
+CREATE INDEX IF NOT EXISTS room_holds_expires ON room_holds (expires_at);
+
+CREATE TABLE IF NOT EXISTS room_locks (
+    room_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waitlist_room ON waitlist (room_id, created_at);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result INTEGER,
+    locked_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires ON idempotency_keys (expires_at);
+
+CREATE TABLE IF NOT EXISTS cascade_jobs (
+    hotel_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    rooms_removed INTEGER NOT NULL,
+    bookings_archived INTEGER NOT NULL,
+    customers_updated INTEGER NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    heartbeat TEXT
+);
+"""
+
+
+def to_db_date(value: datetime):
+    return value.strftime(DATE_FORMAT)
+
+
+def from_db_date(value: str):
+    # DATE_FORMAT is ISO 8601, which fromisoformat parses many times faster than strptime
+    return datetime.fromisoformat(value)
+
+
+def distance_metres(longitude1: float, latitude1: float, longitude2: float, latitude2: float):
+    # haversine on a spherical earth, as $geoNear with spherical=True
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class SqliteBackend(StorageBackend):
+    """Embedded backend: the same documents as in Mongo, with the embedded bookings
+    arrays kept as two indexed tables (room_bookings, customer_bookings)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "hotels.sqlite3"):
+        # path may also be a "file:name?mode=memory&cache=shared" URI for a throwaway in-memory database
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(hotels)")]
+            if 'latitude' not in columns:
+                # files created before hotels had a location
+                conn.execute("ALTER TABLE hotels ADD COLUMN longitude REAL")
+                conn.execute("ALTER TABLE hotels ADD COLUMN latitude REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS hotels_location ON hotels (latitude, longitude)")
+            if 'booking_id' not in [row['name'] for row in conn.execute("PRAGMA table_info(room_holds)")]:
+                conn.execute("ALTER TABLE room_holds ADD COLUMN booking_id TEXT")
+            if 'base_price' not in [row['name'] for row in conn.execute("PRAGMA table_info(rooms)")]:
+                # files created before dynamic pricing
+                conn.execute("ALTER TABLE rooms ADD COLUMN base_price REAL")
+                conn.execute("ALTER TABLE rooms ADD COLUMN dynamic_price REAL")
+            if 'heartbeat' not in [row['name'] for row in conn.execute("PRAGMA table_info(cascade_jobs)")]:
+                conn.execute("ALTER TABLE cascade_jobs ADD COLUMN heartbeat TEXT")
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, uri=self.path.startswith("file:"))
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params)
+
+    def room_where(self, room_filter: dict):
+        clauses = []
+        params = []
+        if room_filter.get('hotel_id') is not None:
+            clauses.append("hotel_id = ?")
+            params.append(str(room_filter['hotel_id']))
+        elif room_filter.get('city') is not None:
+            clauses.append("hotel_id IN (SELECT id FROM hotels WHERE city = ?)")
+            params.append(room_filter['city'])
+        if room_filter.get('room_type') is not None:
+            clauses.append("room_type = ?")
+            params.append(room_filter['room_type'])
+        if room_filter.get('room_number') is not None:
+            clauses.append("room_number = ?")
+            params.append(room_filter['room_number'])
+        if room_filter.get('room_numbers') is not None:
+            clauses.append(f"room_number IN ({','.join('?' * len(room_filter['room_numbers']))})")
+            params.extend(room_filter['room_numbers'])
+        return (" AND ".join(clauses) or "1 = 1"), params
+
+    def hotel_document(self, row):
+        location = None
+        if row['latitude'] is not None:
+            location = {"type": "Point", "coordinates": [row['longitude'], row['latitude']]}
+        return {"_id": ObjectId(row['id']), "name": row['name'], "street": row['street'], "city": row['city'],
+                "zip_code": row['zip_code'], "imgUrl": row['imgUrl'], "location": location}
+
+    def customer_document(self, row):
+        if row is None:
+            return None
+        bookings = self.execute("SELECT booking_id, room_id, date_from, date_to FROM customer_bookings "
+                                "WHERE customer_id = ?", (row['id'],)).fetchall()
+        return {
+            "_id": ObjectId(row['id']),
+            "name": row['name'],
+            "surname": row['surname'],
+            "email": row['email'],
+            "password": row['password'],
+            "bookings": [{"booking_id": ObjectId(b['booking_id']), "room_id": ObjectId(b['room_id']),
+                          "date_from": from_db_date(b['date_from']), "date_to": from_db_date(b['date_to'])}
+                         for b in bookings]
+        }
+
+    # ### Hotels ###
+    def insert_hotel(self, hotel):
+        _id = ObjectId()
+        longitude, latitude = hotel.location['coordinates'] if hotel.location else (None, None)
+        self.execute("INSERT INTO hotels (id, name, street, city, zip_code, imgUrl, longitude, latitude) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (str(_id), hotel.name, hotel.street, hotel.city, hotel.zip_code, hotel.imgUrl,
+                      longitude, latitude))
+        return _id
+
+    def delete_hotel(self, hotel_id):
+        return self.execute("DELETE FROM hotels WHERE id = ?", (str(hotel_id),)).rowcount
+
+    def find_hotels(self):
+        return [self.hotel_document(row) for row in self.execute("SELECT * FROM hotels").fetchall()]
+
+    def find_cities(self):
+        return [{"city": row['city']} for row in self.execute("SELECT DISTINCT city FROM hotels").fetchall()]
+
+    def find_hotels_near(self, longitude, latitude, max_distance):
+        # the bounding box uses the (latitude, longitude) index, exact distances are checked in Python
+        d_latitude = math.degrees(max_distance / EARTH_RADIUS)
+        d_longitude = d_latitude / max(math.cos(math.radians(latitude)), 1e-6)
+        rows = self.execute("SELECT id, longitude, latitude FROM hotels "
+                            "WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+                            (latitude - d_latitude, latitude + d_latitude,
+                             longitude - d_longitude, longitude + d_longitude)).fetchall()
+        hotels = [{"_id": ObjectId(row['id']),
+                   "distance": distance_metres(longitude, latitude, row['longitude'], row['latitude'])}
+                  for row in rows]
+        return sorted((hotel for hotel in hotels if hotel['distance'] <= max_distance), key=lambda h: h['distance'])
+
+    # ### Rooms ###
+    def insert_room(self, room):
+        _id = ObjectId()
+        self.execute("INSERT INTO rooms (id, hotel_id, room_type, room_number, price_per_night, is_available, imgUrl) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (str(_id), str(room.hotel_id), room.room_type, room.room_number, room.price_per_night,
+                      int(room.is_available), room.imgUrl))
+        return _id
+
+    def count_rooms(self, room_filter):
+        where, params = self.room_where(room_filter)
+        return self.execute(f"SELECT COUNT(*) FROM rooms WHERE {where}", params).fetchone()[0]
+
+    def delete_room(self, room_id):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM room_bookings WHERE room_id = ?", (str(room_id),))
+            return conn.execute("DELETE FROM rooms WHERE id = ?", (str(room_id),)).rowcount
+
+    def update_room(self, room_id, fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        return self.execute(f"UPDATE rooms SET {assignments} WHERE id = ?",
+                            (*fields.values(), str(room_id))).rowcount
+
+    def update_rooms(self, room_filter, set_fields=None, multiply_fields=None):
+        set_fields = set_fields or {}
+        multiply_fields = multiply_fields or {}
+        assignments = [f"{column} = ?" for column in set_fields] + \
+                      [f"{column} = {column} * ?" for column in multiply_fields]
+        where, params = self.room_where(room_filter)
+        return self.execute(f"UPDATE rooms SET {', '.join(assignments)} WHERE {where}",
+                            (*set_fields.values(), *multiply_fields.values(), *params)).rowcount
+
+    def remove_rooms_batch(self, room_filter, batch_size, archive_from):
+        where, params = self.room_where(room_filter)
+        room_ids = [row['id'] for row in self.execute(f"SELECT id FROM rooms WHERE {where} LIMIT ?",
+                                                      (*params, batch_size)).fetchall()]
+        if not room_ids:
+            return None
+        marks = ','.join('?' * len(room_ids))
+        with self.connection() as conn:
+            archived = conn.execute(f"INSERT OR REPLACE INTO booking_logs "
+                                    f"SELECT booking_id, customer_id, room_id, date_from, date_to "
+                                    f"FROM room_bookings WHERE room_id IN ({marks}) AND date_to >= ?",
+                                    (*room_ids, to_db_date(archive_from))).rowcount
+            customers = conn.execute(f"SELECT COUNT(DISTINCT customer_id) FROM customer_bookings "
+                                     f"WHERE room_id IN ({marks})", room_ids).fetchone()[0]
+            conn.execute(f"DELETE FROM customer_bookings WHERE room_id IN ({marks})", room_ids)
+            conn.execute(f"DELETE FROM room_bookings WHERE room_id IN ({marks})", room_ids)
+            removed = conn.execute(f"DELETE FROM rooms WHERE id IN ({marks})", room_ids).rowcount
+        return removed, archived, customers
+
+    def set_room_prices(self, prices):
+        with self.connection() as conn:
+            cursor = conn.executemany("UPDATE rooms SET price_per_night = ? WHERE id = ?",
+                                      [(float(price), str(room_id)) for room_id, price in prices])
+            return cursor.rowcount
+
+    def find_wrong_bookings(self, room_id, check_in, check_out, booking_id, hotel_ids=None):
+        if check_in is None or check_out is None:
+            return []
+        # two intervals collide when each one starts before the other ends - the same set
+        # of bookings the four $or branches of the Mongo pipeline select
+        sql = ("SELECT b.room_id, b.booking_id, b.customer_id, b.date_from, b.date_to "
+               "FROM room_bookings b JOIN rooms r ON r.id = b.room_id "
+               "WHERE r.is_available = 1 AND b.date_from < ? AND b.date_to > ?")
+        params = [to_db_date(check_out), to_db_date(check_in)]
+        if room_id is not None:
+            sql += " AND b.room_id = ?"
+            params.append(str(room_id))
+        if booking_id is not None:
+            sql += " AND b.booking_id != ?"
+            params.append(str(booking_id))
+        if hotel_ids is not None:
+            sql += f" AND r.hotel_id IN ({','.join('?' * len(hotel_ids)) or 'NULL'})"
+            params.extend(str(_id) for _id in hotel_ids)
+
+        return [{"_id": ObjectId(row['room_id']),
+                 "bookings": {"booking_id": ObjectId(row['booking_id']),
+                              "customer_id": ObjectId(row['customer_id']),
+                              "date_from": from_db_date(row['date_from']),
+                              "date_to": from_db_date(row['date_to'])}}
+                for row in self.execute(sql, params).fetchall()]
+
+    def find_available_rooms(self, black_list, min_price, max_price, room_type, hotel_city, lazy=False,
+                             hotel_ids=None):
+        sql = ("SELECT r.id, r.hotel_id, r.room_type, r.price_per_night, r.imgUrl, h.name, h.street, h.city "
+               "FROM rooms r JOIN hotels h ON h.id = r.hotel_id "
+               "WHERE r.is_available = 1 AND r.price_per_night >= ? AND r.price_per_night < ?")
+        params = [min_price if min_price is not None else 0.0,
+                  max_price if max_price is not None else 100000000.0]
+        if black_list:
+            sql += f" AND r.id NOT IN ({','.join('?' * len(black_list))})"
+            params.extend(str(_id) for _id in black_list)
+        if room_type is not None:
+            sql += " AND r.room_type = ?"
+            params.append(room_type)
+        if hotel_city is not None:
+            sql += " AND h.city = ?"
+            params.append(hotel_city)
+        if hotel_ids is not None:
+            sql += f" AND r.hotel_id IN ({','.join('?' * len(hotel_ids)) or 'NULL'})"
+            params.extend(str(_id) for _id in hotel_ids)
+
+        return [{"room_id": ObjectId(row['id']), "hotel_id": ObjectId(row['hotel_id']), "room_type": row['room_type'],
+                 "price_per_night": row['price_per_night'], "room_imgUrl": row['imgUrl'],
+                 "hotel_name": row['name'], "hotel_street": row['street'], "hotel_city": row['city']}
+                for row in self.execute(sql, params).fetchall()]
+
+    def find_room_bookings(self, room_filter, date_from, date_to):
+        if room_filter.get('room_id') is not None:
+            rows = self.execute("SELECT id, is_available FROM rooms WHERE id = ?", (str(room_filter['room_id']),))
+        else:
+            rows = self.execute("SELECT id, is_available FROM rooms WHERE hotel_id = ?", (str(room_filter['hotel_id']),))
+        rooms = {row['id']: {"_id": ObjectId(row['id']), "is_available": bool(row['is_available']), "bookings": []}
+                 for row in rows.fetchall()}
+        if not rooms:
+            return []
+
+        bookings = self.execute(f"SELECT room_id, booking_id, customer_id, date_from, date_to FROM room_bookings "
+                                f"WHERE room_id IN ({','.join('?' * len(rooms))}) AND date_from < ? AND date_to > ?",
+                                (*rooms.keys(), to_db_date(date_to), to_db_date(date_from)))
+        for row in bookings.fetchall():
+            rooms[row['room_id']]['bookings'].append({"booking_id": ObjectId(row['booking_id']),
+                                                      "customer_id": ObjectId(row['customer_id']),
+                                                      "date_from": from_db_date(row['date_from']),
+                                                      "date_to": from_db_date(row['date_to'])})
+        return list(rooms.values())
+
+    def find_pricing_rooms(self, date_from, date_to):
+        rooms = {row['id']: {"_id": ObjectId(row['id']), "hotel_id": ObjectId(row['hotel_id']),
+                             "room_type": row['room_type'], "is_available": bool(row['is_available']),
+                             "price_per_night": row['price_per_night'], "base_price": row['base_price'],
+                             "dynamic_price": row['dynamic_price'], "bookings": []}
+                 for row in self.execute("SELECT id, hotel_id, room_type, is_available, price_per_night, "
+                                         "base_price, dynamic_price FROM rooms").fetchall()}
+        bookings = self.execute("SELECT room_id, date_from, date_to FROM room_bookings "
+                                "WHERE date_from < ? AND date_to > ?", (to_db_date(date_to), to_db_date(date_from)))
+        for row in bookings.fetchall():
+            if row['room_id'] in rooms:
+                rooms[row['room_id']]['bookings'].append({"date_from": from_db_date(row['date_from']),
+                                                          "date_to": from_db_date(row['date_to'])})
+        return list(rooms.values())
+
+    def reprice_rooms(self, changes):
+        with self.connection() as conn:
+            cursor = conn.executemany("UPDATE rooms SET price_per_night = ?, base_price = ?, dynamic_price = ? "
+                                      "WHERE id = ? AND price_per_night = ?",
+                                      [(float(new_price), float(base_price), float(new_price), str(room_id),
+                                        float(old_price)) for room_id, old_price, new_price, base_price in changes])
+            return cursor.rowcount
+
+    # ### Customers ###
+    def insert_customer(self, customer):
+        _id = ObjectId()
+        self.execute("INSERT INTO customers (id, name, surname, email, password) VALUES (?, ?, ?, ?, ?)",
+                     (str(_id), customer.name, customer.surname, customer.email, customer.password))
+        return _id
+
+    def count_customers_with_email(self, email):
+        return self.execute("SELECT COUNT(*) FROM customers WHERE email = ?", (email,)).fetchone()[0]
+
+    def delete_customer(self, customer_id):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM customer_bookings WHERE customer_id = ?", (str(customer_id),))
+            return conn.execute("DELETE FROM customers WHERE id = ?", (str(customer_id),)).rowcount
+
+    def find_customer(self, customer_id):
+        return self.customer_document(self.execute("SELECT * FROM customers WHERE id = ?",
+                                                   (str(customer_id),)).fetchone())
+
+    def find_customer_by_email(self, email):
+        return self.customer_document(self.execute("SELECT * FROM customers WHERE email = ?",
+                                                   (email,)).fetchone())
+
+    # ### Bookings ###
+    def push_room_booking(self, room_id, booking):
+        with self.connection() as conn:
+            if conn.execute("SELECT 1 FROM rooms WHERE id = ?", (str(room_id),)).fetchone() is None:
+                return 0
+            # OR REPLACE: a retried booking with the same booking_id is written once
+            conn.execute("INSERT OR REPLACE INTO room_bookings (room_id, booking_id, customer_id, date_from, date_to) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (str(room_id), str(booking['booking_id']), str(booking['customer_id']),
+                          to_db_date(booking['date_from']), to_db_date(booking['date_to'])))
+        return 1
+
+    def push_customer_booking(self, customer_id, booking):
+        with self.connection() as conn:
+            if conn.execute("SELECT 1 FROM customers WHERE id = ?", (str(customer_id),)).fetchone() is None:
+                return 0
+            # OR REPLACE: a retried booking with the same booking_id is written once
+            conn.execute("INSERT OR REPLACE INTO customer_bookings (customer_id, booking_id, room_id, date_from, date_to) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (str(customer_id), str(booking['booking_id']), str(booking['room_id']),
+                          to_db_date(booking['date_from']), to_db_date(booking['date_to'])))
+        return 1
+
+    def set_room_booking_dates(self, room_id, booking_id, check_in, check_out):
+        return self.execute("UPDATE room_bookings SET date_from = ?, date_to = ? WHERE room_id = ? AND booking_id = ?",
+                            (to_db_date(check_in), to_db_date(check_out), str(room_id), str(booking_id))).rowcount
+
+    def set_customer_booking_dates(self, customer_id, booking_id, check_in, check_out):
+        return self.execute("UPDATE customer_bookings SET date_from = ?, date_to = ? "
+                            "WHERE customer_id = ? AND booking_id = ?",
+                            (to_db_date(check_in), to_db_date(check_out), str(customer_id), str(booking_id))).rowcount
+
+    def pull_room_booking(self, room_id, booking_id):
+        return self.execute("DELETE FROM room_bookings WHERE room_id = ? AND booking_id = ?",
+                            (str(room_id), str(booking_id))).rowcount
+
+    def pull_customer_booking(self, customer_id, booking_id):
+        return self.execute("DELETE FROM customer_bookings WHERE customer_id = ? AND booking_id = ?",
+                            (str(customer_id), str(booking_id))).rowcount
+
+    def find_user_bookings(self, customer_id, now):
+        sql = ("SELECT b.room_id, b.booking_id, b.date_from, b.date_to, r.hotel_id, r.room_type, r.room_number, "
+               "r.price_per_night, r.imgUrl AS room_imgUrl, h.name, h.street, h.city, h.zip_code, "
+               "h.imgUrl AS hotel_imgUrl "
+               "FROM customer_bookings b "
+               "JOIN rooms r ON r.id = b.room_id "
+               "JOIN hotels h ON h.id = r.hotel_id "
+               "WHERE b.customer_id = ?")
+        bookings = []
+        for row in self.execute(sql, (str(customer_id),)).fetchall():
+            date_from = from_db_date(row['date_from'])
+            bookings.append({
+                'room_id': ObjectId(row['room_id']),
+                'booking_id': ObjectId(row['booking_id']),
+                'date_from': date_from,
+                'date_to': from_db_date(row['date_to']),
+                'hotel_id': ObjectId(row['hotel_id']),
+                'room_type': row['room_type'],
+                'room_number': row['room_number'],
+                'price_per_night': row['price_per_night'],
+                'room_imgUrl': row['room_imgUrl'],
+                'hotel_name': row['name'],
+                'hotel_address': row['street'],
+                'hotel_city': row['city'],
+                'hotel_zip_code': row['zip_code'],
+                'hotel_imgUrl': row['hotel_imgUrl'],
+                'can_be_edited': date_from > now
+            })
+        return bookings
+
+    # ### Holds and waitlist ###
+    def hold_document(self, row):
+        if row is None:
+            return None
+        return {"_id": ObjectId(row['id']), "room_id": ObjectId(row['room_id']),
+                "customer_id": ObjectId(row['customer_id']),
+                "booking_id": ObjectId(row['booking_id']) if row['booking_id'] else None,
+                "date_from": from_db_date(row['date_from']), "date_to": from_db_date(row['date_to']),
+                "expires_at": from_db_date(row['expires_at'])}
+
+    def insert_hold(self, hold):
+        _id = ObjectId()
+        with self.connection() as conn:
+            # there is no TTL monitor here, expired holds are purged on the next insert
+            conn.execute("DELETE FROM room_holds WHERE expires_at <= ?", (to_db_date(datetime.utcnow()),))
+            conn.execute("INSERT INTO room_holds (id, room_id, customer_id, booking_id, date_from, date_to, expires_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (str(_id), str(hold.room_id), str(hold.customer_id), str(hold.booking_id),
+                          to_db_date(hold.date_from), to_db_date(hold.date_to), to_db_date(hold.expires_at)))
+        return _id
+
+    def find_hold(self, hold_id):
+        return self.hold_document(self.execute("SELECT * FROM room_holds WHERE id = ?", (str(hold_id),)).fetchone())
+
+    def delete_hold(self, hold_id):
+        return self.execute("DELETE FROM room_holds WHERE id = ?", (str(hold_id),)).rowcount
+
+    def find_live_holds(self, room_id, check_in, check_out, now):
+        sql = "SELECT * FROM room_holds WHERE date_from < ? AND date_to > ? AND expires_at > ?"
+        params = [to_db_date(check_out), to_db_date(check_in), to_db_date(now)]
+        if room_id is not None:
+            sql += " AND room_id = ?"
+            params.append(str(room_id))
+        return [self.hold_document(row) for row in self.execute(sql, params).fetchall()]
+
+    def lock_room(self, room_id, owner, now, until):
+        return self.execute("INSERT INTO room_locks (room_id, owner, expires_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT (room_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                            "WHERE room_locks.expires_at <= ?",
+                            (str(room_id), str(owner), to_db_date(until), to_db_date(now))).rowcount == 1
+
+    def unlock_room(self, room_id, owner):
+        return self.execute("DELETE FROM room_locks WHERE room_id = ? AND owner = ?",
+                            (str(room_id), str(owner))).rowcount
+
+    def insert_waitlist_entry(self, entry):
+        _id = ObjectId()
+        self.execute("INSERT INTO waitlist (id, room_id, customer_id, date_from, date_to, created_at, expires_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (str(_id), str(entry.room_id), str(entry.customer_id), to_db_date(entry.date_from),
+                      to_db_date(entry.date_to), to_db_date(entry.created_at), to_db_date(entry.expires_at)))
+        return _id
+
+    def delete_waitlist_entry(self, entry_id):
+        return self.execute("DELETE FROM waitlist WHERE id = ?", (str(entry_id),)).rowcount
+
+    def find_waitlist(self, room_id, now):
+        rows = self.execute("SELECT * FROM waitlist WHERE room_id = ? AND expires_at > ? ORDER BY created_at, id",
+                            (str(room_id), to_db_date(now))).fetchall()
+        return [{"_id": ObjectId(row['id']), "room_id": ObjectId(row['room_id']),
+                 "customer_id": ObjectId(row['customer_id']), "date_from": from_db_date(row['date_from']),
+                 "date_to": from_db_date(row['date_to']), "created_at": from_db_date(row['created_at'])}
+                for row in rows]
+
+    # ### Idempotency keys ###
+    def insert_idempotency_key(self, record):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (to_db_date(datetime.utcnow()),))
+            inserted = conn.execute("INSERT OR IGNORE INTO idempotency_keys "
+                                    "(key, fingerprint, booking_id, status, result, locked_at, expires_at) "
+                                    "VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                                    (record.key, record.fingerprint, str(record.booking_id), record.status,
+                                     to_db_date(record.locked_at), to_db_date(record.expires_at))).rowcount
+        return inserted == 1
+
+    def find_idempotency_key(self, key):
+        row = self.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {"key": row['key'], "fingerprint": row['fingerprint'], "booking_id": ObjectId(row['booking_id']),
+                "status": row['status'], "result": None if row['result'] is None else bool(row['result']),
+                "locked_at": from_db_date(row['locked_at']), "expires_at": from_db_date(row['expires_at'])}
+
+    def lock_idempotency_key(self, key, stale_before, now):
+        return self.execute("UPDATE idempotency_keys SET locked_at = ? "
+                            "WHERE key = ? AND status = 'pending' AND locked_at < ?",
+                            (to_db_date(now), key, to_db_date(stale_before))).rowcount
+
+    def unlock_idempotency_key(self, key):
+        return self.execute("UPDATE idempotency_keys SET locked_at = ? WHERE key = ? AND status = 'pending'",
+                            (to_db_date(datetime(1970, 1, 1)), key)).rowcount
+
+    def finish_idempotency_key(self, key, result):
+        return self.execute("UPDATE idempotency_keys SET status = 'done', result = ? WHERE key = ?",
+                            (int(result), key)).rowcount
+
+    def delete_idempotency_key(self, key):
+        return self.execute("DELETE FROM idempotency_keys WHERE key = ?", (key,)).rowcount
+
+    # ### Integrity checks ###
+    def booking_pages(self, table: str, order: tuple, batch_size: int):
+        # keyset pages instead of one open cursor: repairs written between pages cannot shift the scan
+        last = None
+        while True:
+            sql = f"SELECT * FROM {table}"
+            params = []
+            if last is not None:
+                sql += f" WHERE ({', '.join(order)}) > ({', '.join('?' * len(order))})"
+                params = list(last)
+            rows = self.execute(f"{sql} ORDER BY {', '.join(order)} LIMIT ?", params + [batch_size]).fetchall()
+            for row in rows:
+                yield {"booking_id": ObjectId(row['booking_id']), "room_id": ObjectId(row['room_id']),
+                       "customer_id": ObjectId(row['customer_id']), "date_from": from_db_date(row['date_from']),
+                       "date_to": from_db_date(row['date_to'])}
+            if len(rows) < batch_size:
+                return
+            last = tuple(rows[-1][column] for column in order)
+
+    def iter_room_bookings(self, batch_size):
+        return self.booking_pages("room_bookings", ("booking_id", "room_id"), batch_size)
+
+    def iter_customer_bookings(self, batch_size):
+        return self.booking_pages("customer_bookings", ("booking_id", "customer_id"), batch_size)
+
+    def iter_bookings_by_room(self, batch_size):
+        return self.booking_pages("room_bookings", ("room_id", "date_from", "booking_id"), batch_size)
+
+    def find_existing_ids(self, kind, ids):
+        ids = [str(_id) for _id in ids]
+        if not ids:
+            return set()
+        table = "rooms" if kind == "rooms" else "customers"
+        rows = self.execute(f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+        return {ObjectId(row['id']) for row in rows}
+
+    def find_room_booking(self, room_id, booking_id):
+        row = self.execute("SELECT * FROM room_bookings WHERE room_id = ? AND booking_id = ?",
+                           (str(room_id), str(booking_id))).fetchone()
+        return None if row is None else {"booking_id": booking_id, "customer_id": ObjectId(row['customer_id']),
+                                         "date_from": from_db_date(row['date_from']),
+                                         "date_to": from_db_date(row['date_to'])}
+
+    def find_customer_booking(self, customer_id, booking_id):
+        row = self.execute("SELECT * FROM customer_bookings WHERE customer_id = ? AND booking_id = ?",
+                           (str(customer_id), str(booking_id))).fetchone()
+        return None if row is None else {"booking_id": booking_id, "room_id": ObjectId(row['room_id']),
+                                         "date_from": from_db_date(row['date_from']),
+                                         "date_to": from_db_date(row['date_to'])}
+
+    # ### Booking logs ###
+    def find_booking_logs(self, date_from, date_to, room_id=None):
+        sql = "SELECT * FROM booking_logs WHERE date_from < ? AND date_to > ?"
+        params = [to_db_date(date_to), to_db_date(date_from)]
+        if room_id is not None:
+            sql += " AND room_id = ?"
+            params.append(str(room_id))
+        return [{"booking_id": ObjectId(row['booking_id']), "customer_id": ObjectId(row['customer_id']),
+                 "room_id": ObjectId(row['room_id']), "date_from": from_db_date(row['date_from']),
+                 "date_to": from_db_date(row['date_to'])}
+                for row in self.execute(sql + " ORDER BY date_from", params).fetchall()]
+
+    # ### Hotel removal jobs ###
+    def cascade_job_document(self, row):
+        if row is None:
+            return None
+        return {"hotel_id": ObjectId(row['hotel_id']), "status": row['status'],
+                "rooms_removed": row['rooms_removed'], "bookings_archived": row['bookings_archived'],
+                "customers_updated": row['customers_updated'], "started_at": from_db_date(row['started_at']),
+                "finished_at": from_db_date(row['finished_at']) if row['finished_at'] else None,
+                "heartbeat": from_db_date(row['heartbeat']) if row['heartbeat'] else None}
+
+    def cascade_job_row(self, job):
+        finished_at, heartbeat = job.get('finished_at'), job.get('heartbeat')
+        return (str(job['hotel_id']), job['status'], job['rooms_removed'], job['bookings_archived'],
+                job['customers_updated'], to_db_date(job['started_at']),
+                to_db_date(finished_at) if finished_at else None, to_db_date(heartbeat) if heartbeat else None)
+
+    def save_cascade_job(self, job):
+        self.execute("INSERT OR REPLACE INTO cascade_jobs (hotel_id, status, rooms_removed, bookings_archived, "
+                     "customers_updated, started_at, finished_at, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     self.cascade_job_row(job))
+
+    def claim_cascade_job(self, job, stale_before):
+        return self.execute("INSERT INTO cascade_jobs (hotel_id, status, rooms_removed, bookings_archived, "
+                            "customers_updated, started_at, finished_at, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (hotel_id) DO UPDATE SET status = excluded.status, "
+                            "rooms_removed = excluded.rooms_removed, bookings_archived = excluded.bookings_archived, "
+                            "customers_updated = excluded.customers_updated, started_at = excluded.started_at, "
+                            "finished_at = excluded.finished_at, heartbeat = excluded.heartbeat "
+                            "WHERE cascade_jobs.status != 'running' OR cascade_jobs.heartbeat IS NULL "
+                            "OR cascade_jobs.heartbeat <= ?",
+                            self.cascade_job_row(job) + (to_db_date(stale_before),)).rowcount == 1
+
+    def find_cascade_job(self, hotel_id):
+        return self.cascade_job_document(
+            self.execute("SELECT * FROM cascade_jobs WHERE hotel_id = ?", (str(hotel_id),)).fetchone())
+
+    def find_unfinished_cascade_jobs(self):
+        return [self.cascade_job_document(row) for row in
+                self.execute("SELECT * FROM cascade_jobs WHERE status != 'done' ORDER BY started_at").fetchall()]
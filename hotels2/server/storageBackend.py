@@ -0,0 +1,267 @@
+import os
+from datetime import datetime
+from threading import Lock
+from bson.objectid import ObjectId
+
+
+class StorageBackend:
+    """Storage operations used by dbOperations; implemented by MongoBackend and SqliteBackend.
+
+    Room filters passed to the bulk methods are plain dicts with any of the keys:
+    hotel_id, city, room_type, room_number, room_numbers (list).
+    """
+
+    name = None
+
+    # ### Hotels ###
+    def insert_hotel(self, hotel) -> ObjectId:
+        raise NotImplementedError
+
+    def delete_hotel(self, hotel_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def find_hotels(self) -> list:
+        raise NotImplementedError
+
+    def find_cities(self) -> list:
+        raise NotImplementedError
+
+    def find_hotels_near(self, longitude: float, latitude: float, max_distance: float) -> list:
+        # [{"_id": hotel id, "distance": metres}] of hotels with a location, nearest first
+        raise NotImplementedError
+
+    # ### Rooms ###
+    def insert_room(self, room) -> ObjectId:
+        raise NotImplementedError
+
+    def count_rooms(self, room_filter: dict) -> int:
+        raise NotImplementedError
+
+    def delete_room(self, room_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def update_room(self, room_id: ObjectId, fields: dict) -> int:
+        raise NotImplementedError
+
+    def update_rooms(self, room_filter: dict, set_fields: dict = None, multiply_fields: dict = None) -> int:
+        raise NotImplementedError
+
+    def remove_rooms_batch(self, room_filter: dict, batch_size: int, archive_from: datetime):
+        # removes up to batch_size matching rooms, archives their bookings ending at or after archive_from
+        # to Booking_Logs and drops all their bookings from Customers.bookings;
+        # returns (rooms_removed, bookings_archived, customers_updated), or None when no matching rooms are left
+        raise NotImplementedError
+
+    def set_room_prices(self, prices: list) -> int:
+        raise NotImplementedError
+
+    def find_wrong_bookings(self, room_id: ObjectId, check_in: datetime, check_out: datetime,
+                            booking_id: ObjectId, hotel_ids: list = None) -> list:
+        # hotel_ids limits the occupancy check to rooms of these hotels
+        raise NotImplementedError
+
+    def find_available_rooms(self, black_list: list, min_price: float, max_price: float,
+                             room_type: int, hotel_city: str, lazy: bool = False, hotel_ids: list = None) -> list:
+        # lazy=True may return undecoded documents (RawBSONDocument) that decode on first field access
+        raise NotImplementedError
+
+    def find_room_bookings(self, room_filter: dict, date_from: datetime, date_to: datetime) -> list:
+        # rooms matching the filter (by _id or hotel_id) with only the bookings overlapping the range:
+        # [{"_id": ..., "is_available": ..., "bookings": [...]}]
+        raise NotImplementedError
+
+    def find_pricing_rooms(self, date_from: datetime, date_to: datetime) -> list:
+        # every room with its pricing fields and only the bookings overlapping the range:
+        # [{"_id", "hotel_id", "room_type", "is_available", "price_per_night", "base_price", "dynamic_price",
+        #   "bookings": [{"date_from", "date_to"}]}]; base_price/dynamic_price are None until first repriced
+        raise NotImplementedError
+
+    def reprice_rooms(self, changes: list) -> int:
+        # changes: (room_id, old_price, new_price, base_price); a room whose price_per_night is no longer
+        # old_price was changed meanwhile and is skipped
+        raise NotImplementedError
+
+    # ### Customers ###
+    def insert_customer(self, customer) -> ObjectId:
+        raise NotImplementedError
+
+    def count_customers_with_email(self, email: str) -> int:
+        raise NotImplementedError
+
+    def delete_customer(self, customer_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def find_customer(self, customer_id: ObjectId):
+        raise NotImplementedError
+
+    def find_customer_by_email(self, email: str):
+        raise NotImplementedError
+
+    # ### Bookings ###
+    def push_room_booking(self, room_id: ObjectId, booking: dict) -> int:
+        raise NotImplementedError
+
+    def push_customer_booking(self, customer_id: ObjectId, booking: dict) -> int:
+        raise NotImplementedError
+
+    def set_room_booking_dates(self, room_id: ObjectId, booking_id: ObjectId,
+                               check_in: datetime, check_out: datetime) -> int:
+        raise NotImplementedError
+
+    def set_customer_booking_dates(self, customer_id: ObjectId, booking_id: ObjectId,
+                                   check_in: datetime, check_out: datetime) -> int:
+        raise NotImplementedError
+
+    def pull_room_booking(self, room_id: ObjectId, booking_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def pull_customer_booking(self, customer_id: ObjectId, booking_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def find_user_bookings(self, customer_id: ObjectId, now: datetime) -> list:
+        raise NotImplementedError
+
+    # ### Holds and waitlist ###
+    def insert_hold(self, hold) -> ObjectId:
+        raise NotImplementedError
+
+    def find_hold(self, hold_id: ObjectId):
+        raise NotImplementedError
+
+    def delete_hold(self, hold_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def find_live_holds(self, room_id: ObjectId, check_in: datetime, check_out: datetime, now: datetime) -> list:
+        # holds overlapping [check_in, check_out) that expire after `now`; room_id None means every room
+        raise NotImplementedError
+
+    def lock_room(self, room_id: ObjectId, owner: ObjectId, now: datetime, until: datetime) -> bool:
+        # lease on the room's hold placement: True when free or when the previous lease expired before `now`
+        raise NotImplementedError
+
+    def unlock_room(self, room_id: ObjectId, owner: ObjectId) -> int:
+        raise NotImplementedError
+
+    def insert_waitlist_entry(self, entry) -> ObjectId:
+        raise NotImplementedError
+
+    def delete_waitlist_entry(self, entry_id: ObjectId) -> int:
+        raise NotImplementedError
+
+    def find_waitlist(self, room_id: ObjectId, now: datetime) -> list:
+        # entries of the room that did not expire yet, oldest first
+        raise NotImplementedError
+
+    # ### Idempotency keys ###
+    def insert_idempotency_key(self, record) -> bool:
+        # False when the key already exists
+        raise NotImplementedError
+
+    def find_idempotency_key(self, key: str):
+        raise NotImplementedError
+
+    def lock_idempotency_key(self, key: str, stale_before: datetime, now: datetime) -> int:
+        # takes over a pending key whose lock is older than stale_before; 1 when taken
+        raise NotImplementedError
+
+    def unlock_idempotency_key(self, key: str) -> int:
+        # lets the next retry take a failed request over at once
+        raise NotImplementedError
+
+    def finish_idempotency_key(self, key: str, result: bool) -> int:
+        raise NotImplementedError
+
+    def delete_idempotency_key(self, key: str) -> int:
+        raise NotImplementedError
+
+    # ### Integrity checks ###
+    # bookings are yielded as {"booking_id", "room_id", "customer_id", "date_from", "date_to"},
+    # read batch_size at a time, so a scan over millions of bookings runs in bounded memory
+    def iter_room_bookings(self, batch_size: int):
+        # Rooms.bookings sorted by booking_id
+        raise NotImplementedError
+
+    def iter_customer_bookings(self, batch_size: int):
+        # Customers.bookings sorted by booking_id
+        raise NotImplementedError
+
+    def iter_bookings_by_room(self, batch_size: int):
+        # Rooms.bookings sorted by room_id, then date_from
+        raise NotImplementedError
+
+    def find_existing_ids(self, kind: str, ids: list) -> set:
+        # ids of the list that exist in "rooms" or "customers"
+        raise NotImplementedError
+
+    def find_room_booking(self, room_id: ObjectId, booking_id: ObjectId):
+        raise NotImplementedError
+
+    def find_customer_booking(self, customer_id: ObjectId, booking_id: ObjectId):
+        raise NotImplementedError
+
+    # ### Booking logs ###
+    def find_booking_logs(self, date_from: datetime, date_to: datetime, room_id: ObjectId = None) -> list:
+        raise NotImplementedError
+
+    # ### Hotel removal jobs ###
+    # {"hotel_id", "status", "rooms_removed", "bookings_archived", "customers_updated", "started_at", "finished_at",
+    #  "heartbeat"}
+    def save_cascade_job(self, job: dict) -> None:
+        raise NotImplementedError
+
+    def claim_cascade_job(self, job: dict, stale_before: datetime) -> bool:
+        # writes the job only if nobody runs it: not stored yet, not "running", or its heartbeat is not after
+        # stale_before (the worker running it died)
+        raise NotImplementedError
+
+    def find_cascade_job(self, hotel_id: ObjectId):
+        raise NotImplementedError
+
+    def find_unfinished_cascade_jobs(self) -> list:
+        raise NotImplementedError
+
+
+def get_storage_backend():
+    # HOTELS_BACKEND=sqlite runs everything against a local file (HOTELS_SQLITE_PATH), no network needed
+    backend = os.getenv("HOTELS_BACKEND", "mongo")
+    if backend == "sqlite":
+        from hotels2.server.sqliteBackend import SqliteBackend
+        return SqliteBackend(os.getenv("HOTELS_SQLITE_PATH", "hotels.sqlite3"))
+    if backend == "mongo":
+        from hotels2.server.mongoBackend import MongoBackend
+        return MongoBackend()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class LazyStorage:
+    """Creates the storage backend on first use and again in every forked process.
+
+    gunicorn --preload imports the app in the master before forking workers; MongoClient
+    (and sqlite3 connections) must not be shared across a fork, so nothing is opened at import
+    and a worker that inherits a backend from its parent builds its own on first access.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = Lock()
+        self.backend = None
+        self.pid = None
+
+    def get(self):
+        backend = self.backend
+        if backend is not None and self.pid == os.getpid():
+            return backend
+        with self.lock:
+            if self.backend is None or self.pid != os.getpid():
+                self.backend = self.factory()
+                self.pid = os.getpid()
+            return self.backend
+
+    def reset(self):
+        # drops the backend without closing it; a forked child must not close its parent's sockets
+        with self.lock:
+            self.backend = None
+            self.pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
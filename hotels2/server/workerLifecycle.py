@@ -0,0 +1,56 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from threading import Condition, Event
+
+
+class InFlightWork:
+    """Counts work a worker must finish before it exits: booking requests and hotel cascades.
+
+    On shutdown the worker sets `draining` (new booking writes are turned away with a 503, so the
+    client retries them on another worker) and waits until the running ones are done.
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        self.active = Counter()
+        self.draining = Event()
+
+    def begin(self, kind: str):
+        with self.condition:
+            self.active[kind] += 1
+
+    def end(self, kind: str):
+        with self.condition:
+            self.active[kind] -= 1
+            if self.active[kind] <= 0:
+                del self.active[kind]
+            self.condition.notify_all()
+
+    @contextmanager
+    def track(self, kind: str):
+        self.begin(kind)
+        try:
+            yield
+        finally:
+            self.end(kind)
+
+    def count(self, kind: str = None):
+        with self.condition:
+            return sum(self.active.values()) if kind is None else self.active[kind]
+
+    def drain(self, timeout: float):
+        # True when everything finished in time
+        self.draining.set()
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print("[SERVER] Drain timed out, still running:", dict(self.active))
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+
+in_flight = InFlightWork()
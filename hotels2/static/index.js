@@ -29,6 +29,12 @@ function fillAndShowTheForm(hotel, checkin, checkout, booking_id, customer_id, r
     `;
 
     form.insertAdjacentHTML('beforeend', newFormHTML);
+
+    // the nights of the booking being changed are taken by the guest themselves, not by someone else
+    form.dataset.roomId = room_id;
+    form.dataset.ownFrom = checkin;
+    form.dataset.ownTo = checkout;
+    watchBookingDates(form);
 }
 
 
@@ -39,4 +45,63 @@ function removeBooking(booking_id, room_id) {
     }).then((_res) => {
         window.location.href = '/bookings'
     });
-}
\ No newline at end of file
+}
+
+
+const availabilityCache = {};
+
+function fetchRoomAvailability(roomId, month) {
+    const key = `${roomId}/${month}`;
+    if (!(key in availabilityCache)) {
+        availabilityCache[key] = fetch(`/api/rooms/${roomId}/availability?month=${month}`)
+            .then((res) => res.ok ? res.json() : null);
+    }
+    return availabilityCache[key];
+}
+
+async function takenNights(roomId, checkin, checkout) {
+    const months = new Set();
+    for (let day = new Date(checkin); day < checkout; day.setUTCDate(day.getUTCDate() + 1)) {
+        months.add(day.toISOString().slice(0, 7));
+    }
+
+    const taken = [];
+    for (const month of months) {
+        const calendar = await fetchRoomAvailability(roomId, month);
+        if (!calendar) continue;
+        const free = calendar.rooms[roomId];
+        calendar.days.forEach((day, i) => {
+            const date = new Date(day);
+            if (date >= checkin && date < checkout && !free[i]) taken.push(day);
+        });
+    }
+    return taken;
+}
+
+async function checkBookingDates(form) {
+    // "checkin"/"checkout" on the reservation form, "new_checkin"/"new_checkout" when changing a booking
+    const checkinInput = form.querySelector('input[name$="checkin"]');
+    const checkoutInput = form.querySelector('input[name$="checkout"]');
+    checkinInput.setCustomValidity('');
+    if (!checkinInput.value || !checkoutInput.value) return;
+
+    const checkin = new Date(checkinInput.value);
+    const checkout = new Date(checkoutInput.value);
+    if (checkout <= checkin) return;
+
+    const {ownFrom, ownTo} = form.dataset;
+    const taken = (await takenNights(form.dataset.roomId, checkin, checkout))
+        .filter((day) => !(ownFrom && day >= ownFrom && day < ownTo));
+    if (taken.length) {
+        checkinInput.setCustomValidity(`Room is already booked on: ${taken.join(', ')}`);
+        checkinInput.reportValidity();
+    }
+}
+
+function watchBookingDates(form) {
+    form.querySelectorAll('input[type="date"]').forEach((input) => {
+        input.addEventListener('change', () => checkBookingDates(form));
+    });
+}
+
+document.querySelectorAll('.date-form[data-room-id]').forEach(watchBookingDates);
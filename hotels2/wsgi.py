@@ -0,0 +1,32 @@
+import os
+import time
+from hotels2 import create_app, start_background_workers, stop_background_workers
+from hotels2.server.dbOperations import warm_up
+from hotels2.server.workerLifecycle import in_flight
+
+# production entry point: gunicorn -c python:hotels2.gunicorn_conf hotels2.wsgi:app
+# nothing here opens a database connection or starts a thread, so the module is safe to preload
+app = create_app(start_workers=False)
+
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 25))
+
+
+def start_worker():
+    start = time.perf_counter()
+    warm_up()
+    # compiles every template now instead of on the first request that renders it
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+    start_background_workers(app)
+    print("[SERVER] Worker", os.getpid(), "ready in", round((time.perf_counter() - start) * 1000), "ms")
+
+
+def begin_drain():
+    in_flight.draining.set()
+
+
+def stop_worker(timeout: float = DRAIN_TIMEOUT):
+    drained = in_flight.drain(timeout)
+    stop_background_workers(app)
+    print("[SERVER] Worker", os.getpid(), "stopped", "cleanly" if drained else "with work still running")
+    return drained